@@ -1,13 +1,39 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import io
-from app.services.huggingface import analyze_code
-from app.services.github import get_pr_diff
+import json
+import os
+import time
+import zipfile
+from typing import List
+from app.services.findings import Review, render_markdown
+from app.services.huggingface import analyze_code, stream_analysis
+from app.services.pull_requests import analyze_pull_request, stream_pull_request
+from app.services.cache import review_cache
+from app.services.health import provider_health
+from app.services.ratelimit import rate_limiter
+from app.services.similarity import near_duplicates, owned_by
+from app.services.languages import EXTENSION_LANGUAGES
+from app.services.batch import BatchFile, analyze_batch
+from app.services.history import history_writer
+from app.services.uploads import UploadTooLarge, read_upload_text
 import re
 
 router = APIRouter()
 
+ALLOWED_EXTENSIONS = ['.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.php', '.rb', '.go', '.rs', '.swift', '.kt', '.scala', '.html', '.css', '.sql', '.sh', '.txt']
+MAX_FILE_BYTES = 1_048_576
+MAX_CODE_CHARS = 50_000
+
+# Batch limits: number of files, and total bytes uploaded or unpacked from an archive
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", str(20 * 1_048_576)))
+# How often a running analysis checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))  # seconds
+
 class CodeInput(BaseModel):
     code: str
     language: Optional[str] = None
@@ -18,6 +44,22 @@ class AnalysisResponse(BaseModel):
     analysis_time: float
     code_length: int
 
+class BatchFileResult(BaseModel):
+    filename: str
+    markdown_feedback: Optional[str] = None
+    language_detected: Optional[str] = None
+    analysis_time: float = 0.0
+    code_length: int = 0
+    packed: bool = False
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchFileResult]
+    file_count: int
+    analyzed_count: int
+    prompt_count: int
+    total_time: float
+
 class PRReviewRequest(BaseModel):
     pr_url: str
 
@@ -26,33 +68,73 @@ class PRReviewResponse(BaseModel):
     analysis_time: float
     pr_url: str
 
-@router.post("/analyze")
-async def analyze_endpoint(input: CodeInput):
-    if len(input.code) > 50_000:  # Increased limit for file uploads
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def parse_pr_url(pr_url: str) -> tuple[str, str, int]:
+    # Extract owner, repo, and PR number from URL
+    match = re.match(r"https://github.com/([^/]+)/([^/]+)/pull/(\d+)", pr_url)
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid PR URL format. Use https://github.com/owner/repo/pull/123")
+    return match.group(1), match.group(2), int(match.group(3))
+
+def file_extension(filename: str) -> str:
+    return '.' + filename.split('.')[-1].lower() if '.' in filename else ''
+
+def validate_code(code: str):
+    if len(code) > MAX_CODE_CHARS:  # Increased limit for file uploads
         raise HTTPException(status_code=400, detail="Code too long (max 50,000 characters)")
     
-    if not input.code.strip():
+    if not code.strip():
         raise HTTPException(status_code=400, detail="Code cannot be empty")
-    
+
+def requester(request: Request) -> str | None:
+    """Who submitted code through the API, for sharing near-duplicate reviews"""
+    return f"client:{request.client.host}" if request.client else None
+
+async def cancel_on_disconnect(request: Request, work):
+    """Await `work`, cancelling it (and any analysis it queued for a worker
+    process) if the client disconnects first"""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        task.cancel()
+
+async def run_analysis(code: str, language: Optional[str], source: str = "analyze",
+                       reference: Optional[str] = None) -> AnalysisResponse:
     try:
-        import time
         start_time = time.time()
         
-        feedback = await analyze_code(input.code, input.language)
+        review = await analyze_code(code, language)
         
-        analysis_time = time.time() - start_time
+        analysis_time = round(time.time() - start_time, 2)
+        history_writer.record_analysis(source, code, review, language, analysis_time, reference)
         
         return AnalysisResponse(
-            markdown_feedback=feedback,
-            language_detected=input.language,
-            analysis_time=round(analysis_time, 2),
-            code_length=len(input.code)
+            markdown_feedback=render_markdown(review),
+            language_detected=language,
+            analysis_time=analysis_time,
+            code_length=len(code)
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/analyze")
+async def analyze_endpoint(input: CodeInput, request: Request):
+    validate_code(input.code)
+    with owned_by(requester(request)):
+        return await cancel_on_disconnect(request, run_analysis(input.code, input.language))
+
 @router.post("/analyze-file")
 async def analyze_file_endpoint(
+    request: Request,
     file: UploadFile = File(...),
     language: Optional[str] = Form(None)
 ):
@@ -60,40 +142,37 @@ async def analyze_file_endpoint(
         raise HTTPException(status_code=400, detail="No file provided")
     
     # Check file size (max 1MB)
-    if file.size and file.size > 1_048_576:
+    if file.size and file.size > MAX_FILE_BYTES:
         raise HTTPException(status_code=400, detail="File too large (max 1MB)")
     
     # Check file extension
-    allowed_extensions = ['.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.php', '.rb', '.go', '.rs', '.swift', '.kt', '.scala', '.html', '.css', '.sql', '.sh', '.txt']
-    file_ext = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
+    file_ext = file_extension(file.filename)
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400, 
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
     try:
-        content = await file.read()
-        code = content.decode('utf-8')
-        
-        # Auto-detect language if not provided
-        if not language:
-            language_map = {
-                '.py': 'Python', '.js': 'JavaScript', '.ts': 'TypeScript',
-                '.java': 'Java', '.cpp': 'C++', '.c': 'C', '.cs': 'C#',
-                '.php': 'PHP', '.rb': 'Ruby', '.go': 'Go', '.rs': 'Rust',
-                '.swift': 'Swift', '.kt': 'Kotlin', '.scala': 'Scala',
-                '.html': 'HTML', '.css': 'CSS', '.sql': 'SQL', '.sh': 'Shell'
-            }
-            language = language_map.get(file_ext, 'Unknown')
-        
-        return await analyze_endpoint(CodeInput(code=code, language=language))
-        
+        # Read in chunks with the byte cap enforced as we go; no full raw copy is kept
+        code = await read_upload_text(file, MAX_FILE_BYTES, max_chars=MAX_CODE_CHARS)
+    except UploadTooLarge as e:
+        if e.limit == "chars":
+            raise HTTPException(status_code=400, detail="Code too long (max 50,000 characters)")
+        raise HTTPException(status_code=400, detail="File too large (max 1MB)")
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="File must be text-based")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
+    
+    # Auto-detect language if not provided
+    if not language:
+        language = EXTENSION_LANGUAGES.get(file_ext, 'Unknown')
+    
+    validate_code(code)
+    with owned_by(requester(request)):
+        return await cancel_on_disconnect(request, run_analysis(code, language, "analyze-file", file.filename))
 
 @router.get("/supported-languages")
 async def get_supported_languages():
@@ -120,23 +199,194 @@ async def get_supported_languages():
         ]
     }
 
+@router.get("/cache-stats")
+async def cache_stats():
+    return {**review_cache.stats(), "near_duplicates": near_duplicates.stats()}
+
+@router.get("/provider-health")
+async def provider_health_stats():
+    return provider_health.snapshot()
+
+@router.get("/rate-limits")
+async def rate_limit_stats():
+    return rate_limiter.snapshot()
+
 @router.post("/review-pr", response_model=PRReviewResponse)
-async def review_pr_endpoint(input: PRReviewRequest):
-    # Extract owner, repo, and PR number from URL
-    match = re.match(r"https://github.com/([^/]+)/([^/]+)/pull/(\\d+)", input.pr_url)
-    if not match:
-        raise HTTPException(status_code=400, detail="Invalid PR URL format. Use https://github.com/owner/repo/pull/123")
-    owner, repo, pr_number = match.group(1), match.group(2), int(match.group(3))
+async def review_pr_endpoint(input: PRReviewRequest, request: Request):
+    owner, repo, pr_number = parse_pr_url(input.pr_url)
     try:
-        import time
         start_time = time.time()
-        diff = await get_pr_diff(owner, repo, pr_number)
-        feedback = await analyze_code(diff, language=None)
-        analysis_time = time.time() - start_time
+        # Only this request stops waiting; a review shared with other callers carries on
+        review = await cancel_on_disconnect(request, analyze_pull_request(owner, repo, pr_number))
+        analysis_time = round(time.time() - start_time, 2)
+        history_writer.record_analysis("review-pr", None, review, analysis_time=analysis_time, reference=input.pr_url)
         return PRReviewResponse(
-            markdown_feedback=feedback,
-            analysis_time=round(analysis_time, 2),
+            markdown_feedback=render_markdown(review),
+            analysis_time=analysis_time,
             pr_url=input.pr_url
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PR review failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"PR review failed: {str(e)}") 
+
+@router.post("/analyze/stream")
+async def analyze_stream_endpoint(input: CodeInput, request: Request):
+    """Stream the review as Server-Sent Events ("token" events, then "done")"""
+    validate_code(input.code)
+    owner = requester(request)
+
+    async def events():
+        start_time = time.time()
+        parts = []
+        review = None
+        try:
+            with owned_by(owner):
+                async for item in stream_analysis(input.code, input.language):
+                    if isinstance(item, Review):
+                        review, item = item, render_markdown(item)
+                    parts.append(item)
+                    yield sse_event("token", {"text": item})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Analysis failed: {str(e)}"})
+            return
+        analysis_time = round(time.time() - start_time, 2)
+        history_writer.record_analysis("analyze-stream", input.code, review or Review(text="".join(parts)),
+                                       input.language, analysis_time)
+        yield sse_event("done", {
+            "language_detected": input.language,
+            "analysis_time": analysis_time,
+            "code_length": len(input.code)
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/review-pr/stream")
+async def review_pr_stream_endpoint(input: PRReviewRequest):
+    """Stream the PR review as Server-Sent Events (one "chunk" per file chunk, then "done")"""
+    owner, repo, pr_number = parse_pr_url(input.pr_url)
+
+    async def events():
+        start_time = time.time()
+        try:
+            async for update in stream_pull_request(owner, repo, pr_number):
+                event = update.pop("event")
+                review = update.pop("review")
+                if event == "done":
+                    update["markdown_feedback"] = render_markdown(review)
+                    update["analysis_time"] = round(time.time() - start_time, 2)
+                    update["pr_url"] = input.pr_url
+                    history_writer.record_analysis("review-pr-stream", None, review,
+                                                   analysis_time=update["analysis_time"], reference=input.pr_url)
+                else:
+                    update["feedback"] = render_markdown(review)
+                yield sse_event(event, update)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"PR review failed: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def read_archive(data: bytes) -> list[tuple[str, bytes]]:
+    """Source files from a zip archive, bounded by the batch limits"""
+    entries = []
+    total = 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or file_extension(info.filename) not in ALLOWED_EXTENSIONS:
+                continue
+            total += info.file_size
+            if len(entries) >= BATCH_MAX_FILES or total > BATCH_MAX_TOTAL_BYTES:
+                raise HTTPException(status_code=400, detail="Archive too large for one batch")
+            if info.file_size > MAX_FILE_BYTES:
+                entries.append((info.filename, None))
+                continue
+            entries.append((info.filename, archive.read(info)))
+    return entries
+
+@router.post("/analyze-batch", response_model=BatchAnalysisResponse)
+async def analyze_batch_endpoint(
+    request: Request,
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(None)
+):
+    """Analyze many files at once, uploaded individually and/or as a .zip archive"""
+    start_time = time.time()
+    entries: list[tuple[str, bytes | None]] = []
+    total = 0
+    for upload in files:
+        if not upload.filename:
+            continue
+        data = await upload.read(MAX_FILE_BYTES + 1)
+        total += len(data)
+        if total > BATCH_MAX_TOTAL_BYTES:
+            raise HTTPException(status_code=400, detail="Upload too large for one batch")
+        entries.append((upload.filename, data if len(data) <= MAX_FILE_BYTES else None))
+    if archive is not None and archive.filename:
+        if file_extension(archive.filename) != '.zip':
+            raise HTTPException(status_code=400, detail="Archive must be a .zip file")
+        data = await archive.read(BATCH_MAX_TOTAL_BYTES + 1)
+        if len(data) > BATCH_MAX_TOTAL_BYTES:
+            raise HTTPException(status_code=400, detail="Archive too large for one batch")
+        try:
+            entries.extend(await asyncio.to_thread(read_archive, data))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Archive is not a valid zip file")
+    if not entries:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(entries) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {BATCH_MAX_FILES} per batch)")
+
+    results: list[BatchFileResult] = []
+    batch: list[BatchFile] = []
+    # Packed prompts refer to files by name, so names must be unique, also against uploads named like "a.py (2)"
+    taken = {filename for filename, _ in entries}
+    seen: set[str] = set()
+    for filename, data in entries:
+        file_ext = file_extension(filename)
+        if filename in seen:
+            copy = 2
+            while f"{filename} ({copy})" in taken:
+                copy += 1
+            filename = f"{filename} ({copy})"
+            taken.add(filename)
+        seen.add(filename)
+        result = BatchFileResult(filename=filename, language_detected=EXTENSION_LANGUAGES.get(file_ext, 'Unknown'))
+        results.append(result)
+        if file_ext not in ALLOWED_EXTENSIONS:
+            result.error = "Unsupported file type"
+        elif data is None:
+            result.error = "File too large (max 1MB)"
+        else:
+            try:
+                code = data.decode('utf-8')
+            except UnicodeDecodeError:
+                result.error = "File must be text-based"
+                continue
+            if not code.strip():
+                result.error = "File is empty"
+                continue
+            if len(code) > MAX_CODE_CHARS:
+                result.error = "Code too long (max 50,000 characters)"
+                continue
+            result.code_length = len(code)
+            batch.append(BatchFile(filename, code, result.language_detected))
+
+    with owned_by(requester(request)):
+        analyzed, prompt_count = await cancel_on_disconnect(request, analyze_batch(batch))
+    by_name = {result.filename: result for result in results}
+    codes = {item.filename: item.code for item in batch}
+    for item in analyzed:
+        history_writer.record_analysis("analyze-batch", codes[item.filename], item.review, item.language,
+                                       item.analysis_time, item.filename)
+        result = by_name[item.filename]
+        result.markdown_feedback = render_markdown(item.review)
+        result.analysis_time = item.analysis_time
+        result.packed = item.packed
+
+    return BatchAnalysisResponse(
+        results=results,
+        file_count=len(results),
+        analyzed_count=len(analyzed),
+        prompt_count=prompt_count,
+        total_time=round(time.time() - start_time, 2)
+    )
\ No newline at end of file
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import asyncio
+from app.services import database
+from app.services.findings import from_json, render_markdown
+from app.services.history import history_writer
+
+router = APIRouter()
+
+@router.get("/history")
+async def list_history(
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = None,
+    code_hash: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Recorded analyses, newest first; pass next_before_id back as before_id for the next page"""
+    items = await asyncio.to_thread(database.list_submissions, limit, before_id, code_hash, source)
+    return {
+        "items": items,
+        "next_before_id": items[-1]["id"] if len(items) == limit else None,
+        "writer": history_writer.stats()
+    }
+
+@router.get("/history/{submission_id}")
+async def get_history_entry(submission_id: int):
+    entry = await asyncio.to_thread(database.get_submission, submission_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    review = from_json(entry["feedback"] or "")
+    entry["feedback"] = render_markdown(review)
+    entry["findings"] = [finding.to_dict() for finding in review.all_findings()]
+    return entry
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import asyncio
+from app.services import database
+from app.services.cache import review_cache
+from app.services.health import CLOSED, HALF_OPEN, OPEN, provider_health
+from app.services.history import history_writer
+from app.services.inflight import inflight_reviews
+from app.services.metrics import registry
+from app.services.offload import cpu_pool
+from app.services.ratelimit import rate_limiter
+from app.services.similarity import near_duplicates
+from app.services.triage import triage_counts
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _cache_lookups():
+    stats = review_cache.stats()
+    return [({"result": "hit"}, stats["hits"]), ({"result": "persistent_hit"}, stats["persistent_hits"]),
+            ({"result": "miss"}, stats["misses"])]
+
+def _rate_limit_waiting():
+    return [({"upstream": name, "priority": level}, count)
+            for name, snapshot in rate_limiter.snapshot().items() for level, count in snapshot["waiting"].items()]
+
+def _circuit_states():
+    states = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    return [({"provider": name}, states[snapshot["state"]]) for name, snapshot in provider_health.snapshot().items()]
+
+registry.counter("code_review_cache_lookups_total", "Review cache lookups since start, by result", ["result"],
+                 collect=_cache_lookups)
+registry.gauge("code_review_cache_hit_ratio", "Share of review cache lookups answered from the cache",
+               collect=lambda: [({}, review_cache.stats()["hit_ratio"])])
+registry.gauge("code_review_cache_entries", "Reviews held in memory",
+               collect=lambda: [({}, review_cache.stats()["entries"])])
+registry.gauge("code_review_cache_bytes", "Bytes of reviews held in memory",
+               collect=lambda: [({}, review_cache.stats()["bytes"])])
+WEBHOOK_JOBS = registry.gauge("code_review_webhook_jobs", "Webhook jobs in the durable queue, by status", ["status"])
+registry.gauge("code_review_history_queue_depth", "Analysis records waiting to be written",
+               collect=lambda: [({}, history_writer.stats()["queued"])])
+registry.gauge("code_review_rate_limit_waiting", "Requests waiting for upstream quota", ["upstream", "priority"],
+               collect=_rate_limit_waiting)
+registry.gauge("code_review_pr_reviews_in_flight", "Pull request reviews running",
+               collect=lambda: [({}, inflight_reviews.stats()["in_flight"])])
+registry.counter("code_review_triage_decisions_total", "Triage decisions since start, by outcome", ["outcome"],
+                 collect=lambda: [({"outcome": outcome}, count) for outcome, count in triage_counts.items()])
+registry.gauge("code_review_offload_pending", "Local analysis jobs queued or running in worker processes",
+               collect=lambda: [({}, cpu_pool.pending)])
+registry.counter("code_review_offload_jobs_total", "Local analysis jobs since start, by how they ran", ["mode"],
+                 collect=lambda: [({"mode": mode}, count) for mode, count in cpu_pool.counts.items()])
+registry.counter("code_review_near_duplicates_total", "Near-duplicate index lookups since start, by outcome",
+                 ["outcome"],
+                 collect=lambda: [({"outcome": outcome}, count) for outcome, count in near_duplicates.counts.items()])
+registry.gauge("code_review_provider_circuit_state", "Provider circuit breaker state (0 closed, 1 half-open, 2 open)",
+               ["provider"], collect=_circuit_states)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    try:
+        counts = await asyncio.to_thread(database.count_webhook_jobs)
+    except Exception:
+        counts = {}
+    for status in set(counts) | {"queued", "running"}:
+        WEBHOOK_JOBS.set(counts.get(status, 0), status=status or "unknown")
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
\ No newline at end of file
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+import asyncio
 import hmac
 import hashlib
 import os
-from app.services.huggingface import analyze_code
-from app.services.github import get_pr_diff, post_pr_comment
+from app.services import database
+from app.services.jobs import webhook_workers, pull_request_key
+from app.services.history import history_writer
 
 router = APIRouter()
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "supersecret123")
@@ -24,15 +27,24 @@ async def webhook_endpoint(request: Request):
         data = await request.json()
         action = data.get("action")
         if action in ["opened", "synchronize"]:
-            owner = data["repository"]["owner"]["login"]
-            repo = data["repository"]["name"]
-            pull_number = data["pull_request"]["number"]
-            issue_number = data["pull_request"]["number"]
-            try:
-                diff = await get_pr_diff(owner, repo, pull_number)
-                feedback = await analyze_code(diff, language=None)
-                await post_pr_comment(owner, repo, issue_number, feedback)
-                return {"status": "ok"}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
-    return {"status": "ignored"} 
\ No newline at end of file
+            # Review happens in the background worker pool; GitHub only waits for the enqueue
+            job_id = await webhook_workers.enqueue(
+                event,
+                payload.decode("utf-8"),
+                pr_key=pull_request_key(data),
+                head_sha=data["pull_request"].get("head", {}).get("sha"),
+            )
+            return JSONResponse(status_code=202, content={"status": "queued", "job_id": job_id})
+    history_writer.record_webhook(event, payload.decode("utf-8", errors="replace"), "ignored")
+    return {"status": "ignored"}
+
+@router.get("/webhook/jobs")
+async def webhook_queue_status():
+    return {"jobs": await asyncio.to_thread(database.count_webhook_jobs)}
+
+@router.get("/webhook/jobs/{job_id}")
+async def webhook_job_status(job_id: int):
+    job = await asyncio.to_thread(database.get_webhook_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
\ No newline at end of file
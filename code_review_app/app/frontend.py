@@ -1,9 +1,22 @@
 import streamlit as st
 import httpx
+import json
 import os
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000/api")
 
+def stream_events(path: str, payload: dict, timeout: float):
+    """Yield (event, data) pairs from a Server-Sent Events endpoint"""
+    with httpx.stream("POST", f"{BACKEND_URL}{path}", json=payload, timeout=timeout) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[5:].strip())
+                event = "message"
+
 st.title("AI Code Review")
 
 code = st.text_area("Paste your code here", height=300)
@@ -14,14 +27,19 @@ if st.button("Analyze"):
     else:
         with st.spinner("Analyzing..."):
             try:
-                response = httpx.post(
-                    f"{BACKEND_URL}/analyze",
-                    json={"code": code, "language": language if language != "None" else None},
+                # Render the review progressively as tokens arrive
+                output = st.empty()
+                feedback = ""
+                for event, data in stream_events(
+                    "/analyze/stream",
+                    {"code": code, "language": language if language != "None" else None},
                     timeout=30
-                )
-                response.raise_for_status()
-                feedback = response.json()["markdown_feedback"]
-                st.markdown(feedback)
+                ):
+                    if event == "token":
+                        feedback += data["text"]
+                        output.markdown(feedback)
+                    elif event == "error":
+                        st.error(f"Error: {data['detail']}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 
@@ -37,13 +55,16 @@ if st.button("Review PR"):
     else:
         with st.spinner("Reviewing PR..."):
             try:
-                response = httpx.post(
-                    f"{BACKEND_URL}/review-pr",
-                    json={"pr_url": pr_url},
-                    timeout=60
-                )
-                response.raise_for_status()
-                feedback = response.json()["markdown_feedback"]
-                st.markdown(feedback)
+                # Show each file chunk as soon as its review is ready, in diff order
+                output = st.empty()
+                sections = {}
+                for event, data in stream_events("/review-pr/stream", {"pr_url": pr_url}, timeout=60):
+                    if event == "chunk":
+                        sections[data["index"]] = f"{data['title']}\n\n{data['feedback']}"
+                        output.markdown("\n\n".join(sections[index] for index in sorted(sections)))
+                    elif event == "done":
+                        output.markdown(data["markdown_feedback"])
+                    elif event == "error":
+                        st.error(f"Error: {data['detail']}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
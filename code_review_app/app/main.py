@@ -1,7 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import analyze, webhook
-from app.services.database import init_db
+from fastapi.responses import JSONResponse
+from app.api import analyze, webhook, history, metrics
+import asyncio
+import logging
+import time
+from app.services.database import DB_PATH, SHARED_STATE, init_db, cache_purge, close_db
+from app.services.cache import review_cache
+from app.services.http_clients import WARMUP_CONNECTIONS, start_clients, close_clients, warm_up_connections
+from app.services.jobs import webhook_workers
+from app.services.health import provider_health
+from app.services.history import history_writer
+from app.services.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, watch_event_loop
+from app.services.offload import cpu_pool
+from app.services.rules import warm_rules
+from app.services.tracing import TRACE_HEADER, configure_logging, set_trace_id, trace_id
+from app.services.warmup import warm_up
+
+configure_logging()
+logger = logging.getLogger("app.access")
 
 app = FastAPI(
     title="AI Code Review App",
@@ -25,17 +42,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give each request a trace ID (the caller's, if sent) and time it"""
+    token = set_trace_id(request.headers.get(TRACE_HEADER))
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers[TRACE_HEADER] = trace_id.get()
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        HTTP_IN_FLIGHT.dec()
+        # The route template keeps label cardinality bounded (/api/history/{submission_id})
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=status)
+        logger.info("%s %s %s", request.method, request.url.path, status, extra={
+            "method": request.method, "path": request.url.path, "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+        })
+        trace_id.reset(token)
+
+# Finished in the background after startup; /ready reports 503 until they are done
+warm_up.add("rules", lambda: asyncio.to_thread(warm_rules))  # Rule sets for every language
+warm_up.add("analysis_workers", cpu_pool.start)  # Warm worker processes for large local analyses
+if WARMUP_CONNECTIONS:
+    warm_up.add("upstream_connections", warm_up_connections)  # TCP and TLS set up before the first call
+
 @app.on_event("startup")
 async def startup_event():
-    init_db()  # Initialize SQLite (optional)
+    await asyncio.to_thread(init_db)  # Create or migrate the SQLite schema at DB_PATH
+    if SHARED_STATE and DB_PATH == ":memory:":
+        logging.getLogger(__name__).warning(
+            "SHARED_STATE needs a file database; a memory database is private to each worker")
+    if review_cache.persist:
+        await asyncio.to_thread(cache_purge, time.time())  # Drop reviews that expired while we were down
+    await start_clients()  # Pooled keep-alive clients for upstream APIs
+    await provider_health.start()  # Pick up breakers other workers opened (SHARED_STATE)
+    await history_writer.start()  # Batched writes of analysis and webhook history
+    await webhook_workers.start()  # Drain queued webhook reviews in the background
+    app.state.loop_watcher = asyncio.create_task(watch_event_loop())  # Event loop lag for /metrics
+    await warm_up.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await warm_up.stop()
+    app.state.loop_watcher.cancel()
+    await webhook_workers.stop()
+    await history_writer.stop()
+    await provider_health.stop()
+    await cpu_pool.stop()
+    await close_clients()
+    close_db()
 
 app.include_router(analyze.router, prefix="/api", tags=["analysis"])
 app.include_router(webhook.router, prefix="/api", tags=["webhooks"])
+app.include_router(history.router, prefix="/api", tags=["history"])
+app.include_router(metrics.router, tags=["metrics"])
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "AI Code Review API is running"}
 
+@app.get("/live")
+async def liveness():
+    """The process is up and its event loop is answering"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """200 once warm-up is done, 503 before; route traffic to this replica only after a 200"""
+    state = warm_up.snapshot()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
 @app.get("/")
 async def root():
     return {
@@ -46,6 +128,10 @@ async def root():
             "analyze-file": "/api/analyze-file",
             "supported-languages": "/api/supported-languages",
             "webhook": "/api/webhook",
-            "health": "/health"
+            "history": "/api/history",
+            "metrics": "/metrics",
+            "health": "/health",
+            "live": "/live",
+            "ready": "/ready"
         }
     } 
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from app.services.findings import Review, render_markdown
+from app.services.huggingface import analyze_code, local_analysis
+from app.services.prompts import compact_code
+from app.services.ratelimit import BATCH, priority
+from app.services.triage import needs_remote
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Files smaller than BATCH_PACK_CHARS share provider prompts of up to BATCH_PACK_LIMIT characters
+BATCH_PACK_CHARS = int(os.getenv("BATCH_PACK_CHARS", "4000"))
+BATCH_PACK_LIMIT = int(os.getenv("BATCH_PACK_LIMIT", "16000"))
+
+FILE_HEADING = "### File: "
+
+@dataclass
+class BatchFile:
+    filename: str
+    code: str
+    language: str | None
+
+@dataclass
+class BatchResult:
+    filename: str
+    language: str | None
+    review: Review
+    analysis_time: float
+    packed: bool = False
+
+def pack_files(files: list[BatchFile]) -> list[list[BatchFile]]:
+    """Group small files into shared prompts; large files get a prompt each"""
+    groups: list[list[BatchFile]] = []
+    current: list[BatchFile] = []
+    used = 0
+    for file in sorted(files, key=lambda f: len(f.code)):
+        if len(file.code) >= BATCH_PACK_CHARS:
+            groups.append([file])
+            continue
+        if current and used + len(file.code) > BATCH_PACK_LIMIT:
+            groups.append(current)
+            current, used = [], 0
+        current.append(file)
+        used += len(file.code)
+    if current:
+        groups.append(current)
+    return groups
+
+def packed_prompt(group: list[BatchFile]) -> str:
+    parts = [
+        f"The following {len(group)} files are independent. Review each one separately, "
+        f"starting each review with a '{FILE_HEADING}<name>' heading."
+    ]
+    for file in group:
+        parts.append(f"{FILE_HEADING}{file.filename}\n```{file.language or 'text'}\n{compact_code(file.code)}\n```")
+    return "\n\n".join(parts)
+
+def split_packed_review(group: list[BatchFile], review: str) -> dict[str, Review]:
+    """Split a packed review on the per-file headings the prompt asked for"""
+    names = {file.filename for file in group}
+    sections: dict[str, str] = {}
+    pattern = re.compile(r"^#+\s*File:\s*`?([^`\n]+?)`?\s*$", re.MULTILINE)
+    matches = list(pattern.finditer(review))
+    for match, following in zip(matches, matches[1:] + [None]):
+        name = match.group(1).strip()
+        if name in names:
+            end = following.start() if following else len(review)
+            sections[name] = Review(text=review[match.end():end].strip())
+    return sections
+
+async def analyze_group(group: list[BatchFile]) -> list[BatchResult]:
+    start_time = time.time()
+    if len(group) == 1:
+        file = group[0]
+        review = await analyze_code(file.code, file.language, triage=False)
+        return [BatchResult(file.filename, file.language, review, round(time.time() - start_time, 2))]
+
+    languages = {file.language for file in group}
+    try:
+        review = await analyze_code(
+            packed_prompt(group), languages.pop() if len(languages) == 1 else None, allow_fallback=False
+        )
+        # The per-file headings are in the model's text, or in an earlier review it was merged with
+        sections = split_packed_review(group, render_markdown(review))
+    except Exception:
+        # No remote provider answered: the local rules are cheap, run them per file
+        reviews = await asyncio.gather(*(local_analysis(file.code, file.language) for file in group))
+        sections = {file.filename: file_review for file, file_review in zip(group, reviews)}
+        review = Review()
+    elapsed = round(time.time() - start_time, 2)
+    return [
+        BatchResult(file.filename, file.language, sections.get(file.filename, review), elapsed, packed=True)
+        for file in group
+    ]
+
+async def analyze_batch(files: list[BatchFile]) -> tuple[list[BatchResult], int]:
+    """Analyze many files with bounded concurrency, packing small files into
+    shared prompts. Trivial files are answered by the rules without a prompt.
+    Returns results in input order and the number of prompts."""
+    results: dict[int, BatchResult] = {}
+    remote = []
+    for file in files:
+        if needs_remote(file.code, file.language):
+            remote.append(file)
+        else:
+            start_time = time.time()
+            review = await local_analysis(file.code, file.language)
+            results[id(file)] = BatchResult(file.filename, file.language, review, round(time.time() - start_time, 2))
+
+    groups = pack_files(remote)
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(group: list[BatchFile]) -> list[BatchResult]:
+        async with semaphore:
+            return await analyze_group(group)
+
+    # pack_files reorders files by size; each group's results follow its own
+    # files, and are keyed by file below to restore the input order.
+    # Batch work queues behind interactive and webhook requests for upstream quota.
+    with priority(BATCH):
+        grouped_results = await asyncio.gather(*(run(group) for group in groups))
+    for group, group_results in zip(groups, grouped_results):
+        for file, result in zip(group, group_results):
+            results[id(file)] = result
+    return [results[id(file)] for file in files], len(groups)
\ No newline at end of file
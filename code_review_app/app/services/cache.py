@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from app.services import database
+from app.services.database import SHARED_STATE
+
+# In-process tier: bounded by entry count and total payload size
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", "3600"))  # seconds
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "1024"))
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Optional persistent tier in the SQLite database from database.py; on by
+# default with SHARED_STATE so worker processes reuse each other's reviews
+REVIEW_CACHE_PERSIST = os.getenv("REVIEW_CACHE_PERSIST", str(SHARED_STATE)).lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+def normalize_code(code: str) -> str:
+    """Normalize line endings and trailing whitespace so cosmetic edits share a key"""
+    if "\r" in code:
+        code = code.replace("\r\n", "\n").replace("\r", "\n")
+    lines = code.split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+def make_cache_key(code: str, language: str | None, provider: str, prompt_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (prompt_version, provider, (language or "").lower(), normalize_code(code)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ReviewCache:
+    """Two-tier review cache: an LRU dict with TTL in front of an optional SQLite table"""
+
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int, persist: bool):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self._entries: OrderedDict[str, tuple[float, int, str]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> str | None:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, _, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+
+        if self.persist:
+            try:
+                value = await asyncio.to_thread(database.cache_get, key, now)
+            except Exception as e:
+                logger.warning("Review cache lookup failed", extra={"error": str(e)})
+                value = None
+            if value is not None:
+                self.persistent_hits += 1
+                self._store(key, value, now + self.ttl)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._store(key, value, expires_at)
+        if self.persist:
+            try:
+                await asyncio.to_thread(database.cache_put, key, value, expires_at)
+            except Exception as e:
+                logger.warning("Review cache write failed", extra={"error": str(e)})
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "persistent": self.persist,
+        }
+
+    def _store(self, key: str, value: str, expires_at: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+review_cache = ReviewCache(
+    ttl=REVIEW_CACHE_TTL,
+    max_entries=REVIEW_CACHE_MAX_ENTRIES,
+    max_bytes=REVIEW_CACHE_MAX_BYTES,
+    persist=REVIEW_CACHE_PERSIST,
+)
\ No newline at end of file
@@ -1,26 +1,541 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable
 
-DB_PATH = os.getenv("DB_PATH", ":memory:")
+DB_PATH = os.getenv("DB_PATH", "code_review.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+
+# Keep state that would otherwise live in one process (rate-limit buckets,
+# circuit breakers, in-flight PR reviews, the review cache) in the database at
+# DB_PATH, so several worker processes share it; serve.py turns this on when it
+# starts more than one worker. Needs a file database, not ":memory:".
+SHARED_STATE = os.getenv("SHARED_STATE", "false").lower() in ("1", "true", "yes")
+
+# A plain ":memory:" database is private to a single connection, so every
+# helper below would see an empty schema. Use a named shared-cache memory
+# database instead; the pool keeps its connection open so it outlives the calls.
+_MEMORY_URI = "file:code_review?mode=memory&cache=shared"
+
+class ConnectionPool:
+    """Reusable SQLite connections shared by the threads that run the helpers below.
+
+    Connections are in autocommit mode; multi-statement writes go through
+    transaction(). File databases use WAL so readers never block the writer.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.memory = path == ":memory:"
+        # Shared-cache memory databases take table locks that ignore the busy
+        # timeout, so they get a single connection that callers take in turn
+        self.size = 1 if self.memory else max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.memory:
+            return sqlite3.connect(_MEMORY_URI, uri=True, timeout=DB_BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=DB_BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """A connection inside BEGIN IMMEDIATE, committed on success and rolled back on error"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+    return _pool
+
+def close_db():
+    """Close the pooled connections (a memory database is discarded with them)"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS submissions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT,
-            feedback TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS webhooks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_type TEXT,
-            payload TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close() 
\ No newline at end of file
+    # One transaction, so workers starting together migrate the schema once
+    with get_pool().transaction() as conn:
+        c = conn.cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT,
+                feedback TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Analysis history: what was reviewed, where the request came from and how long it took
+        _ensure_columns(c, "submissions", {
+            "code_hash": "TEXT",
+            "code_length": "INTEGER",
+            "language": "TEXT",
+            "source": "TEXT",
+            "reference": "TEXT",
+            "analysis_time": "REAL",
+        })
+        c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_timestamp ON submissions (timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_code_hash ON submissions (code_hash)")
+        # Near-duplicate index of remote reviews: a SimHash per review plus its LSH band keys
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS similar_reviews (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT,
+                simhash INTEGER,
+                shape_hash TEXT,
+                code TEXT,
+                feedback TEXT,
+                created_at REAL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS similar_review_bands (
+                scope TEXT,
+                band INTEGER,
+                review_id INTEGER
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_similar_review_bands ON similar_review_bands (scope, band)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_similar_review_bands_review ON similar_review_bands (review_id)")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS webhooks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_type TEXT,
+                payload TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # The webhooks table doubles as the durable webhook job queue
+        _ensure_columns(c, "webhooks", {
+            "status": "TEXT DEFAULT 'queued'",
+            "attempts": "INTEGER DEFAULT 0",
+            "next_attempt_at": "REAL DEFAULT 0",
+            "last_error": "TEXT",
+            "updated_at": "REAL",
+            "pr_key": "TEXT",
+            "head_sha": "TEXT",
+        })
+        c.execute("CREATE INDEX IF NOT EXISTS idx_webhooks_queue ON webhooks (status, next_attempt_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_webhooks_pr ON webhooks (pr_key, status)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_webhooks_timestamp ON webhooks (timestamp)")
+        # Incremental PR reviews: last reviewed head and findings per diff chunk
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS pr_reviews (
+                pr_key TEXT PRIMARY KEY,
+                head_sha TEXT,
+                feedback TEXT,
+                updated_at REAL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS pr_hunks (
+                pr_key TEXT,
+                hunk_hash TEXT,
+                feedback TEXT,
+                PRIMARY KEY (pr_key, hunk_hash)
+            )
+        """)
+        # The GitHub review the bot last posted on each PR, updated instead of stacking new ones
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS posted_reviews (
+                pr_key TEXT PRIMARY KEY,
+                review_id INTEGER,
+                head_sha TEXT,
+                posted_at REAL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS review_cache (
+                cache_key TEXT PRIMARY KEY,
+                feedback TEXT,
+                expires_at REAL
+            )
+        """)
+        # State shared by worker processes when SHARED_STATE is on
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL,
+                updated REAL,
+                blocked_until REAL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS provider_breakers (
+                provider TEXT PRIMARY KEY,
+                state TEXT,
+                opened_at REAL,
+                probe_until REAL DEFAULT 0,
+                updated_at REAL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS inflight_reviews (
+                pr_key TEXT PRIMARY KEY,
+                head_sha TEXT,
+                owner TEXT,
+                heartbeat REAL
+            )
+        """)
+
+def _ensure_columns(cursor, table: str, columns: dict[str, str]):
+    """Add columns missing from tables created by older versions of init_db"""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+def record_submissions(rows: list[tuple]) -> int:
+    """Insert (code, code_hash, code_length, feedback, language, source, reference, analysis_time) rows at once"""
+    with get_pool().transaction() as conn:
+        conn.executemany(
+            "INSERT INTO submissions (code, code_hash, code_length, feedback, language, source, reference, "
+            "analysis_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    return len(rows)
+
+def record_webhooks(rows: list[tuple[str, str, str]]) -> int:
+    """Insert (event_type, payload, status) rows for webhooks that are logged but not queued"""
+    with get_pool().transaction() as conn:
+        conn.executemany("INSERT INTO webhooks (event_type, payload, status) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+_HISTORY_COLUMNS = ("id", "code_hash", "code_length", "language", "source", "reference", "analysis_time", "timestamp")
+
+def list_submissions(limit: int, before_id: int | None = None, code_hash: str | None = None,
+                     source: str | None = None) -> list[dict]:
+    """Newest submissions first; pass the last id seen as before_id for the next page"""
+    clauses, params = [], []
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    if code_hash is not None:
+        clauses.append("code_hash = ?")
+        params.append(code_hash)
+    if source is not None:
+        clauses.append("source = ?")
+        params.append(source)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(_HISTORY_COLUMNS)} FROM submissions {where}ORDER BY id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+    return [dict(zip(_HISTORY_COLUMNS, row)) for row in rows]
+
+def get_submission(submission_id: int) -> dict | None:
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(_HISTORY_COLUMNS)}, code, feedback FROM submissions WHERE id = ?",
+            (submission_id,)
+        ).fetchone()
+    return dict(zip(_HISTORY_COLUMNS + ("code", "feedback"), row)) if row else None
+
+def add_similar_review(scope: str, simhash: int, shape_hash: str, code: str, feedback: str, bands: list[int],
+                       now: float, max_entries: int) -> int:
+    """Index a review for near-duplicate lookups, dropping the oldest beyond max_entries"""
+    with get_pool().transaction() as conn:
+        review_id = conn.execute(
+            "INSERT INTO similar_reviews (scope, simhash, shape_hash, code, feedback, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (scope, simhash, shape_hash, code, feedback, now)
+        ).lastrowid
+        conn.executemany("INSERT INTO similar_review_bands (scope, band, review_id) VALUES (?, ?, ?)",
+                         [(scope, band, review_id) for band in bands])
+        oldest_kept = review_id - max_entries
+        if oldest_kept > 0:
+            conn.execute("DELETE FROM similar_reviews WHERE id <= ?", (oldest_kept,))
+            conn.execute("DELETE FROM similar_review_bands WHERE review_id <= ?", (oldest_kept,))
+    return review_id
+
+def find_similar_candidates(scope: str, bands: list[int], since: float) -> list[tuple[int, int, str]]:
+    """(id, simhash, shape_hash) of reviews indexed since `since` that share an LSH band"""
+    with get_pool().connection() as conn:
+        return conn.execute(
+            "SELECT id, simhash, shape_hash FROM similar_reviews WHERE created_at >= ? AND id IN "
+            f"(SELECT review_id FROM similar_review_bands WHERE scope = ? AND band IN ({', '.join('?' * len(bands))}))",
+            (since, scope, *bands)
+        ).fetchall()
+
+def get_similar_review(review_id: int) -> tuple[str, str] | None:
+    """(code, feedback) of an indexed review"""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT code, feedback FROM similar_reviews WHERE id = ?", (review_id,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+def cache_get(cache_key: str, now: float) -> str | None:
+    """Return a persisted review if it has not expired yet"""
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            "SELECT feedback FROM review_cache WHERE cache_key = ? AND expires_at > ?",
+            (cache_key, now)
+        ).fetchone()
+    return row[0] if row else None
+
+def cache_put(cache_key: str, feedback: str, expires_at: float):
+    with get_pool().connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO review_cache (cache_key, feedback, expires_at) VALUES (?, ?, ?)",
+            (cache_key, feedback, expires_at)
+        )
+
+def cache_purge(now: float) -> int:
+    """Drop expired cache rows, returning how many were removed"""
+    with get_pool().connection() as conn:
+        return conn.execute("DELETE FROM review_cache WHERE expires_at <= ?", (now,)).rowcount
+
+def get_pr_review(pr_key: str) -> tuple[str, str] | None:
+    """Return (head_sha, feedback) of the last completed review of a PR"""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT head_sha, feedback FROM pr_reviews WHERE pr_key = ?", (pr_key,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+def get_pr_hunks(pr_key: str) -> dict[str, str]:
+    with get_pool().connection() as conn:
+        return dict(conn.execute("SELECT hunk_hash, feedback FROM pr_hunks WHERE pr_key = ?", (pr_key,)).fetchall())
+
+def save_pr_review(pr_key: str, head_sha: str | None, feedback: str, hunks: dict[str, str], now: float):
+    """Store a PR review, replacing the chunk findings of the previous one.
+    Without a head SHA (a review requested by URL) the stored one is kept."""
+    with get_pool().transaction() as conn:
+        conn.execute(
+            "INSERT INTO pr_reviews (pr_key, head_sha, feedback, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (pr_key) DO UPDATE SET head_sha = COALESCE(excluded.head_sha, pr_reviews.head_sha), "
+            "feedback = excluded.feedback, updated_at = excluded.updated_at",
+            (pr_key, head_sha, feedback, now)
+        )
+        conn.execute("DELETE FROM pr_hunks WHERE pr_key = ?", (pr_key,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO pr_hunks (pr_key, hunk_hash, feedback) VALUES (?, ?, ?)",
+            [(pr_key, hunk_hash, hunk_feedback) for hunk_hash, hunk_feedback in hunks.items()]
+        )
+
+def get_posted_review(pr_key: str) -> tuple[int, str | None] | None:
+    """Return (review_id, head_sha) of the GitHub review last posted on a PR"""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT review_id, head_sha FROM posted_reviews WHERE pr_key = ?", (pr_key,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+def save_posted_review(pr_key: str, review_id: int, head_sha: str | None, now: float):
+    with get_pool().connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO posted_reviews (pr_key, review_id, head_sha, posted_at) VALUES (?, ?, ?, ?)",
+            (pr_key, review_id, head_sha, now)
+        )
+
+def enqueue_webhook(event_type: str, payload: str, now: float, pr_key: str | None = None,
+                    head_sha: str | None = None) -> int:
+    """Queue a webhook job; older queued jobs for the same PR are marked 'superseded'"""
+    with get_pool().transaction() as conn:
+        if pr_key is not None:
+            conn.execute(
+                "UPDATE webhooks SET status = 'superseded', updated_at = ? WHERE pr_key = ? AND status = 'queued'",
+                (now, pr_key)
+            )
+        cursor = conn.execute(
+            "INSERT INTO webhooks (event_type, payload, status, attempts, next_attempt_at, updated_at, pr_key, head_sha) "
+            "VALUES (?, ?, 'queued', 0, ?, ?, ?, ?)",
+            (event_type, payload, now, now, pr_key, head_sha)
+        )
+    return cursor.lastrowid
+
+def claim_webhook_job(now: float, stale_before: float) -> dict | None:
+    """Atomically move the oldest due job to 'running' and return it. A 'running'
+    job not touched since stale_before lost its worker and is claimed again."""
+    with get_pool().transaction() as conn:
+        row = conn.execute(
+            "SELECT id, event_type, payload, attempts FROM webhooks "
+            "WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'running' AND updated_at < ?) "
+            "ORDER BY id LIMIT 1",
+            (now, stale_before)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE webhooks SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (now, row[0])
+        )
+    return {"id": row[0], "event_type": row[1], "payload": row[2], "attempts": row[3] + 1}
+
+def finish_webhook_job(job_id: int, status: str, now: float, error: str | None = None, retry_at: float | None = None):
+    """Record the outcome of a job: 'done', 'dead', 'superseded', or 'queued' again with retry_at"""
+    with get_pool().connection() as conn:
+        conn.execute(
+            "UPDATE webhooks SET status = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at), "
+            "updated_at = ? WHERE id = ?",
+            (status, error, retry_at, now, job_id)
+        )
+
+def touch_webhook_job(job_id: int, now: float):
+    """Renew the lease of a running job"""
+    with get_pool().connection() as conn:
+        conn.execute("UPDATE webhooks SET updated_at = ? WHERE id = ? AND status = 'running'", (now, job_id))
+
+def requeue_running_webhooks(now: float, stale_before: float) -> int:
+    """Return jobs left 'running' by a process that stopped renewing their lease to the queue"""
+    with get_pool().connection() as conn:
+        return conn.execute(
+            "UPDATE webhooks SET status = 'queued', next_attempt_at = ?, updated_at = ? "
+            "WHERE status = 'running' AND updated_at < ?",
+            (now, now, stale_before)
+        ).rowcount
+
+def get_webhook_job(job_id: int) -> dict | None:
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            "SELECT id, event_type, status, attempts, last_error, timestamp, next_attempt_at, updated_at, head_sha "
+            "FROM webhooks WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    keys = ("id", "event_type", "status", "attempts", "last_error", "created_at", "next_attempt_at", "updated_at",
+            "head_sha")
+    return dict(zip(keys, row))
+
+def count_webhook_jobs() -> dict[str, int]:
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM webhooks GROUP BY status").fetchall()
+    return {status: count for status, count in rows}
+
+def update_rate_bucket(name: str, update: Callable[[tuple | None], tuple[float, float, float]]) -> tuple:
+    """Read-modify-write a shared rate-limit bucket under the write lock. `update` gets the
+    stored (tokens, updated, blocked_until), or None for a new bucket, and returns the new one."""
+    with get_pool().transaction() as conn:
+        row = conn.execute(
+            "SELECT tokens, updated, blocked_until FROM rate_buckets WHERE name = ?", (name,)
+        ).fetchone()
+        state = update(row)
+        conn.execute(
+            "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+            (name, *state)
+        )
+    return state
+
+def save_breaker(provider: str, state: str, opened_at: float, now: float):
+    """Publish a provider's circuit breaker state to the other workers"""
+    with get_pool().connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO provider_breakers (provider, state, opened_at, probe_until, updated_at) "
+            "VALUES (?, ?, ?, 0, ?)",
+            (provider, state, opened_at, now)
+        )
+
+def load_breakers() -> dict[str, tuple[str, float, float]]:
+    """(state, opened_at, updated_at) per provider"""
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT provider, state, opened_at, updated_at FROM provider_breakers").fetchall()
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+def claim_breaker_probe(provider: str, now: float, cooldown: float, probe_timeout: float) -> bool:
+    """Whether this worker may send the single probe call to a provider whose breaker
+    cooled down; the claim lapses after probe_timeout in case the prober dies"""
+    with get_pool().transaction() as conn:
+        row = conn.execute(
+            "SELECT state, opened_at, probe_until FROM provider_breakers WHERE provider = ?", (provider,)
+        ).fetchone()
+        if row is None or row[0] != "open":
+            return True
+        if now - row[1] < cooldown or row[2] > now:
+            return False
+        conn.execute("UPDATE provider_breakers SET probe_until = ? WHERE provider = ?",
+                     (now + probe_timeout, provider))
+    return True
+
+def claim_inflight_review(pr_key: str, head_sha: str | None, owner: str, now: float,
+                          stale_before: float) -> tuple[str | None, str] | None:
+    """Register `owner` as the process reviewing a PR. Returns None once claimed, or the
+    (head_sha, owner) of the live review to wait for. A review of another head SHA, or
+    one whose heartbeat stopped before stale_before, is taken over."""
+    with get_pool().transaction() as conn:
+        row = conn.execute(
+            "SELECT head_sha, owner, heartbeat FROM inflight_reviews WHERE pr_key = ?", (pr_key,)
+        ).fetchone()
+        if (row is not None and row[1] != owner and row[2] >= stale_before
+                and (head_sha is None or row[0] is None or row[0] == head_sha)):
+            return row[0], row[1]
+        conn.execute(
+            "INSERT OR REPLACE INTO inflight_reviews (pr_key, head_sha, owner, heartbeat) VALUES (?, ?, ?, ?)",
+            (pr_key, head_sha, owner, now)
+        )
+    return None
+
+def touch_inflight_review(pr_key: str, owner: str, now: float) -> bool:
+    """Renew a claim; False when another process took the PR over"""
+    with get_pool().connection() as conn:
+        return conn.execute(
+            "UPDATE inflight_reviews SET heartbeat = ? WHERE pr_key = ? AND owner = ?", (now, pr_key, owner)
+        ).rowcount == 1
+
+def release_inflight_review(pr_key: str, owner: str):
+    with get_pool().connection() as conn:
+        conn.execute("DELETE FROM inflight_reviews WHERE pr_key = ? AND owner = ?", (pr_key, owner))
+
+def get_inflight_review(pr_key: str) -> tuple[str | None, str, float] | None:
+    """(head_sha, owner, heartbeat) of the review running for a PR, if any"""
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            "SELECT head_sha, owner, heartbeat FROM inflight_reviews WHERE pr_key = ?", (pr_key,)
+        ).fetchone()
+    return (row[0], row[1], row[2]) if row else None
\ No newline at end of file
@@ -0,0 +1,191 @@
+import re
+from dataclasses import dataclass, field
+from app.services.prompts import count_tokens
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Lock files, build output and generated sources are not worth a review
+GENERATED_PATH = re.compile(
+    r"(^|/)(package-lock\.json|npm-shrinkwrap\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Pipfile\.lock"
+    r"|Cargo\.lock|Gemfile\.lock|composer\.lock|go\.sum|uv\.lock)$"
+    r"|\.min\.(js|css)$|\.map$|_pb2(_grpc)?\.py$|\.pb\.go$|\.g\.dart$|\.designer\.cs$"
+    r"|(^|/)(dist|build|vendor|node_modules)/"
+)
+GENERATED_MARKERS = ("@generated", "DO NOT EDIT", "Code generated by")
+
+@dataclass
+class Hunk:
+    header: str
+    new_start: int
+    lines: list[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header] + self.lines)
+
+@dataclass
+class FileDiff:
+    path: str
+    header: list[str] = field(default_factory=list)
+    hunks: list[Hunk] = field(default_factory=list)
+
+@dataclass
+class DiffChunk:
+    path: str
+    text: str
+    part: int = 1
+    parts: int = 1
+
+def parse_unified_diff(diff: str) -> list[FileDiff]:
+    """Split a `git diff` style unified diff into files and hunks"""
+    files: list[FileDiff] = []
+    current: FileDiff | None = None
+    hunk: Hunk | None = None
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            # "diff --git a/path b/path": the b/ side is the path after the change
+            current = FileDiff(path=line.split(" b/", 1)[-1])
+            files.append(current)
+            hunk = None
+            current.header.append(line)
+        elif current is None:
+            continue
+        elif line.startswith("@@"):
+            match = HUNK_HEADER.match(line)
+            hunk = Hunk(header=line, new_start=int(match.group(3)) if match else 0)
+            current.hunks.append(hunk)
+        elif hunk is not None:
+            hunk.lines.append(line)
+        else:
+            if line.startswith("+++ ") and line[4:] != "/dev/null":
+                current.path = line[4:].removeprefix("b/")
+            current.header.append(line)
+    return files
+
+def new_line_numbers(text: str) -> list[int | None]:
+    """For each line of a diff (or a chunk of one), its line number in the new
+    version of the file; None for file headers, hunk headers and removed lines"""
+    numbers: list[int | None] = []
+    new_line = None
+    for line in text.split("\n"):
+        match = HUNK_HEADER.match(line)
+        if match:
+            new_line = int(match.group(3))
+            numbers.append(None)
+        elif line.startswith("diff --git "):
+            new_line = None
+            numbers.append(None)
+        elif new_line is not None and line[:1] in ("+", " ", ""):
+            numbers.append(new_line)
+            new_line += 1
+        else:
+            numbers.append(None)
+    return numbers
+
+def is_generated(file: FileDiff) -> bool:
+    """Lock files and generated sources, by path or by a marker in the first added lines"""
+    if GENERATED_PATH.search(file.path):
+        return True
+    head = [line for hunk in file.hunks[:1] for line in hunk.lines[:10]]
+    return any(marker in line for line in head for marker in GENERATED_MARKERS)
+
+def trim_context(hunk: Hunk, keep: int) -> list[Hunk]:
+    """Drop unchanged lines more than `keep` lines away from a change,
+    splitting the hunk (with recomputed headers) where context was cut"""
+    match = HUNK_HEADER.match(hunk.header)
+    if match is None:
+        return [hunk]
+    section = hunk.header[match.end():]
+    changed = [i for i, line in enumerate(hunk.lines) if line[:1] in ("+", "-")]
+    kept = set()
+    for i in changed:
+        kept.update(range(max(i - keep, 0), min(i + keep + 1, len(hunk.lines))))
+    for i, line in enumerate(hunk.lines):
+        if line.startswith("\\") and i - 1 in kept:
+            kept.add(i)  # "\ No newline at end of file" belongs to the line before it
+    if len(kept) == len(hunk.lines):
+        return [hunk]
+
+    hunks: list[Hunk] = []
+    old_line, new_line = int(match.group(1)), int(match.group(3))
+    current: list[str] = []
+    start = (old_line, new_line)
+    for i, line in enumerate(hunk.lines):
+        if i in kept:
+            if not current:
+                start = (old_line, new_line)
+            current.append(line)
+        elif current:
+            hunks.append(_make_hunk(start, current, section))
+            current = []
+        kind = line[:1]
+        if kind not in ("+", "\\"):
+            old_line += 1
+        if kind not in ("-", "\\"):
+            new_line += 1
+    if current:
+        hunks.append(_make_hunk(start, current, section))
+    return hunks
+
+def _make_hunk(start: tuple[int, int], lines: list[str], section: str) -> Hunk:
+    old_count = sum(1 for line in lines if line[:1] not in ("+", "\\"))
+    new_count = sum(1 for line in lines if line[:1] not in ("-", "\\"))
+    header = f"@@ -{start[0]},{old_count} +{start[1]},{new_count} @@{section}"
+    return Hunk(header=header, new_start=start[1], lines=list(lines))
+
+def compact_files(files: list[FileDiff], context_lines: int) -> list[FileDiff]:
+    """Skip generated files and trim unchanged context in the rest"""
+    compacted = []
+    for file in files:
+        if is_generated(file):
+            continue
+        hunks = [piece for hunk in file.hunks for piece in trim_context(hunk, context_lines)]
+        compacted.append(FileDiff(path=file.path, header=file.header, hunks=hunks))
+    return compacted
+
+def chunk_diff(files: list[FileDiff], token_budget: int) -> list[DiffChunk]:
+    """Pack each file's hunks into chunks of at most token_budget tokens.
+
+    Hunks are never mixed across files; a single hunk larger than the budget
+    is split on line boundaries.
+    """
+    chunks: list[DiffChunk] = []
+    for file in files:
+        header = "\n".join(file.header)
+        budget = max(token_budget - count_tokens(header), 1)
+        pieces: list[str] = []
+        for hunk in file.hunks:
+            pieces.extend(_split_text(hunk.text, budget))
+
+        file_chunks: list[str] = []
+        current: list[str] = []
+        used = 0
+        for piece in pieces:
+            cost = count_tokens(piece)
+            if current and used + cost > budget:
+                file_chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += cost
+        if current or not file_chunks:
+            file_chunks.append("\n".join(current))
+
+        for index, body in enumerate(file_chunks, start=1):
+            text = f"{header}\n{body}" if body else header
+            chunks.append(DiffChunk(path=file.path, text=text, part=index, parts=len(file_chunks)))
+    return chunks
+
+def _split_text(text: str, budget: int) -> list[str]:
+    if count_tokens(text) <= budget:
+        return [text]
+    pieces, current, used = [], [], 0
+    for line in text.split("\n"):
+        cost = count_tokens(line)
+        if current and used + cost > budget:
+            pieces.append("\n".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
\ No newline at end of file
@@ -0,0 +1,208 @@
+import json
+
+# Reviews are kept as structured findings and a model's free-form text, stored
+# as compact JSON (cache, history, PR hunks, near-duplicate index) and only
+# rendered to markdown at the API edge
+
+# Report section for each severity, in report order
+SECTIONS = {
+    "error": "## 🚨 Security Issues",
+    "warning": "## ⚠️ Code Quality Issues",
+    "info": "## 💡 Suggestions",
+}
+
+# Severity of each rule category
+CATEGORY_SEVERITIES = {
+    "security": "error",
+    "quality": "warning",
+    "performance": "info",
+}
+
+NO_ISSUES = [
+    "## ✅ Analysis Complete",
+    "No obvious issues found in this code!",
+    "",
+    "**Note**: This is a basic rule-based analysis. For comprehensive review, consider:",
+    "- Setting up a Hugging Face API token for AI-powered analysis",
+    "- Using OpenAI API (free $5 credit) for detailed code review",
+    "- Running static analysis tools like ESLint, Pylint, or SonarQube",
+]
+
+INLINE_NOTE = "_{count} finding{s} posted as inline comments on the changed lines._"
+
+class Finding:
+    """One finding; lines and columns are 1-based positions in the reviewed code"""
+    __slots__ = ("rule_id", "severity", "message", "path", "line", "end_line", "column")
+
+    def __init__(self, rule_id: str, severity: str, message: str, path: str | None = None,
+                 line: int | None = None, end_line: int | None = None, column: int | None = None):
+        self.rule_id = rule_id
+        self.severity = severity
+        self.message = message
+        self.path = path
+        self.line = line
+        self.end_line = end_line
+        self.column = column
+
+    def key(self) -> tuple:
+        """Identity for deduplication: the same rule at the same place"""
+        return self.rule_id, self.path, self.line
+
+    def at(self, path: str | None, lines: list[int | None] | None = None) -> "Finding":
+        """This finding in the file at `path`; `lines` maps lines of the reviewed
+        code (a diff) to lines of that file, dropping the diff's +/- column"""
+        if lines is None:
+            return Finding(self.rule_id, self.severity, self.message, path, self.line, self.end_line, self.column)
+        line = _map_line(self.line, lines)
+        column = self.column - 1 if line is not None and self.column is not None and self.column > 1 else None
+        return Finding(self.rule_id, self.severity, self.message, path, line, _map_line(self.end_line, lines), column)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_list(self) -> list:
+        # Positional, with trailing empty fields dropped
+        fields = [self.rule_id, self.severity, self.message, self.path, self.line, self.end_line, self.column]
+        while fields[-1] is None:
+            fields.pop()
+        return fields
+
+    @classmethod
+    def from_list(cls, fields: list) -> "Finding":
+        return cls(*fields)
+
+    def render(self) -> str:
+        if self.line is None:
+            return self.message
+        if self.column is None:
+            return f"{self.message} _(line {self.line})_"
+        return f"{self.message} _(line {self.line}, col {self.column})_"
+
+class Review:
+    """A review: findings and/or a model's markdown `text`, notes shown at the
+    end, the analysis info of a rule-based review (language, characters,
+    lines), and titled parts (e.g. one per pull request chunk)"""
+    __slots__ = ("title", "findings", "text", "notes", "info", "parts")
+
+    def __init__(self, findings: list[Finding] | None = None, text: str | None = None,
+                 notes: list[str] | None = None, info: tuple[str | None, int, int] | None = None,
+                 parts: list["Review"] | None = None, title: str | None = None):
+        self.title = title
+        self.findings = findings or []
+        self.text = text
+        self.notes = notes or []
+        self.info = info
+        self.parts = parts or []
+
+    @property
+    def rule_based(self) -> bool:
+        """Produced by the local rules rather than a remote provider"""
+        return self.info is not None
+
+    def copy(self, **changes) -> "Review":
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return Review(**fields)
+
+    def with_note(self, note: str) -> "Review":
+        return self.copy(notes=[*self.notes, note])
+
+    def titled(self, title: str) -> "Review":
+        return self.copy(title=title)
+
+    def at(self, path: str | None, lines: list[int | None] | None = None) -> "Review":
+        """This review with every finding attributed to the file at `path` (see Finding.at)"""
+        return self.copy(findings=[finding.at(path, lines) for finding in self.findings],
+                         parts=[part.at(path, lines) for part in self.parts])
+
+    def without(self, findings: list[Finding]) -> "Review":
+        """This review minus the given findings, e.g. those posted as inline comments"""
+        drop = {finding.key() for finding in findings}
+        kept = [finding for finding in self.findings if finding.key() not in drop]
+        review = self.copy(findings=kept, parts=[part.without(findings) for part in self.parts])
+        moved = len(self.findings) - len(kept)
+        if moved:
+            review = review.with_note(INLINE_NOTE.format(count=moved, s="" if moved == 1 else "s"))
+        return review
+
+    def all_findings(self) -> list[Finding]:
+        """Findings of this review and its parts, without duplicates"""
+        seen = set()
+        findings = []
+        for finding in [*self.findings, *(finding for part in self.parts for finding in part.all_findings())]:
+            if finding.key() not in seen:
+                seen.add(finding.key())
+                findings.append(finding)
+        return findings
+
+    def to_dict(self) -> dict:
+        data = {}
+        if self.title is not None:
+            data["t"] = self.title
+        if self.findings:
+            data["f"] = [finding.to_list() for finding in self.findings]
+        if self.text is not None:
+            data["x"] = self.text
+        if self.notes:
+            data["n"] = self.notes
+        if self.info is not None:
+            data["i"] = list(self.info)
+        if self.parts:
+            data["p"] = [part.to_dict() for part in self.parts]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Review":
+        return cls(
+            findings=[Finding.from_list(fields) for fields in data.get("f", ())],
+            text=data.get("x"),
+            notes=data.get("n"),
+            info=tuple(data["i"]) if "i" in data else None,
+            parts=[cls.from_dict(part) for part in data.get("p", ())],
+            title=data.get("t"),
+        )
+
+def _map_line(line: int | None, lines: list[int | None]) -> int | None:
+    return lines[line - 1] if line is not None and 0 < line <= len(lines) else None
+
+def to_json(review: Review) -> str:
+    return json.dumps(review.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+def from_json(data: str) -> Review:
+    """Load a stored review; markdown stored before reviews were structured becomes the review's text"""
+    if data.startswith("{"):
+        try:
+            return Review.from_dict(json.loads(data))
+        except (ValueError, TypeError, KeyError):
+            pass
+    return Review(text=data)
+
+def render_markdown(review: Review) -> str:
+    """The review as a markdown report"""
+    report = []
+    if review.title is not None:
+        report.extend([review.title, ""])
+    by_severity: dict[str, list[str]] = {}
+    for finding in review.findings:
+        by_severity.setdefault(finding.severity, []).append(finding.render())
+    for severity, heading in SECTIONS.items():
+        if severity in by_severity:
+            report.extend([heading, *by_severity[severity], ""])
+    if review.info is not None and not review.findings and review.text is None and not review.notes:
+        report.extend(NO_ISSUES)
+    if review.text is not None:
+        report.extend([review.text, ""])
+    for part in review.parts:
+        report.extend([render_markdown(part), ""])
+    for note in review.notes:
+        report.extend([note, ""])
+    if review.info is not None:
+        language, code_length, line_count = review.info
+        report.extend([
+            "---",
+            "**Analysis Info**:",
+            f"- Language: {language or 'Auto-detected'}",
+            f"- Code Length: {code_length} characters",
+            f"- Lines: {line_count}",
+        ])
+    return "\n".join(report).strip("\n")
\ No newline at end of file
@@ -1,24 +1,110 @@
 import os
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, retry, retry_if_exception, stop_after_attempt, wait_exponential
+from app.services.http_clients import get_client
+from app.services.metrics import RETRIES, observe_stage
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "ghp_dummyGITHUBtoken12345")
-BASE_URL = "https://api.github.com"
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+def count_retry(retry_state):
+    RETRIES.inc(operation=f"github_{retry_state.fn.__name__}")
+
+def is_retryable(error: BaseException) -> bool:
+    """Network errors, 5xx and 429; the rate limiter holds a 429 retry until GitHub's reset"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+       retry=retry_if_exception(is_retryable), before_sleep=count_retry, reraise=True)
 async def get_pr_diff(owner: str, repo: str, pull_number: int) -> str:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3.diff"}
-        url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pull_number}"
-        response = await client.get(url, headers=headers, timeout=15)
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3.diff"}
+    url = f"/repos/{owner}/{repo}/pulls/{pull_number}"
+    with observe_stage("github_diff_fetch"):
+        response = await client.get(url, headers=headers)
+    response.raise_for_status()
+    return response.text
+
+async def post_pr_review(owner: str, repo: str, pull_number: int, body: str, comments: list[dict],
+                         commit_id: str | None = None) -> int:
+    """Post a pull request review with all its inline comments in one call; returns the review id.
+
+    The POST is not idempotent: a timeout or 5xx may come after GitHub
+    created the review, so a retry first looks for that review and only
+    posts again when it is not there.
+    """
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    url = f"/repos/{owner}/{repo}/pulls/{pull_number}/reviews"
+    payload = {"body": body, "event": "COMMENT", "comments": comments}
+    if commit_id is not None:
+        payload["commit_id"] = commit_id  # Anchors the comments to the reviewed commit
+    async for attempt in AsyncRetrying(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+                                       retry=retry_if_exception(is_retryable), reraise=True,
+                                       before_sleep=lambda _: RETRIES.inc(operation="github_post_pr_review")):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                review_id = await find_pr_review(owner, repo, pull_number, body, commit_id)
+                if review_id is not None:
+                    return review_id
+            with observe_stage("comment_post"):
+                response = await client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json()["id"]
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+       retry=retry_if_exception(is_retryable), before_sleep=count_retry, reraise=True)
+async def find_pr_review(owner: str, repo: str, pull_number: int, body: str, commit_id: str | None) -> int | None:
+    """Id of a review with this body on this commit, if one was already posted"""
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    url = f"/repos/{owner}/{repo}/pulls/{pull_number}/reviews"
+    params = {"per_page": 100}
+    while url:
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        for review in response.json():
+            if review["body"] == body and (commit_id is None or review["commit_id"] == commit_id):
+                return review["id"]
+        url, params = response.links.get("next", {}).get("url"), None
+    return None
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+       retry=retry_if_exception(is_retryable), before_sleep=count_retry, reraise=True)
+async def update_pr_review(owner: str, repo: str, pull_number: int, review_id: int, body: str):
+    """Replace the summary of a posted review; its inline comments stay"""
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    url = f"/repos/{owner}/{repo}/pulls/{pull_number}/reviews/{review_id}"
+    with observe_stage("comment_post"):
+        response = await client.put(url, json={"body": body}, headers=headers)
+    response.raise_for_status()
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+       retry=retry_if_exception(is_retryable), before_sleep=count_retry, reraise=True)
+async def list_review_comments(owner: str, repo: str, pull_number: int, review_id: int) -> list[int]:
+    """Ids of the inline comments posted with a review"""
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    url = f"/repos/{owner}/{repo}/pulls/{pull_number}/reviews/{review_id}/comments"
+    params = {"per_page": 100}
+    comment_ids = []
+    while url:
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        comment_ids.extend(comment["id"] for comment in response.json())
+        url, params = response.links.get("next", {}).get("url"), None
+    return comment_ids
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+       retry=retry_if_exception(is_retryable), before_sleep=count_retry, reraise=True)
+async def delete_review_comment(owner: str, repo: str, comment_id: int):
+    """Delete an inline review comment; one already gone counts as deleted"""
+    client = get_client("github")
+    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    url = f"/repos/{owner}/{repo}/pulls/comments/{comment_id}"
+    with observe_stage("comment_post"):
+        response = await client.delete(url, headers=headers)
+    if response.status_code != 404:
         response.raise_for_status()
-        return response.text
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def post_pr_comment(owner: str, repo: str, issue_number: int, comment: str):
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
-        url = f"{BASE_URL}/repos/{owner}/{repo}/issues/{issue_number}/comments"
-        payload = {"body": comment}
-        response = await client.post(url, json=payload, headers=headers, timeout=15)
-        response.raise_for_status() 
\ No newline at end of file
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable
+import httpx
+from app.services import database
+from app.services.database import SHARED_STATE
+from app.services.metrics import PROVIDER_ATTEMPT_SECONDS, TIMEOUTS
+
+# Rolling window of recent calls per provider
+PROVIDER_HEALTH_WINDOW = int(os.getenv("PROVIDER_HEALTH_WINDOW", "50"))
+# A breaker opens after this many failures in a row, or when the error rate
+# over at least BREAKER_MIN_SAMPLES recent calls reaches BREAKER_ERROR_RATE
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_SAMPLES = int(os.getenv("BREAKER_MIN_SAMPLES", "10"))
+# Seconds an open breaker waits before letting one probe call through
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+# With SHARED_STATE, how often each worker picks up breakers other workers
+# opened or closed, and how long a worker's claim on the probe call lasts
+BREAKER_SYNC_INTERVAL = float(os.getenv("BREAKER_SYNC_INTERVAL", "2"))
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "60"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+logger = logging.getLogger(__name__)
+
+class UpstreamError(Exception):
+    """An upstream answered with an error status"""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpen(Exception):
+    """The provider's breaker is open, so the call was not attempted"""
+
+class ProviderHealth:
+    """Rolling latency and error statistics plus a circuit breaker for one provider"""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.samples: deque[tuple[float, bool]] = deque(maxlen=window)
+        self.statuses: Counter[int] = Counter()
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+
+    def p95(self) -> float | None:
+        """p95 latency of recent successful calls (failures are often fast and would flatter it)"""
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def expected_latency(self) -> float:
+        """p95 latency divided by the success rate; unmeasured providers sort
+        first so they get measured, providers that never succeed sort last"""
+        if not self.samples:
+            return 0.0
+        p95 = self.p95()
+        if p95 is None:
+            return float("inf")
+        return p95 / (1.0 - self.error_rate())
+
+    def available(self, now: float) -> bool:
+        """Whether a call could be let through now, without claiming the probe"""
+        if self.state == OPEN:
+            return now - self.opened_at >= BREAKER_COOLDOWN
+        if self.state == HALF_OPEN:
+            return not self.probing
+        return True
+
+    def acquire(self, now: float) -> bool:
+        """Admit a call; an open breaker past its cooldown admits a single probe"""
+        if self.state == CLOSED:
+            return True
+        if not self.available(now):
+            return False
+        self.state = HALF_OPEN
+        self.probing = True
+        return True
+
+    def release(self):
+        """The admitted call was cancelled before it finished"""
+        self.probing = False
+
+    def record_success(self, latency: float):
+        self.calls += 1
+        self.samples.append((latency, True))
+        self.consecutive_failures = 0
+        self.probing = False
+        self.state = CLOSED
+
+    def record_failure(self, latency: float, now: float, status_code: int | None = None):
+        self.calls += 1
+        self.failures += 1
+        self.samples.append((latency, False))
+        self.consecutive_failures += 1
+        if status_code is not None:
+            self.statuses[status_code] += 1
+        self.probing = False
+        sustained = (len(self.samples) >= BREAKER_MIN_SAMPLES and self.error_rate() >= BREAKER_ERROR_RATE)
+        # A failed probe, a rate limit, or sustained failure (re)opens the breaker
+        if (self.state == HALF_OPEN or status_code == 429 or sustained
+                or self.consecutive_failures >= BREAKER_FAILURES):
+            self.state = OPEN
+            self.opened_at = now
+
+    def merge(self, state: str, opened_at: float, updated_at: float):
+        """Adopt a breaker change another worker published"""
+        if state == OPEN and opened_at > self.opened_at:
+            self.state = OPEN
+            self.opened_at = opened_at
+            self.probing = False
+        elif state == CLOSED and self.state != CLOSED and not self.probing and updated_at > self.opened_at:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate(), 3),
+            "p95_latency": round(p95, 3) if p95 is not None else None,
+            "rate_limited": self.statuses.get(429, 0),
+            "unavailable": self.statuses.get(503, 0),
+        }
+
+class HealthRegistry:
+    """Health of every upstream provider, used to order and guard provider calls.
+
+    Latency and error samples are per process. With `shared`, breaker
+    transitions are published to SQLite so a provider one worker found down
+    is skipped by all of them, and only one worker sends the probe call.
+    """
+
+    def __init__(self, window: int, shared: bool = False):
+        self.window = window
+        self.shared = shared
+        self._providers: dict[str, ProviderHealth] = {}
+        self._sync_task: asyncio.Task | None = None
+        self._publishing: set[asyncio.Future] = set()
+
+    async def start(self):
+        if self.shared:
+            self._sync_task = asyncio.create_task(self._sync())
+
+    async def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+
+    async def _sync(self):
+        while True:
+            try:
+                breakers = await asyncio.to_thread(database.load_breakers)
+            except Exception as e:
+                logger.warning("Shared breaker state unavailable", extra={"error": str(e)})
+            else:
+                for name, (state, opened_at, updated_at) in breakers.items():
+                    self.get(name).merge(state, opened_at, updated_at)
+            await asyncio.sleep(BREAKER_SYNC_INTERVAL)
+
+    async def _claim_probe(self, name: str, health: ProviderHealth, now: float) -> bool:
+        if not (self.shared and health.state == OPEN and health.available(now)):
+            return True
+        try:
+            return await asyncio.to_thread(database.claim_breaker_probe, name, now, BREAKER_COOLDOWN,
+                                           BREAKER_PROBE_TIMEOUT)
+        except Exception as e:
+            logger.warning("Shared breaker state unavailable", extra={"error": str(e)})
+            return True
+
+    def _publish(self, health: ProviderHealth, before: tuple[str, float]):
+        """Share a breaker that opened or closed during a call with the other workers"""
+        if not self.shared or health.state == HALF_OPEN or (health.state, health.opened_at) == before:
+            return
+        future = asyncio.ensure_future(asyncio.to_thread(
+            database.save_breaker, health.name, health.state, health.opened_at, time.time()))
+        self._publishing.add(future)
+        future.add_done_callback(self._published)
+
+    def _published(self, future: asyncio.Future):
+        self._publishing.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Could not share breaker state", extra={"error": str(future.exception())})
+
+    def get(self, name: str) -> ProviderHealth:
+        health = self._providers.get(name)
+        if health is None:
+            health = self._providers[name] = ProviderHealth(name, self.window)
+        return health
+
+    def order(self, attempts: list[tuple[str, Any]]) -> list[tuple[str, Any]]:
+        """Drop attempts whose breaker is open and sort the rest by expected
+        latency; ties keep the configured order"""
+        now = time.time()
+        usable = [attempt for attempt in attempts if self.get(attempt[0]).available(now)]
+        return sorted(usable, key=lambda attempt: self.get(attempt[0]).expected_latency())
+
+    def guard(self, name: str, factory: Callable[[], Awaitable[Any]],
+              accept: Callable[[Any], bool] | None = None) -> Callable[[], Awaitable[Any]]:
+        """Wrap an attempt factory so its outcome is recorded against `name`"""
+        async def guarded():
+            health = self.get(name)
+            before = (health.state, health.opened_at)
+            now = time.time()
+            if not (await self._claim_probe(name, health, now) and health.acquire(now)):
+                raise CircuitOpen(f"{name} is unavailable (circuit open)")
+            try:
+                return await attempt(health)
+            finally:
+                self._publish(health, before)
+
+        async def attempt(health: ProviderHealth):
+            start = time.monotonic()
+            try:
+                result = await factory()
+            except UpstreamError as e:
+                latency = time.monotonic() - start
+                health.record_failure(latency, time.time(), e.status_code)
+                PROVIDER_ATTEMPT_SECONDS.observe(latency, provider=name, outcome=f"http_{e.status_code}")
+                raise
+            except Exception as e:
+                latency = time.monotonic() - start
+                health.record_failure(latency, time.time())
+                timed_out = isinstance(e, httpx.TimeoutException)
+                if timed_out:
+                    TIMEOUTS.inc(operation=name)
+                PROVIDER_ATTEMPT_SECONDS.observe(latency, provider=name, outcome="timeout" if timed_out else "error")
+                raise
+            except BaseException:
+                health.release()  # Cancelled because another attempt won
+                PROVIDER_ATTEMPT_SECONDS.observe(time.monotonic() - start, provider=name, outcome="cancelled")
+                raise
+            latency = time.monotonic() - start
+            if accept is not None and not accept(result):
+                health.record_failure(latency, time.time())
+                PROVIDER_ATTEMPT_SECONDS.observe(latency, provider=name, outcome="rejected")
+            else:
+                health.record_success(latency)
+                PROVIDER_ATTEMPT_SECONDS.observe(latency, provider=name, outcome="success")
+            return result
+        return guarded
+
+    def snapshot(self) -> dict[str, dict]:
+        return {name: health.snapshot() for name, health in self._providers.items()}
+
+provider_health = HealthRegistry(PROVIDER_HEALTH_WINDOW, SHARED_STATE)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+Attempt = tuple[str, Callable[[], Awaitable[Any]]]
+
+class AllAttemptsFailed(Exception):
+    """Raised when every hedged attempt failed or was rejected"""
+
+    def __init__(self, errors: list[tuple[str, BaseException | str]]):
+        self.errors = errors
+        details = "; ".join(f"{label}: {error}" for label, error in errors)
+        super().__init__(f"All attempts failed ({details})" if details else "No attempts to run")
+
+async def hedged_race(
+    attempts: list[Attempt],
+    hedge_delay: float | None,
+    deadline: float,
+    accept: Callable[[Any], bool] = bool,
+) -> tuple[str, Any]:
+    """Run attempts in order, starting the next one after hedge_delay seconds
+    (or as soon as a running attempt fails) and return the first acceptable
+    result as (label, result). Everything still running is cancelled once a
+    winner is found or the deadline passes. With hedge_delay=None the attempts
+    run strictly one after another, still bounded by the deadline.
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    queue = list(attempts)
+    pending: dict[asyncio.Task, str] = {}
+    errors: list[tuple[str, BaseException | str]] = []
+    next_launch = loop.time()
+
+    try:
+        while True:
+            now = loop.time()
+            if queue and (not pending or (hedge_delay is not None and now >= next_launch)):
+                label, factory = queue.pop(0)
+                pending[asyncio.ensure_future(factory())] = label
+                if hedge_delay is not None:
+                    next_launch = now + hedge_delay
+                continue
+            if not pending:
+                raise AllAttemptsFailed(errors)
+
+            remaining = end - now
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"No acceptable result within {deadline}s")
+            timeout = remaining
+            if queue and hedge_delay is not None:
+                timeout = min(timeout, max(next_launch - now, 0))
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                label = pending.pop(task)
+                error = task.exception()
+                if error is None and accept(task.result()):
+                    return label, task.result()
+                errors.append((label, error or "rejected result"))
+                # Replace a failed attempt right away instead of waiting out the delay
+                next_launch = loop.time()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+import os
+from app.services import database
+from app.services.cache import normalize_code
+from app.services.findings import Review, to_json
+
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+
+logger = logging.getLogger(__name__)
+
+def code_hash(code: str) -> str:
+    """Content hash used to look up earlier analyses of the same code"""
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+class HistoryWriter:
+    """Background task that writes analysis and webhook history in batches.
+
+    Requests only append to an in-memory queue; the writer drains whatever has
+    accumulated into one transaction, so bursts cost one commit instead of one
+    per request. Records are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, enabled: bool, queue_size: int, batch_size: int):
+        self.enabled = enabled
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer after flushing everything already queued"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        while not self._queue.empty():
+            await self._flush(self._take_batch(self._queue.get_nowait()))
+        self._queue = None
+
+    def record_analysis(self, source: str, code: str | None, review: Review, language: str | None = None,
+                        analysis_time: float | None = None, reference: str | None = None):
+        """Queue a submission row; source names the entry point, e.g. analyze, analyze-batch or webhook"""
+        self._put(("submission", (code, review, language, source, reference, analysis_time)))
+
+    def record_webhook(self, event_type: str | None, payload: str, status: str):
+        """Queue a webhook that is logged but not turned into a job"""
+        self._put(("webhook", (event_type, payload, status)))
+
+    def _put(self, item: tuple):
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _take_batch(self, first: tuple) -> list[tuple]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple]):
+        try:
+            await asyncio.to_thread(self._write, batch)
+            self.written += len(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Failed to write history records", extra={"records": len(batch), "error": str(e)})
+
+    @staticmethod
+    def _write(batch: list[tuple]):
+        submissions, webhooks = [], []
+        for kind, row in batch:
+            if kind == "submission":
+                code, review, language, source, reference, analysis_time = row
+                submissions.append((
+                    code,
+                    code_hash(code) if code is not None else None,
+                    len(code) if code is not None else None,
+                    to_json(review), language, source, reference, analysis_time,
+                ))
+            else:
+                webhooks.append(row)
+        if submissions:
+            database.record_submissions(submissions)
+        if webhooks:
+            database.record_webhooks(webhooks)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+history_writer = HistoryWriter(HISTORY_ENABLED, HISTORY_QUEUE_SIZE, HISTORY_BATCH_SIZE)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import ssl
+import httpx
+from app.services.ratelimit import rate_limiter
+
+# Connection pool settings shared by every upstream client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # seconds
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+# Upstreams (comma-separated names from UPSTREAMS) to open a connection to
+# during warm-up, so the first real call skips the TCP and TLS handshakes
+WARMUP_CONNECTIONS = [name.strip() for name in os.getenv("WARMUP_CONNECTIONS", "").split(",") if name.strip()]
+
+# One application-scoped client per upstream host
+UPSTREAMS = {
+    "huggingface": {
+        "base_url": os.getenv("HF_BASE_URL", "https://api-inference.huggingface.co"),
+        "timeout": float(os.getenv("HF_TIMEOUT", "30")),
+        "rate_limit": float(os.getenv("HF_RATE_LIMIT", "60")),  # requests per minute, 0 = unlimited
+        "burst": int(os.getenv("HF_RATE_BURST", "10")),
+    },
+    "openai": {
+        "base_url": os.getenv("OPENAI_BASE_URL", "https://api.openai.com"),
+        "timeout": float(os.getenv("OPENAI_TIMEOUT", "30")),
+        "rate_limit": float(os.getenv("OPENAI_RATE_LIMIT", "60")),  # requests per minute, 0 = unlimited
+        "burst": int(os.getenv("OPENAI_RATE_BURST", "10")),
+    },
+    "anthropic": {
+        "base_url": os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com"),
+        "timeout": float(os.getenv("ANTHROPIC_TIMEOUT", "30")),
+        "rate_limit": float(os.getenv("ANTHROPIC_RATE_LIMIT", "50")),  # requests per minute, 0 = unlimited
+        "burst": int(os.getenv("ANTHROPIC_RATE_BURST", "10")),
+    },
+    "github": {
+        "base_url": os.getenv("GITHUB_API_URL", "https://api.github.com"),
+        "timeout": float(os.getenv("GITHUB_TIMEOUT", "15")),
+        "rate_limit": float(os.getenv("GITHUB_RATE_LIMIT", "80")),  # requests per minute, 0 = unlimited
+        "burst": int(os.getenv("GITHUB_RATE_BURST", "20")),
+    },
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+_ssl_context: ssl.SSLContext | None = None
+
+logger = logging.getLogger(__name__)
+
+for _name, _upstream in UPSTREAMS.items():
+    rate_limiter.configure(_name, _upstream["rate_limit"], _upstream["burst"])
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional h2 package is installed
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+def _shared_ssl_context() -> ssl.SSLContext:
+    """Each context loads the CA bundle, which takes tens of milliseconds; one serves every client"""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context(http2=_http2_available())
+    return _ssl_context
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    upstream = UPSTREAMS[name]
+    return httpx.AsyncClient(
+        base_url=upstream["base_url"],
+        timeout=httpx.Timeout(upstream["timeout"], connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=_http2_available(),
+        verify=_shared_ssl_context(),
+        event_hooks=rate_limiter.event_hooks(name),
+    )
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream, creating it if startup has not run"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client(name)
+        _clients[name] = client
+    return client
+
+async def start_clients():
+    if HTTP2_ENABLED and not _http2_available():
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+    for name in UPSTREAMS:
+        get_client(name)
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+async def warm_up_connections(names: list[str] = WARMUP_CONNECTIONS):
+    """Open a pooled connection to each named upstream; whatever it answers, the
+    connection stays in the pool for HTTP_KEEPALIVE_EXPIRY seconds"""
+    async def connect(name: str):
+        try:
+            await get_client(name).head("/", extensions={"rate_limit": False})
+        except httpx.HTTPError as e:
+            logger.warning("Could not pre-connect to upstream", extra={"upstream": name, "error": str(e)})
+
+    unknown = [name for name in names if name not in UPSTREAMS]
+    if unknown:
+        logger.warning("Unknown upstreams in WARMUP_CONNECTIONS", extra={"upstreams": unknown})
+    await asyncio.gather(*(connect(name) for name in names if name in UPSTREAMS))
\ No newline at end of file
@@ -1,6 +1,20 @@
+import asyncio
+import json
+import logging
 import os
-import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from functools import partial
+from typing import AsyncIterator
+from app.services.cache import make_cache_key, review_cache
+from app.services.findings import CATEGORY_SEVERITIES, Finding, Review, from_json, to_json
+from app.services.health import UpstreamError, provider_health
+from app.services.hedging import hedged_race
+from app.services.http_clients import get_client
+from app.services.metrics import TIMEOUTS, observe_stage
+from app.services.offload import cpu_pool
+from app.services.prompts import PROMPT_VERSION, SYSTEM_PROMPT, review_prompt
+from app.services.rules import run_rules
+from app.services.similarity import REUSED_NOTE, delta_snippet, merge_delta, near_duplicates, review_owner, scope
+from app.services.triage import needs_remote
 
 # Free Hugging Face API - 30,000 requests/month free
 HF_API_TOKEN = os.getenv("HF_API_TOKEN", "hf_abc123DUMMYtoken")
@@ -16,299 +30,382 @@ FREE_MODELS = {
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")  # Free $5 credit
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")  # Free tier
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def analyze_code(code: str, language: str | None) -> str:
-    """Analyze code using free APIs in order of preference"""
-    
-    # Try Hugging Face first (free tier)
+# Hedged execution: start the next provider after HEDGE_DELAY seconds and keep
+# the first acceptable answer; the whole race is bounded by ANALYSIS_DEADLINE.
+# HEDGING_ENABLED=false tries providers one at a time within the same deadline.
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "3"))  # seconds
+ANALYSIS_DEADLINE = float(os.getenv("ANALYSIS_DEADLINE", "45"))  # seconds
+
+logger = logging.getLogger(__name__)
+
+# Answer length requested from each provider; the prompt gets the rest of the model's context
+HF_MAX_NEW_TOKENS = 256
+OPENAI_MODEL = "gpt-3.5-turbo"
+ANTHROPIC_MODEL = "claude-instant-1.2"
+REVIEW_MAX_TOKENS = 1000
+
+def provider_chain() -> str:
+    """Identify the configured providers; part of the review cache key"""
+    providers = ["huggingface"]
+    if OPENAI_API_KEY:
+        providers.append("openai")
+    if ANTHROPIC_API_KEY:
+        providers.append("anthropic")
+    return "+".join(providers)
+
+def guarded_attempts(attempts: list[tuple[str, object]], accept) -> list[tuple[str, object]]:
+    """Order attempts by provider health, skipping open circuits, and record each outcome"""
+    return [(label, provider_health.guard(label, factory, accept)) for label, factory in provider_health.order(attempts)]
+
+def provider_attempts(code: str, language: str | None) -> list[tuple[str, object]]:
+    """Candidate provider calls in configured order"""
+    attempts = [
+        (f"huggingface:{model_name}", partial(query_huggingface_model, model_name, code, language))
+        for model_name in FREE_MODELS.values()
+    ]
+    if OPENAI_API_KEY:
+        attempts.append(("openai", partial(analyze_with_openai, code, language)))
+    if ANTHROPIC_API_KEY:
+        attempts.append(("anthropic", partial(analyze_with_anthropic, code, language)))
+    return attempts
+
+def log_remote_failure(error: Exception):
+    if isinstance(error, asyncio.TimeoutError):
+        TIMEOUTS.inc(operation="analysis")
+    logger.warning("Remote analysis failed, using rule-based analysis", extra={"error": str(error)})
+
+def has_content(result: str) -> bool:
+    return bool(result and result.strip())
+
+def has_first_chunk(opened: tuple[str, AsyncIterator[str]]) -> bool:
+    return bool(opened[0].strip())
+
+async def analyze_code(code: str, language: str | None, deadline: float | None = None,
+                       allow_fallback: bool = True, triage: bool = True) -> Review:
+    """Analyze code using free APIs, racing them within a per-request deadline.
+
+    Trivial input is answered by the rules without a remote call, unless the
+    caller already triaged it (triage=False). With allow_fallback=False a
+    failure of every remote provider raises instead of returning the
+    rule-based analysis.
+    """
+    if triage and allow_fallback and not needs_remote(code, language):
+        return await local_analysis(code, language)
+
+    cache_key = make_cache_key(code, language, provider_chain(), PROMPT_VERSION)
+    cached = await review_cache.get(cache_key)
+    if cached is not None:
+        return from_json(cached)
+
+    # A near-duplicate of an earlier review reuses it, or has only its changed lines reviewed
+    fingerprint = match = None
+    reviewed = code
+    if near_duplicates.enabled and review_owner.get() is not None:
+        review_scope = scope(review_owner.get(), provider_chain(), PROMPT_VERSION, language)
+        fingerprint = await near_duplicates.fingerprint(code, language)
+        match = await near_duplicates.find(fingerprint, review_scope)
+    if match is not None and match.same_shape:
+        near_duplicates.counts["reused"] += 1
+        # Not cached: the exact-match cache is shared by every owner, and this review is of other code
+        return match.review.with_note(REUSED_NOTE)
+    if match is not None:
+        delta = await cpu_pool.run(delta_snippet, match.code, code, language, size=len(code))
+        near_duplicates.counts["delta" if delta is not None else "full"] += 1
+        reviewed = delta if delta is not None else code
+
     try:
-        return await analyze_with_huggingface(code, language)
+        _, feedback = await hedged_race(
+            guarded_attempts(provider_attempts(reviewed, language), has_content),
+            hedge_delay=HEDGE_DELAY if HEDGING_ENABLED else None,
+            deadline=deadline or ANALYSIS_DEADLINE,
+            accept=has_content,
+        )
+        review = Review(text=feedback)
+        if reviewed is not code:
+            return merge_delta(review, match.review)
+        if fingerprint is not None:
+            # Only full reviews are indexed, so reused reviews never stack notes or deltas
+            await near_duplicates.add(fingerprint, review_scope, code, review)
+        await review_cache.set(cache_key, to_json(review))
+        return review
     except Exception as e:
-        print(f"Hugging Face failed: {e}")
-    
-    # Try OpenAI if available (free $5 credit)
-    if OPENAI_API_KEY and OPENAI_API_KEY != "":
-        try:
-            return await analyze_with_openai(code, language)
-        except Exception as e:
-            print(f"OpenAI failed: {e}")
+        log_remote_failure(e)
+        if not allow_fallback:
+            raise
     
-    # Try Anthropic if available (free tier)
-    if ANTHROPIC_API_KEY and ANTHROPIC_API_KEY != "":
-        try:
-            return await analyze_with_anthropic(code, language)
-        except Exception as e:
-            print(f"Anthropic failed: {e}")
+    # Fallback to rule-based analysis (cheap and deterministic, so never cached)
+    return await local_analysis(code, language)
+
+async def query_huggingface_model(model_name: str, code: str, language: str | None) -> str:
+    """Ask a single Hugging Face model for a review"""
+    client = get_client("huggingface")
+    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
     
-    # Fallback to rule-based analysis
-    return fallback_analysis(code, language)
+    prompt = review_prompt(code, language, model_name, HF_MAX_NEW_TOKENS)
 
-async def analyze_with_huggingface(code: str, language: str | None) -> str:
-    """Use Hugging Face free inference API"""
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-        
-        # Create a structured prompt for better analysis
-        prompt = f"""Analyze this {language or 'code'} for bugs, security issues, and improvements:
-
-```{language or 'text'}
-{code}
-```
-
-Provide analysis in markdown format with sections for:
-1. Security Vulnerabilities
-2. Bugs and Issues  
-3. Code Quality Suggestions
-4. Best Practices
-
-Be concise but thorough."""
-
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_length": 800,
-                "temperature": 0.7,
-                "do_sample": True,
-                "return_full_text": False
-            }
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": HF_MAX_NEW_TOKENS,
+            "temperature": 0.7,
+            "do_sample": True,
+            "return_full_text": False
         }
+    }
+    
+    response = await client.post(
+        f"/models/{model_name}",
+        json=payload,
+        headers=headers
+    )
+    
+    if response.status_code == 200:
+        result = response.json()
         
-        # Try different free models
-        for model_name in FREE_MODELS.values():
-            try:
-                response = await client.post(
-                    f"https://api-inference.huggingface.co/models/{model_name}",
-                    json=payload,
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Handle different response formats
-                    if isinstance(result, list) and len(result) > 0:
-                        if "generated_text" in result[0]:
-                            return result[0]["generated_text"]
-                        elif "text" in result[0]:
-                            return result[0]["text"]
-                    elif isinstance(result, dict):
-                        if "generated_text" in result:
-                            return result["generated_text"]
-                        elif "text" in result:
-                            return result["text"]
-                    
-                    return str(result)
-                elif response.status_code == 503:
-                    # Model is loading, try next one
-                    continue
-                    
-            except Exception:
-                continue
+        # Handle different response formats
+        if isinstance(result, list) and len(result) > 0:
+            if "generated_text" in result[0]:
+                return result[0]["generated_text"]
+            elif "text" in result[0]:
+                return result[0]["text"]
+        elif isinstance(result, dict):
+            if "generated_text" in result:
+                return result["generated_text"]
+            elif "text" in result:
+                return result["text"]
         
-        raise Exception("All Hugging Face models are currently unavailable")
+        return str(result)
+    elif response.status_code == 503:
+        raise UpstreamError(f"Hugging Face model {model_name} is loading", 503)
+    else:
+        raise UpstreamError(f"Hugging Face API error: {response.status_code}", response.status_code)
 
-async def analyze_with_openai(code: str, language: str | None) -> str:
-    """Use OpenAI API (free $5 credit)"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        prompt = f"""Analyze this {language or 'code'} for bugs, security vulnerabilities, and code quality issues:
-
-```{language or 'text'}
-{code}
-```
-
-Provide a detailed analysis in markdown format covering:
-1. **Security Vulnerabilities**: Any security issues found
-2. **Bugs**: Logic errors or potential runtime issues  
-3. **Code Quality**: Suggestions for improvement
-4. **Best Practices**: Recommendations for better coding
-
-Be specific and actionable."""
-
-        payload = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": "You are an expert code reviewer and security analyst."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.3
-        }
-        
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        else:
-            raise Exception(f"OpenAI API error: {response.status_code}")
+def openai_request(code: str, language: str | None) -> tuple[dict, dict]:
+    """Headers and payload for an OpenAI chat completion review"""
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    prompt = review_prompt(code, language, OPENAI_MODEL, REVIEW_MAX_TOKENS, system_prompt=True)
 
-async def analyze_with_anthropic(code: str, language: str | None) -> str:
-    """Use Anthropic Claude API (free tier)"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "x-api-key": ANTHROPIC_API_KEY,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-        
-        prompt = f"""Analyze this {language or 'code'} for bugs, security vulnerabilities, and code quality issues:
-
-```{language or 'text'}
-{code}
-```
-
-Provide a detailed analysis in markdown format covering:
-1. **Security Vulnerabilities**: Any security issues found
-2. **Bugs**: Logic errors or potential runtime issues  
-3. **Code Quality**: Suggestions for improvement
-4. **Best Practices**: Recommendations for better coding
-
-Be specific and actionable."""
-
-        payload = {
-            "model": "claude-instant-1.2",
-            "max_tokens": 1000,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }
-        
-        response = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result["content"][0]["text"]
-        else:
-            raise Exception(f"Anthropic API error: {response.status_code}")
+    payload = {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": REVIEW_MAX_TOKENS,
+        "temperature": 0.3
+    }
+    return headers, payload
 
-# Enhanced fallback analysis function
-def fallback_analysis(code: str, language: str | None) -> str:
-    """Comprehensive rule-based analysis as fallback"""
-    issues = []
-    warnings = []
-    suggestions = []
-    
-    # Security vulnerability patterns
-    security_patterns = [
-        ("eval(", "🚨 **CRITICAL**: Use of eval() is extremely dangerous - allows arbitrary code execution"),
-        ("exec(", "🚨 **CRITICAL**: Use of exec() is extremely dangerous - allows arbitrary code execution"),
-        ("subprocess.call", "⚠️ **Security**: Be careful with subprocess calls - validate all inputs"),
-        ("os.system", "⚠️ **Security**: os.system() is dangerous - use subprocess with proper arguments"),
-        ("input(", "⚠️ **Security**: Validate user input to prevent injection attacks"),
-        ("raw_input(", "⚠️ **Security**: Validate user input to prevent injection attacks"),
-        ("document.write", "⚠️ **Security**: Avoid document.write() - can lead to XSS attacks"),
-        ("innerHTML", "⚠️ **Security**: Be careful with innerHTML - validate content to prevent XSS"),
-        ("innerText", "⚠️ **Security**: Be careful with innerText - validate content"),
-        ("localStorage", "⚠️ **Security**: Don't store sensitive data in localStorage"),
-        ("sessionStorage", "⚠️ **Security**: Don't store sensitive data in sessionStorage"),
-        ("password", "🔒 **Security**: Ensure passwords are properly hashed and not logged"),
-        ("secret", "🔒 **Security**: Check for hardcoded secrets or API keys"),
-        ("api_key", "🔒 **Security**: Check for hardcoded API keys"),
-        ("token", "🔒 **Security**: Check for hardcoded tokens"),
-    ]
-    
-    # Code quality patterns
-    quality_patterns = [
-        ("TODO", "📝 **Code Quality**: TODO comment found - implement or remove"),
-        ("FIXME", "🔧 **Code Quality**: FIXME comment found - fix the issue"),
-        ("HACK", "🔧 **Code Quality**: HACK comment found - refactor this code"),
-        ("console.log", "🧹 **Code Quality**: Remove console.log statements in production"),
-        ("print(", "🧹 **Code Quality**: Remove print statements in production"),
-        ("debugger", "🧹 **Code Quality**: Remove debugger statements in production"),
-    ]
-    
-    # Performance patterns
-    performance_patterns = [
-        ("for i in range", "⚡ **Performance**: Consider using list comprehension or generator"),
-        ("while True", "⚡ **Performance**: Ensure while True loops have proper exit conditions"),
-        ("sleep(", "⚡ **Performance**: Avoid sleep() in production code"),
-        ("time.sleep", "⚡ **Performance**: Avoid time.sleep() in production code"),
-    ]
-    
-    # Check for patterns
-    for pattern, message in security_patterns:
-        if pattern in code:
-            issues.append(message)
-    
-    for pattern, message in quality_patterns:
-        if pattern in code:
-            warnings.append(message)
+async def analyze_with_openai(code: str, language: str | None) -> str:
+    """Use OpenAI API (free $5 credit)"""
+    client = get_client("openai")
+    headers, payload = openai_request(code, language)
     
-    for pattern, message in performance_patterns:
-        if pattern in code:
-            suggestions.append(message)
+    response = await client.post(
+        "/v1/chat/completions",
+        json=payload,
+        headers=headers
+    )
     
-    # Basic code structure analysis
-    lines = code.split('\n')
-    if len(lines) > 100:
-        warnings.append("📏 **Code Quality**: Consider breaking this into smaller functions (over 100 lines)")
+    if response.status_code == 200:
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
+    else:
+        raise UpstreamError(f"OpenAI API error: {response.status_code}", response.status_code)
+
+async def stream_with_openai(code: str, language: str | None) -> AsyncIterator[str]:
+    """Stream an OpenAI review as text deltas"""
+    client = get_client("openai")
+    headers, payload = openai_request(code, language)
+    payload["stream"] = True
     
-    if code.count('if') > code.count('else') * 2:
-        warnings.append("🔍 **Code Quality**: Consider adding else clauses for better error handling")
+    async with client.stream("POST", "/v1/chat/completions", json=payload, headers=headers) as response:
+        if response.status_code != 200:
+            raise UpstreamError(f"OpenAI API error: {response.status_code}", response.status_code)
+        async for event in sse_data(response):
+            if event == "[DONE]":
+                break
+            delta = json.loads(event)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+def anthropic_request(code: str, language: str | None) -> tuple[dict, dict]:
+    """Headers and payload for an Anthropic messages review"""
+    headers = {
+        "x-api-key": ANTHROPIC_API_KEY,
+        "Content-Type": "application/json",
+        "anthropic-version": "2023-06-01"
+    }
     
-    if code.count('try') > code.count('except') * 2:
-        warnings.append("🛡️ **Code Quality**: Ensure all try blocks have proper except handlers")
+    prompt = review_prompt(code, language, ANTHROPIC_MODEL, REVIEW_MAX_TOKENS)
+
+    payload = {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": REVIEW_MAX_TOKENS,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+    return headers, payload
+
+async def analyze_with_anthropic(code: str, language: str | None) -> str:
+    """Use Anthropic Claude API (free tier)"""
+    client = get_client("anthropic")
+    headers, payload = anthropic_request(code, language)
     
-    # Language-specific checks
-    if language and language.lower() == 'python':
-        if 'import *' in code:
-            warnings.append("🐍 **Python**: Avoid 'import *' - import specific modules")
-        if '__init__' in code and 'self.' not in code:
-            warnings.append("🐍 **Python**: Check if __init__ method properly initializes instance variables")
+    response = await client.post(
+        "/v1/messages",
+        json=payload,
+        headers=headers
+    )
     
-    elif language and language.lower() in ['javascript', 'typescript']:
-        if 'var ' in code:
-            warnings.append("🟨 **JavaScript**: Use 'const' or 'let' instead of 'var'")
-        if '===' not in code and '==' in code:
-            warnings.append("🟨 **JavaScript**: Use strict equality (===) instead of loose equality (==)")
+    if response.status_code == 200:
+        result = response.json()
+        return result["content"][0]["text"]
+    else:
+        raise UpstreamError(f"Anthropic API error: {response.status_code}", response.status_code)
+
+async def stream_with_anthropic(code: str, language: str | None) -> AsyncIterator[str]:
+    """Stream an Anthropic review as text deltas"""
+    client = get_client("anthropic")
+    headers, payload = anthropic_request(code, language)
+    payload["stream"] = True
     
-    # Generate report
-    report = []
+    async with client.stream("POST", "/v1/messages", json=payload, headers=headers) as response:
+        if response.status_code != 200:
+            raise UpstreamError(f"Anthropic API error: {response.status_code}", response.status_code)
+        async for event in sse_data(response):
+            data = json.loads(event)
+            if data.get("type") == "content_block_delta":
+                delta = data.get("delta", {}).get("text")
+                if delta:
+                    yield delta
+            elif data.get("type") == "message_stop":
+                break
+
+async def sse_data(response) -> AsyncIterator[str]:
+    """Yield the data field of each server-sent event in a streaming response"""
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            yield line[5:].strip()
+
+async def single_chunk(analyze, code: str, language: str | None) -> AsyncIterator[str]:
+    """Present a non-streaming provider as a one-chunk stream"""
+    yield await analyze(code, language)
+
+async def open_stream(stream: AsyncIterator[str]) -> tuple[str, AsyncIterator[str]]:
+    """Wait for the first non-empty chunk of a provider stream"""
+    async for chunk in stream:
+        if chunk:
+            return chunk, stream
+    raise Exception("Provider returned an empty stream")
+
+def stream_attempts(code: str, language: str | None) -> list[tuple[str, object]]:
+    """Provider streams in configured order; Hugging Face cannot stream"""
+    attempts = [
+        (f"huggingface:{model_name}", partial(open_stream, single_chunk(partial(query_huggingface_model, model_name), code, language)))
+        for model_name in FREE_MODELS.values()
+    ]
+    if OPENAI_API_KEY:
+        attempts.append(("openai", partial(open_stream, stream_with_openai(code, language))))
+    if ANTHROPIC_API_KEY:
+        attempts.append(("anthropic", partial(open_stream, stream_with_anthropic(code, language))))
+    return attempts
+
+async def stream_analysis(code: str, language: str | None,
+                          deadline: float | None = None) -> AsyncIterator[str | Review]:
+    """Like analyze_code, but yield the review as it arrives.
+
+    Providers race for the first chunk the same way analyze_code races for
+    the whole answer; the winner then streams the rest as markdown text.
+    Reviews that are not streamed (rule-based, cached, reused) are yielded
+    whole, as a single Review.
+    """
+    if not needs_remote(code, language):
+        yield await local_analysis(code, language)
+        return
+
+    cache_key = make_cache_key(code, language, provider_chain(), PROMPT_VERSION)
+    cached = await review_cache.get(cache_key)
+    if cached is not None:
+        yield from_json(cached)
+        return
+
+    # Streams reuse reviews of same-shape code; delta reviews need the whole answer to merge
+    fingerprint = None
+    if near_duplicates.enabled and review_owner.get() is not None:
+        review_scope = scope(review_owner.get(), provider_chain(), PROMPT_VERSION, language)
+        fingerprint = await near_duplicates.fingerprint(code, language)
+        match = await near_duplicates.find(fingerprint, review_scope)
+        if match is not None and match.same_shape:
+            near_duplicates.counts["reused"] += 1
+            yield match.review.with_note(REUSED_NOTE)
+            return
+        if match is not None:
+            near_duplicates.counts["full"] += 1
+
+    try:
+        _, (first, stream) = await hedged_race(
+            guarded_attempts(stream_attempts(code, language), has_first_chunk),
+            hedge_delay=HEDGE_DELAY if HEDGING_ENABLED else None,
+            deadline=deadline or ANALYSIS_DEADLINE,
+            accept=has_first_chunk,
+        )
+    except Exception as e:
+        log_remote_failure(e)
+        yield await local_analysis(code, language)
+        return
     
-    if issues:
-        report.append("## 🚨 Security Issues")
-        report.extend(issues)
-        report.append("")
+    parts = [first]
+    try:
+        yield first
+        async for chunk in stream:
+            parts.append(chunk)
+            yield chunk
+    finally:
+        await stream.aclose()  # Release the upstream connection if the client went away
+    review = Review(text="".join(parts))
+    await review_cache.set(cache_key, to_json(review))
+    if fingerprint is not None:
+        await near_duplicates.add(fingerprint, review_scope, code, review)
+
+async def local_analysis(code: str, language: str | None) -> Review:
+    """fallback_analysis, in a worker process when the input is large enough to stall the event loop"""
+    with observe_stage("fallback_analysis"):
+        return await cpu_pool.run(fallback_analysis, code, language, size=len(code))
+
+# Enhanced fallback analysis function
+def fallback_analysis(code: str, language: str | None) -> Review:
+    """Comprehensive rule-based analysis as fallback"""
+    findings = []
+    hits, keywords = run_rules(code, language, count=("if", "else", "try", "except", "catch"))
     
-    if warnings:
-        report.append("## ⚠️ Code Quality Issues")
-        report.extend(warnings)
-        report.append("")
+    # Findings from the language's rule set, in rule set order; rules shared by
+    # several languages can repeat a message when no language is given
+    reported = set()
+    for rule, (line, column) in hits.values():
+        if rule.message not in reported:
+            reported.add(rule.message)
+            severity = CATEGORY_SEVERITIES.get(rule.category, "warning")
+            findings.append(Finding(rule.id, severity, rule.message, line=line, column=column))
     
-    if suggestions:
-        report.append("## 💡 Suggestions")
-        report.extend(suggestions)
-        report.append("")
+    # Basic code structure analysis, counting keywords outside comments and strings
+    line_count = code.count('\n') + 1
+    if line_count > 100:
+        findings.append(Finding("structure.long-code", "warning", "📏 **Code Quality**: "
+                                "Consider breaking this into smaller functions (over 100 lines)"))
     
-    if not issues and not warnings and not suggestions:
-        report.append("## ✅ Analysis Complete")
-        report.append("No obvious issues found in this code!")
-        report.append("")
-        report.append("**Note**: This is a basic rule-based analysis. For comprehensive review, consider:")
-        report.append("- Setting up a Hugging Face API token for AI-powered analysis")
-        report.append("- Using OpenAI API (free $5 credit) for detailed code review")
-        report.append("- Running static analysis tools like ESLint, Pylint, or SonarQube")
+    if keywords["if"] > keywords["else"] * 2:
+        findings.append(Finding("structure.missing-else", "warning",
+                                "🔍 **Code Quality**: Consider adding else clauses for better error handling"))
     
-    report.append("---")
-    report.append(f"**Analysis Info**:")
-    report.append(f"- Language: {language or 'Auto-detected'}")
-    report.append(f"- Code Length: {len(code)} characters")
-    report.append(f"- Lines: {len(lines)}")
+    if keywords["try"] > (keywords["except"] + keywords["catch"]) * 2:
+        findings.append(Finding("structure.unhandled-try", "warning",
+                                "🛡️ **Code Quality**: Ensure all try blocks have proper except handlers"))
     
-    return "\n".join(report) 
\ No newline at end of file
+    return Review(findings, info=(language, len(code), line_count)) 
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from app.services import database
+from app.services.database import SHARED_STATE
+
+PRKey = tuple[str, str, int]
+
+# How many PRs to remember the newest head SHA for
+LATEST_HEAD_LIMIT = 4096
+
+# With SHARED_STATE, a worker reviewing a PR renews its claim every
+# INFLIGHT_HEARTBEAT seconds (workers waiting on it poll as often); a claim
+# not renewed for INFLIGHT_STALE_AFTER seconds is taken over
+INFLIGHT_HEARTBEAT = float(os.getenv("INFLIGHT_HEARTBEAT", "2"))
+INFLIGHT_STALE_AFTER = float(os.getenv("INFLIGHT_STALE_AFTER", "30"))
+
+logger = logging.getLogger(__name__)
+
+class ReviewSuperseded(Exception):
+    """Raised to callers whose review was replaced by one for a newer head SHA"""
+
+class InflightReviews:
+    """Per-(owner, repo, PR) registry of running analyses.
+
+    Callers asking for the same PR share one task. A caller with a different
+    head SHA cancels the older task, so only the latest push reaches the model.
+    A head SHA of None (e.g. /api/review-pr) joins whatever is running.
+
+    With `shared_state`, each task also claims the PR in SQLite, so worker
+    processes follow the same rules: a task waits while another process
+    reviews the same head (then runs against its stored results), and takes
+    the PR over for a newer head, which cancels the other process's task.
+    """
+
+    def __init__(self, shared_state: bool = False):
+        self.shared_state = shared_state
+        self._running: dict[PRKey, tuple[str | None, asyncio.Task]] = {}
+        self._latest: OrderedDict[PRKey, str] = OrderedDict()
+        self.shared = 0
+        self.superseded = 0
+        self.waited_on_other_workers = 0
+
+    async def run(self, key: PRKey, head_sha: str | None, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if head_sha is not None:
+            self._latest[key] = head_sha
+            self._latest.move_to_end(key)
+            if len(self._latest) > LATEST_HEAD_LIMIT:
+                self._latest.popitem(last=False)
+        entry = self._running.get(key)
+        if entry is not None and not entry[1].done():
+            running_sha, task = entry
+            if head_sha is None or running_sha == head_sha:
+                self.shared += 1
+                return await self._wait(task)
+            if running_sha is not None:
+                self.superseded += 1
+                task.cancel()
+
+        task = asyncio.ensure_future(self._claim_and_run(key, head_sha, factory) if self.shared_state else factory())
+        self._running[key] = (head_sha, task)
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await self._wait(task)
+
+    def is_latest(self, key: PRKey, head_sha: str | None) -> bool:
+        """Whether no newer head SHA has been seen for this PR"""
+        return head_sha is None or self._latest.get(key, head_sha) == head_sha
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._running), "shared": self.shared, "superseded": self.superseded,
+                "waited_on_other_workers": self.waited_on_other_workers}
+
+    async def _claim_and_run(self, key: PRKey, head_sha: str | None, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory() once no other worker process is reviewing this PR at head_sha"""
+        pr_key = "{}/{}#{}".format(*key)
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        waited = False
+        while True:
+            now = time.time()
+            holder = await asyncio.to_thread(database.claim_inflight_review, pr_key, head_sha, owner, now,
+                                             now - INFLIGHT_STALE_AFTER)
+            if holder is None:
+                break
+            if not waited:
+                waited = True
+                self.waited_on_other_workers += 1
+            await asyncio.sleep(INFLIGHT_HEARTBEAT)
+        heartbeat = asyncio.create_task(self._heartbeat(pr_key, owner, asyncio.current_task()))
+        try:
+            return await factory()
+        finally:
+            heartbeat.cancel()
+            await asyncio.to_thread(database.release_inflight_review, pr_key, owner)
+
+    async def _heartbeat(self, pr_key: str, owner: str, task: asyncio.Task):
+        """Renew the claim while the review runs; cancel it when another process took the PR over"""
+        while True:
+            await asyncio.sleep(INFLIGHT_HEARTBEAT)
+            try:
+                claimed = await asyncio.to_thread(database.touch_inflight_review, pr_key, owner, time.time())
+            except Exception as e:
+                logger.warning("Could not renew in-flight review claim", extra={"pr": pr_key, "error": str(e)})
+                continue
+            if not claimed:
+                self.superseded += 1
+                task.cancel()
+                return
+
+    async def _wait(self, task: asyncio.Task) -> Any:
+        # asyncio.wait (unlike awaiting the task) never cancels the shared task
+        # when one of its waiters is cancelled
+        await asyncio.wait({task})
+        if task.cancelled():
+            raise ReviewSuperseded("A newer commit superseded this review")
+        return task.result()
+
+    def _forget(self, key: PRKey, task: asyncio.Task):
+        entry = self._running.get(key)
+        if entry is not None and entry[1] is task:
+            del self._running[key]
+
+inflight_reviews = InflightReviews(SHARED_STATE)
\ No newline at end of file
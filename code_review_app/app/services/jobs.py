@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import httpx
+from app.services import database
+from app.services.findings import Finding, Review, render_markdown
+from app.services.github import delete_review_comment, list_review_comments, post_pr_review, update_pr_review
+from app.services.history import history_writer
+from app.services.inflight import inflight_reviews, ReviewSuperseded
+from app.services.metrics import RETRIES
+from app.services.pull_requests import analyze_pull_request, format_pr_key
+from app.services.ratelimit import WEBHOOK, priority
+from app.services.tracing import set_trace_id
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_DELAY = float(os.getenv("WEBHOOK_RETRY_DELAY", "10"))  # seconds, doubled per attempt
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "2"))  # seconds
+# A running job's lease is renewed every third of WEBHOOK_LEASE seconds; a job
+# whose worker process died stops being renewed and is claimed again
+WEBHOOK_LEASE = float(os.getenv("WEBHOOK_LEASE", "60"))
+# Findings on changed lines are posted as inline comments of one PR review, up
+# to this many; the rest stay in the review's summary
+PR_REVIEW_MAX_COMMENTS = int(os.getenv("PR_REVIEW_MAX_COMMENTS", "50"))
+
+SUPERSEDED_REVIEW = "_This review is outdated; see the newer review for the latest commit._"
+
+logger = logging.getLogger(__name__)
+
+def pull_request_key(data: dict) -> str:
+    """Identify the PR a pull_request webhook payload belongs to"""
+    return format_pr_key(
+        data["repository"]["owner"]["login"],
+        data["repository"]["name"],
+        data["pull_request"]["number"],
+    )
+
+def inline_findings(review: Review) -> list[Finding]:
+    """Findings that can be attached to a line of the diff"""
+    return [finding for finding in review.all_findings()
+            if finding.path is not None and finding.line is not None][:PR_REVIEW_MAX_COMMENTS]
+
+def review_comment(finding: Finding) -> dict:
+    comment = {"path": finding.path, "line": finding.end_line or finding.line, "side": "RIGHT",
+               "body": finding.message}
+    if finding.end_line is not None and finding.end_line > finding.line:
+        comment.update({"start_line": finding.line, "start_side": "RIGHT"})
+    return comment
+
+async def publish_review(owner: str, repo: str, pull_number: int, head_sha: str | None, review: Review):
+    """Post the review as one GitHub PR review with inline comments.
+
+    The same commit reviewed again (e.g. an edited PR) updates the bot's
+    review in place; a new commit gets a new review, and the previous one
+    loses its inline comments and is marked outdated, so findings never
+    pile up on the PR across pushes.
+    """
+    pr_key = format_pr_key(owner, repo, pull_number)
+    posted = await asyncio.to_thread(database.get_posted_review, pr_key)
+    inline = inline_findings(review)
+    body = render_markdown(review.without(inline))
+    if posted is not None and head_sha is not None and posted[1] == head_sha:
+        await update_pr_review(owner, repo, pull_number, posted[0], body)
+        return
+    try:
+        review_id = await post_pr_review(owner, repo, pull_number, body, [review_comment(f) for f in inline], head_sha)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 422 or not inline:
+            raise
+        # A line GitHub could not place in the diff rejects the whole review; post every finding in the summary
+        logger.warning("Inline review comments rejected, posting the summary only", extra={"error": str(e)})
+        review_id = await post_pr_review(owner, repo, pull_number, render_markdown(review), [], head_sha)
+    await asyncio.to_thread(database.save_posted_review, pr_key, review_id, head_sha, time.time())
+    if posted is not None and posted[0] != review_id:
+        await retire_review(owner, repo, pull_number, posted[0])
+
+async def retire_review(owner: str, repo: str, pull_number: int, review_id: int):
+    """Delete a superseded review's inline comments and mark its summary outdated"""
+    try:
+        # One at a time: GitHub throttles concurrent writes harder than sequential ones
+        for comment_id in await list_review_comments(owner, repo, pull_number, review_id):
+            await delete_review_comment(owner, repo, comment_id)
+        await update_pr_review(owner, repo, pull_number, review_id, SUPERSEDED_REVIEW)
+    except httpx.HTTPError as e:
+        logger.warning("Could not retire the previous review", extra={"review_id": review_id, "error": str(e)})
+
+async def review_pull_request(owner: str, repo: str, pull_number: int, head_sha: str | None = None):
+    """Analyze a PR and post the review, unless a newer push superseded it"""
+    start_time = time.time()
+    review = await analyze_pull_request(owner, repo, pull_number, head_sha)
+    history_writer.record_analysis("webhook", None, review, analysis_time=round(time.time() - start_time, 2),
+                                   reference=format_pr_key(owner, repo, pull_number))
+    if not inflight_reviews.is_latest((owner, repo, pull_number), head_sha):
+        raise ReviewSuperseded("A newer commit arrived before the review was posted")
+    await publish_review(owner, repo, pull_number, head_sha, review)
+
+async def handle_pull_request(data: dict):
+    owner = data["repository"]["owner"]["login"]
+    repo = data["repository"]["name"]
+    pull_number = data["pull_request"]["number"]
+    head_sha = data["pull_request"].get("head", {}).get("sha")
+    await review_pull_request(owner, repo, pull_number, head_sha)
+
+JOB_HANDLERS = {
+    "pull_request": handle_pull_request,
+}
+
+class WebhookWorkerPool:
+    """asyncio workers draining the durable webhook queue in SQLite"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    async def start(self):
+        now = time.time()
+        recovered = await asyncio.to_thread(database.requeue_running_webhooks, now, now - WEBHOOK_LEASE)
+        if recovered:
+            logger.info("Requeued interrupted webhook jobs", extra={"jobs": recovered})
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, event_type: str, payload: str, pr_key: str | None = None,
+                      head_sha: str | None = None) -> int:
+        job_id = await asyncio.to_thread(
+            database.enqueue_webhook, event_type, payload, time.time(), pr_key, head_sha
+        )
+        self._wakeup.set()
+        return job_id
+
+    async def _worker(self):
+        while True:
+            try:
+                now = time.time()
+                job = await asyncio.to_thread(database.claim_webhook_job, now, now - WEBHOOK_LEASE)
+            except Exception as e:
+                logger.warning("Webhook queue unavailable", extra={"error": str(e)})
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), WEBHOOK_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job)
+
+    async def _renew_lease(self, job_id: int):
+        while True:
+            await asyncio.sleep(WEBHOOK_LEASE / 3)
+            try:
+                await asyncio.to_thread(database.touch_webhook_job, job_id, time.time())
+            except Exception as e:
+                logger.warning("Could not renew webhook job lease", extra={"job_id": job_id, "error": str(e)})
+
+    async def _run(self, job: dict):
+        set_trace_id(f"job-{job['id']}")
+        handler = JOB_HANDLERS.get(job["event_type"])
+        lease = asyncio.create_task(self._renew_lease(job["id"]))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for event type {job['event_type']}")
+            with priority(WEBHOOK):  # Interactive requests get upstream quota first
+                await handler(json.loads(job["payload"]))
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back rather than wait for its lease to run out
+            await asyncio.to_thread(database.finish_webhook_job, job["id"], "queued", time.time(), None, time.time())
+            raise
+        except ReviewSuperseded as e:
+            await asyncio.to_thread(database.finish_webhook_job, job["id"], "superseded", time.time(), str(e))
+            return
+        except Exception as e:
+            now = time.time()
+            if handler is None or job["attempts"] >= WEBHOOK_MAX_ATTEMPTS:
+                logger.error("Webhook job dead-lettered", extra={"job_id": job["id"], "error": str(e)})
+                await asyncio.to_thread(database.finish_webhook_job, job["id"], "dead", now, str(e))
+            else:
+                retry_at = now + WEBHOOK_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+                RETRIES.inc(operation="webhook_job")
+                logger.warning("Webhook job failed, retrying",
+                               extra={"job_id": job["id"], "attempt": job["attempts"], "error": str(e)})
+                await asyncio.to_thread(database.finish_webhook_job, job["id"], "queued", now, str(e), retry_at)
+                self._wakeup.set()
+            return
+        finally:
+            lease.cancel()
+        await asyncio.to_thread(database.finish_webhook_job, job["id"], "done", time.time())
+
+webhook_workers = WebhookWorkerPool(WEBHOOK_WORKERS)
\ No newline at end of file
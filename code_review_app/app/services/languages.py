@@ -0,0 +1,13 @@
+import os
+
+# File extension -> language name, as shown to users and passed to the models
+EXTENSION_LANGUAGES = {
+    '.py': 'Python', '.js': 'JavaScript', '.ts': 'TypeScript',
+    '.java': 'Java', '.cpp': 'C++', '.c': 'C', '.cs': 'C#',
+    '.php': 'PHP', '.rb': 'Ruby', '.go': 'Go', '.rs': 'Rust',
+    '.swift': 'Swift', '.kt': 'Kotlin', '.scala': 'Scala',
+    '.html': 'HTML', '.css': 'CSS', '.sql': 'SQL', '.sh': 'Shell'
+}
+
+def language_for_path(path: str) -> str | None:
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
\ No newline at end of file
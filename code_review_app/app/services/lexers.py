@@ -0,0 +1,155 @@
+import io
+import re
+import tokenize
+from bisect import bisect_right
+from typing import NamedTuple
+
+class Token(NamedTuple):
+    kind: str  # "name", "op", "string", "number" or "comment"
+    value: str
+    line: int
+    col: int
+
+# Comment syntax per language for the lightweight lexer
+C_STYLE = ("//", "/*")
+LEXER_COMMENTS = {
+    "javascript": C_STYLE, "typescript": C_STYLE, "java": C_STYLE, "c": C_STYLE,
+    "c++": C_STYLE, "c#": C_STYLE, "go": C_STYLE, "rust": C_STYLE, "swift": C_STYLE,
+    "kotlin": C_STYLE, "scala": C_STYLE, "css": ("/*",),
+    "php": ("//", "/*", "#"), "ruby": ("#",), "shell": ("#",),
+    "sql": ("--", "/*"), "html": ("<!--",), "python": ("#",),
+}
+DEFAULT_COMMENTS = ("//", "/*", "#")
+
+_COMMENT_PATTERNS = {
+    "//": r"//[^\n]*",
+    "#": r"#[^\n]*",
+    "--": r"--[^\n]*",
+    "/*": r"/\*.*?(?:\*/|\Z)",
+    "<!--": r"<!--.*?(?:-->|\Z)",
+}
+_STRING = r"\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?"
+# Python strings take prefixes and can be triple-quoted, spanning lines
+_PYTHON_STRING = (
+    r"\"\"\"[^\"\\]*(?:(?:\\.|\"(?!\"\"))[^\"\\]*)*(?:\"\"\"|\Z)"
+    r"|'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*(?:'''|\Z)"
+    r"|\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n])*'?"
+)
+# (prefix, string) patterns per language for the lightweight lexer
+LEXER_STRINGS = {"python": (r"[rRbBuUfF]{1,2}", _PYTHON_STRING)}
+_NAME = r"[A-Za-z_$][\w$]*"
+_NUMBER = r"\d[\w.]*"
+_OP = r"===|!==|==|!=|<=|>=|=>|->|::|:=|&&|\|\||\+\+|--|[^\s\w]"
+
+_lexer_cache: dict[tuple, re.Pattern] = {}
+_span_cache: dict[tuple, tuple[re.Pattern, re.Pattern]] = {}
+
+def _lexer_config(language: str | None) -> tuple[tuple[str, ...], str, str]:
+    prefix, string = LEXER_STRINGS.get(language or "", ("", _STRING))
+    return LEXER_COMMENTS.get(language or "", DEFAULT_COMMENTS), prefix, string
+
+def _lexer_for(language: str | None) -> re.Pattern:
+    config = _lexer_config(language)
+    pattern = _lexer_cache.get(config)
+    if pattern is None:
+        comments, prefix, string = config
+        comment = "|".join(_COMMENT_PATTERNS[marker] for marker in comments)
+        if prefix:
+            string = f"(?:{prefix})?(?:{string})"
+        pattern = re.compile(
+            f"(?P<comment>{comment})|(?P<string>{string})|(?P<name>{_NAME})"
+            f"|(?P<number>{_NUMBER})|(?P<op>{_OP})|(?P<newline>\\n)",
+            re.DOTALL,
+        )
+        _lexer_cache[config] = pattern
+    return pattern
+
+def lex_generic(code: str, language: str | None, line: int = 1) -> list[Token]:
+    """Regex lexer that tells comments and strings apart from code; `line` is
+    the line number of the first line, for code cut from a larger text"""
+    tokens = []
+    line_start = 0
+    for match in _lexer_for(language).finditer(code):
+        kind = match.lastgroup
+        start = match.start()
+        if kind == "newline":
+            line, line_start = line + 1, start + 1
+            continue
+        value = match.group()
+        tokens.append(Token(kind, value, line, start - line_start + 1))
+        if kind in ("comment", "string") and "\n" in value:
+            line += value.count("\n")
+            line_start = start + value.rfind("\n") + 1
+    return tokens
+
+def _span_patterns(language: str | None) -> tuple[re.Pattern, re.Pattern]:
+    """Where a comment or string can start, and the comment or string starting there.
+    A span starts after any string prefix, which cannot start a comment or string."""
+    config = _lexer_config(language)
+    patterns = _span_cache.get(config)
+    if patterns is None:
+        comments, _, string = config
+        starts = {marker[0] for marker in comments} | {quote for quote in "\"'`" if quote in string}
+        patterns = _span_cache[config] = (
+            re.compile("[" + re.escape("".join(sorted(starts))) + "]"),
+            re.compile("|".join([*(_COMMENT_PATTERNS[marker] for marker in comments), string]), re.DOTALL),
+        )
+    return patterns
+
+class Spans(NamedTuple):
+    """Sorted, non-overlapping [start, end) offsets"""
+    starts: list[int]
+    ends: list[int]
+
+    def at(self, offset: int) -> int | None:
+        """Start of the span containing offset, if any"""
+        index = bisect_right(self.starts, offset) - 1
+        return self.starts[index] if index >= 0 and offset < self.ends[index] else None
+
+    def end_at(self, offset: int) -> int:
+        """End of the span containing offset; offset itself when outside every span"""
+        index = bisect_right(self.starts, offset) - 1
+        return self.ends[index] if index >= 0 and offset < self.ends[index] else offset
+
+def comment_string_spans(code: str, language: str | None) -> Spans:
+    """The comments and strings of code, as lex_generic finds them"""
+    start_pattern, span_pattern = _span_patterns(language)
+    search, match = start_pattern.search, span_pattern.match
+    starts, ends = [], []
+    found = search(code)
+    while found:
+        span = match(code, found.start())
+        if span is None:  # e.g. a division sign, not a comment
+            found = search(code, found.start() + 1)
+            continue
+        starts.append(span.start())
+        ends.append(span.end())
+        found = search(code, span.end())
+    return Spans(starts, ends)
+
+_PYTHON_KINDS = {
+    tokenize.NAME: "name", tokenize.OP: "op", tokenize.STRING: "string",
+    tokenize.NUMBER: "number", tokenize.COMMENT: "comment",
+}
+
+def lex_python(code: str, line: int = 1) -> list[Token]:
+    """Python tokens from the standard tokenize module; `line` as for lex_generic.
+
+    Snippets, diff fragments and regions cut from a file are often not valid
+    Python (unbalanced brackets, stray indentation); those fall back to the
+    generic lexer.
+    """
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            kind = _PYTHON_KINDS.get(token.type)
+            if kind is not None:
+                tokens.append(Token(kind, token.string, token.start[0] + line - 1, token.start[1] + 1))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return lex_generic(code, "python", line)
+    return tokens
+
+def lex(code: str, language: str | None, line: int = 1) -> list[Token]:
+    if language == "python":
+        return lex_python(code, line)
+    return lex_generic(code, language, line)
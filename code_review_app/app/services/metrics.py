@@ -0,0 +1,200 @@
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# Latency buckets in seconds, from rule-engine microseconds to provider deadlines
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+def _labels(labelnames: tuple[str, ...], values: dict[str, object]) -> Labels:
+    return tuple((name, str(values.get(name, ""))) for name in labelnames)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """A running total; with `collect`, read from a callback over totals kept elsewhere"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 collect: Callable[[], Iterable[tuple[dict, float]]] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+        self.collect = collect
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        if self.collect is not None:
+            for labels, value in self.collect():
+                values[_labels(self.labelnames, labels)] = value
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+class Gauge(Metric):
+    """A value that goes up and down; with `collect`, read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 collect: Callable[[], Iterable[tuple[dict, float]]] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_labels(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        if self.collect is not None:
+            for labels, value in self.collect():
+                values[_labels(self.labelnames, labels)] = value
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+class Registry:
+    """Metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), collect=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# Where the seconds go: one series per pipeline stage
+STAGE_SECONDS = registry.histogram(
+    "code_review_stage_seconds",
+    "Time spent per pipeline stage (github_diff_fetch, prompt_build, fallback_analysis, comment_post, ...)",
+    ["stage"],
+)
+PROVIDER_ATTEMPT_SECONDS = registry.histogram(
+    "code_review_provider_attempt_seconds",
+    "Duration of each remote provider attempt by outcome",
+    ["provider", "outcome"],
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "code_review_http_request_seconds",
+    "API request duration until response headers, by route",
+    ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = registry.gauge("code_review_http_requests_in_flight", "API requests being handled")
+RETRIES = registry.counter("code_review_retries_total", "Retried operations", ["operation"])
+TIMEOUTS = registry.counter("code_review_timeouts_total", "Operations that ran out of time", ["operation"])
+
+EVENT_LOOP_LAG = registry.histogram(
+    "code_review_event_loop_lag_seconds",
+    "How late the event loop woke from a timed sleep; sustained lag means something blocks the loop",
+)
+
+async def watch_event_loop(interval: float = 0.25):
+    """Sample event loop lag until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
+
+def observe_stage(stage: str):
+    """Context manager timing one pipeline stage"""
+    return STAGE_SECONDS.time(stage=stage)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+# CPU-bound local work (rule analysis, diff parsing) on inputs of at least
+# OFFLOAD_MIN_BYTES runs in worker processes so it cannot stall the event loop;
+# smaller inputs finish faster inline than the round trip to a worker
+OFFLOAD_ENABLED = os.getenv("OFFLOAD_ENABLED", "true").lower() in ("1", "true", "yes")
+OFFLOAD_MIN_BYTES = int(os.getenv("OFFLOAD_MIN_BYTES", "16384"))
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# "spawn" works everywhere and never copies the server's threads or sockets
+OFFLOAD_START_METHOD = os.getenv("OFFLOAD_START_METHOD", "spawn")
+
+logger = logging.getLogger(__name__)
+
+def _warm_worker():
+    """Worker initializer: load the rule files and build every language's rule set before the first job"""
+    from app.services.rules import warm_rules
+
+    warm_rules()
+
+def _ready() -> int:
+    return os.getpid()
+
+class CpuPool:
+    """Warm worker processes for CPU-bound analysis, with an inline path for small inputs.
+
+    Jobs wait on this side for a free worker rather than in the executor's
+    queue, so cancelling the awaiting task (e.g. when the client disconnects)
+    drops a job that has not started; a job already running finishes in its
+    worker and its result is discarded.
+    """
+
+    def __init__(self, enabled: bool, workers: int, min_bytes: int, start_method: str):
+        self.enabled = enabled and workers > 0
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.start_method = start_method
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.pending = 0
+        self.counts = {"inline": 0, "offloaded": 0, "cancelled": 0, "abandoned": 0, "broken": 0}
+
+    def _create(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_warm_worker,
+        )
+
+    async def start(self):
+        """Start and warm the workers; until they are warm, analysis runs inline"""
+        if not self.enabled:
+            return
+        executor = self._create()
+        # One job per worker so every process is started and warm before it gets real work
+        try:
+            await asyncio.gather(*(asyncio.wrap_future(executor.submit(_ready)) for _ in range(self.workers)))
+        except BrokenProcessPool as e:
+            logger.error("Analysis workers failed to start; running local analysis inline", extra={"error": str(e)})
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+            return
+        except asyncio.CancelledError:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = executor
+
+    async def stop(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args, size: int) -> Any:
+        """Call fn(*args) in a worker when `size` (bytes of input) reaches the threshold, else inline"""
+        if self._executor is None or size < self.min_bytes:
+            self.counts["inline"] += 1
+            return fn(*args)
+        self.counts["offloaded"] += 1
+        self.pending += 1
+        try:
+            return await self._submit(fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def _submit(self, fn: Callable[..., Any], *args) -> Any:
+        slots = self._slots
+        try:
+            await slots.acquire()
+        except asyncio.CancelledError:
+            self.counts["cancelled"] += 1
+            raise
+        executor = self._executor
+        try:
+            future: Future = executor.submit(fn, *args)
+        except BaseException as e:
+            slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._replace(executor)
+            raise
+        # The slot stays taken until the worker is done, even if nobody waits for the result any more
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(slots.release))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self.counts["abandoned" if future.running() else "cancelled"] += 1
+            raise
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+
+    def _replace(self, broken: ProcessPoolExecutor):
+        """A worker died (e.g. killed for memory) and took the pool with it; later calls get a new pool.
+        The failed call is not retried inline, since the input that killed a worker would stall the server."""
+        self.counts["broken"] += 1
+        if self._executor is broken:
+            logger.error("Analysis worker pool broke; starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._executor is not None,
+            "workers": self.workers if self._executor is not None else 0,
+            "min_bytes": self.min_bytes,
+            "pending": self.pending,
+            **self.counts,
+        }
+
+cpu_pool = CpuPool(OFFLOAD_ENABLED, OFFLOAD_WORKERS, OFFLOAD_MIN_BYTES, OFFLOAD_START_METHOD)
\ No newline at end of file
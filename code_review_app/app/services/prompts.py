@@ -0,0 +1,136 @@
+import os
+import re
+from app.services.metrics import observe_stage
+
+# Bump whenever the prompts below change so cached reviews are not reused
+PROMPT_VERSION = "2"
+
+SYSTEM_PROMPT = "You are an expert code reviewer and security analyst."
+
+REVIEW_INSTRUCTIONS = """Provide a detailed analysis in markdown format covering:
+1. **Security Vulnerabilities**: Any security issues found
+2. **Bugs**: Logic errors or potential runtime issues
+3. **Code Quality**: Suggestions for improvement
+4. **Best Practices**: Recommendations for better coding
+
+Be specific and actionable."""
+
+# Context window per model in tokens; prompts are fitted to it minus the answer's tokens
+MODEL_CONTEXT_TOKENS = {
+    "microsoft/DialoGPT-medium": 1024,
+    "gpt2": 1024,
+    "distilgpt2": 1024,
+    "gpt-3.5-turbo": 16385,
+    "claude-instant-1.2": 100000,
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+# Optional cap on every prompt regardless of model (0 = model context only)
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "0"))
+
+# Lines longer than this with almost no whitespace are minified code or encoded data
+MINIFIED_LINE_CHARS = 500
+
+# BPE tokenizers split roughly on these boundaries: words and digit groups
+# with their leading space, punctuation runs and whitespace runs. Long pieces
+# become several tokens; the per-piece costs below err on the high side
+# (about 3 characters per token for source code).
+_TOKEN_PIECES = re.compile(r" ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s+")
+WORD_CHARS = 6
+
+_LICENSE_MARKERS = re.compile(
+    r"copyright|spdx-license-identifier|all rights reserved|licensed under|permission is hereby granted",
+    re.IGNORECASE
+)
+_COMMENT_LINE = re.compile(r"^\s*(#|//|/\*|\*|<!--|--|;)")
+
+def count_tokens(text: str) -> int:
+    """Local token count for budgeting prompts; no model tokenizer needed"""
+    count = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        body = piece.lstrip(" ") or piece
+        if body[0].isalnum():
+            count += 1 + (len(body) - 1) // WORD_CHARS
+        elif body[0].isspace():
+            count += 1 + len(piece) // 4
+        else:
+            count += 1 + (len(body) - 1) // 2
+    return count
+
+def prompt_budget(model: str, max_output_tokens: int) -> int:
+    """Tokens available to the prompt of one request to `model`"""
+    budget = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) - max_output_tokens
+    if PROMPT_MAX_TOKENS:
+        budget = min(budget, PROMPT_MAX_TOKENS)
+    return max(budget, 0)
+
+def strip_license_header(code: str) -> str:
+    """Drop a leading comment block that is a license or copyright notice"""
+    lines = code.split("\n")
+    start = 1 if lines and lines[0].startswith("#!") else 0
+    end = start
+    while end < len(lines) and (not lines[end].strip() or _COMMENT_LINE.match(lines[end])):
+        end += 1
+    header = "\n".join(lines[start:end])
+    if not _LICENSE_MARKERS.search(header):
+        return code
+    return "\n".join(lines[:start] + lines[end:])
+
+def is_minified_line(line: str) -> bool:
+    return len(line) > MINIFIED_LINE_CHARS and line.count(" ") + line.count("\t") < len(line) // 50
+
+def compact_code(code: str) -> str:
+    """Shrink code without changing what a reviewer sees: license headers,
+    trailing whitespace, repeated blank lines and minified blobs go."""
+    if "\r" in code:
+        code = code.replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    blank = False
+    for line in strip_license_header(code).split("\n"):
+        line = line.rstrip()
+        if not line:
+            if not blank:
+                lines.append(line)
+            blank = True
+            continue
+        blank = False
+        if is_minified_line(line):
+            indent = line[:len(line) - len(line.lstrip())]
+            line = f"{indent}<minified line of {len(line)} characters omitted>"
+        lines.append(line)
+    return "\n".join(lines).strip("\n")
+
+def fit_to_budget(code: str, budget: int) -> str:
+    """Keep the head and tail of code within budget tokens, marking what was cut"""
+    if count_tokens(code) <= budget:
+        return code
+    lines = code.split("\n")
+    costs = [count_tokens(line) + 1 for line in lines]
+    marker_cost = 20
+    head_budget = max((budget - marker_cost) * 2 // 3, 0)
+    tail_budget = max(budget - marker_cost - head_budget, 0)
+    head, used = 0, 0
+    while head < len(lines) and used + costs[head] <= head_budget:
+        used += costs[head]
+        head += 1
+    tail, used = len(lines), 0
+    while tail > head and used + costs[tail - 1] <= tail_budget:
+        tail -= 1
+        used += costs[tail]
+    omitted = tail - head
+    marker = f"... [{omitted} lines omitted to fit the model's context] ..."
+    return "\n".join(lines[:head] + [marker] + lines[tail:])
+
+def review_prompt(code: str, language: str | None, model: str, max_output_tokens: int,
+                  system_prompt: bool = False) -> str:
+    """The review request for one model, with code compacted and fitted to its budget.
+
+    Set system_prompt when SYSTEM_PROMPT is sent alongside, so it is budgeted too.
+    """
+    with observe_stage("prompt_build"):
+        head = f"Analyze this {language or 'code'} for bugs, security vulnerabilities, and code quality issues:\n\n"
+        fence = f"```{language or 'text'}\n"
+        tail = f"\n```\n\n{REVIEW_INSTRUCTIONS}"
+        budget = prompt_budget(model, max_output_tokens) - count_tokens(head + fence + tail)
+        if system_prompt:
+            budget -= count_tokens(SYSTEM_PROMPT)
+        return f"{head}{fence}{fit_to_budget(compact_code(code), max(budget, 0))}{tail}"
\ No newline at end of file
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import Counter
+from typing import Callable
+from app.services import database
+from app.services.findings import Review, from_json, to_json
+from app.services.diff import DiffChunk, HUNK_HEADER, chunk_diff, compact_files, new_line_numbers, parse_unified_diff
+from app.services.huggingface import analyze_code
+from app.services.github import get_pr_diff
+from app.services.inflight import PRKey, inflight_reviews
+from app.services.languages import language_for_path
+from app.services.metrics import observe_stage
+from app.services.offload import cpu_pool
+from app.services.similarity import owned_by
+from app.services.triage import code_files, triage_counts
+
+# Large PR diffs are split per file/hunk into chunks of about this many tokens
+DIFF_CHUNK_TOKENS = int(os.getenv("DIFF_CHUNK_TOKENS", "3000"))
+DIFF_CHUNK_CONCURRENCY = int(os.getenv("DIFF_CHUNK_CONCURRENCY", "4"))
+# Unchanged lines kept around each change; the rest of the hunk context is not sent
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", "3"))
+
+NO_REVIEWABLE_CHANGES = (
+    "No code changes to review: only documentation, lock or generated files, whitespace or renames were modified."
+)
+REUSED_CHUNKS_NOTE = "_Reused previous findings for {reused} of {total} chunks unchanged since the last review._"
+
+def format_pr_key(owner: str, repo: str, pull_number: int) -> str:
+    return f"{owner}/{repo}#{pull_number}"
+
+def chunk_title(chunk: DiffChunk) -> str:
+    title = f"## 📄 `{chunk.path}`"
+    if chunk.parts > 1:
+        title += f" (part {chunk.part}/{chunk.parts})"
+    return title
+
+def locate(chunk: DiffChunk, review: Review) -> Review:
+    """A chunk's review with its findings moved from lines of the chunk to lines of the changed file.
+    Chunk reviews are stored unlocated, since a reused chunk may have moved within its file."""
+    return review.at(chunk.path, new_line_numbers(chunk.text))
+
+def chunk_hash(chunk: DiffChunk) -> str:
+    """Content hash of a chunk that ignores hunk line numbers, so hunks that
+    only moved because of edits elsewhere in the file keep their hash"""
+    digest = hashlib.sha256(chunk.path.encode("utf-8"))
+    for line in chunk.text.split("\n"):
+        match = HUNK_HEADER.match(line)
+        digest.update(b"\n")
+        digest.update(line[match.end():].encode("utf-8") if match else line.encode("utf-8"))
+    return digest.hexdigest()
+
+def prepare_chunks(diff: str) -> tuple[list[DiffChunk], Counter[str]]:
+    """Parse, triage and chunk a diff; the triage counts are returned because
+    large diffs are prepared in a worker process"""
+    counts: Counter[str] = Counter()
+    files = code_files(parse_unified_diff(diff), counts)
+    return chunk_diff(compact_files(files, DIFF_CONTEXT_LINES), DIFF_CHUNK_TOKENS), counts
+
+async def iter_chunk_reviews(diff: str, previous: dict[str, Review] | None = None):
+    """Analyze the chunks of a diff concurrently, yielding
+    (index, chunk, chunk hash, review) as each one finishes.
+
+    Files that change no code (docs, lock and generated files, whitespace,
+    renames) are skipped. Chunks whose hash appears in `previous` reuse the
+    stored findings instead of being analyzed again.
+    """
+    with observe_stage("diff_chunking"):
+        chunks, counts = await cpu_pool.run(prepare_chunks, diff, size=len(diff))
+    triage_counts.update(counts)
+    previous = previous or {}
+    semaphore = asyncio.Semaphore(DIFF_CHUNK_CONCURRENCY)
+
+    async def analyze_chunk(index: int, chunk: DiffChunk):
+        key = chunk_hash(chunk)
+        if key in previous:
+            return index, chunk, key, previous[key]
+        async with semaphore:
+            return index, chunk, key, await analyze_code(chunk.text, language_for_path(chunk.path))
+
+    tasks = [asyncio.ensure_future(analyze_chunk(index, chunk)) for index, chunk in enumerate(chunks)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def merge_chunk_reviews(reviews: list[tuple[int, DiffChunk, str, Review]], previous: dict[str, Review]) -> Review:
+    """Join chunk reviews into one report in diff order"""
+    reviews = sorted(reviews, key=lambda review: review[0])
+    report = Review(parts=[locate(chunk, review).titled(chunk_title(chunk)) for _, chunk, _, review in reviews])
+    reused = sum(1 for _, _, key, _ in reviews if key in previous)
+    if reused:
+        report = report.with_note(REUSED_CHUNKS_NOTE.format(reused=reused, total=len(reviews)))
+    return report
+
+async def review_unchunked(diff: str) -> Review:
+    """Review for a diff that produced no chunks"""
+    if parse_unified_diff(diff):
+        return Review(text=NO_REVIEWABLE_CHANGES)
+    # Not a git-style diff we can split; review it as plain text
+    return await analyze_code(diff, language=None)
+
+async def analyze_diff(diff: str, previous: dict[str, Review] | None = None,
+                       on_chunk: Callable[[dict], None] | None = None) -> tuple[Review, dict[str, Review]]:
+    """Analyze a unified diff chunk by chunk, concurrently, as one ordered report.
+
+    Returns the report and the findings per chunk hash. `on_chunk` is called
+    with a "chunk" event as each chunk's review is ready.
+    """
+    previous = previous or {}
+    reviews = []
+    async for item in iter_chunk_reviews(diff, previous):
+        reviews.append(item)
+        if on_chunk is not None:
+            index, chunk, _, review = item
+            on_chunk({"event": "chunk", "index": index, "path": chunk.path, "title": chunk_title(chunk),
+                      "review": locate(chunk, review)})
+    if not reviews:
+        report = await review_unchunked(diff)
+        if on_chunk is not None:
+            on_chunk({"event": "chunk", "index": 0, "path": None, "title": "", "review": report})
+        return report, {}
+    return merge_chunk_reviews(reviews, previous), {key: review for _, _, key, review in reviews}
+
+class ChunkEvents:
+    """The chunk events of the review running for a PR, kept for the streams
+    following it. Each review run is a new generation."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.generation = 0
+        self.running = False
+        self.followers = 0
+        self.changed = asyncio.Event()
+
+    def restart(self) -> int:
+        self.generation += 1
+        self.events = []
+        self.running = True
+        self._notify()
+        return self.generation
+
+    def add(self, generation: int, event: dict):
+        if generation == self.generation:
+            self.events.append(event)
+            self._notify()
+
+    def finish(self, generation: int):
+        if generation == self.generation:
+            self.running = False
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+# Chunk events per PR, while a review runs or a stream follows it
+_chunk_events: dict[PRKey, ChunkEvents] = {}
+
+def _release_chunk_events(key: PRKey, events: ChunkEvents):
+    if not events.running and not events.followers and _chunk_events.get(key) is events:
+        del _chunk_events[key]
+
+async def load_pr_hunks(pr_key: str) -> dict[str, Review]:
+    hunks = await asyncio.to_thread(database.get_pr_hunks, pr_key)
+    return {key: from_json(feedback) for key, feedback in hunks.items()}
+
+async def save_pr_review(pr_key: str, head_sha: str | None, report: Review, hunks: dict[str, Review]):
+    """Store the report and the chunk reviews later pushes may reuse. Rule-based
+    chunk reviews (e.g. every provider was down) are not kept, just as
+    analyze_code never caches them, so unchanged chunks get a remote review next time."""
+    kept = {key: to_json(review) for key, review in hunks.items() if not review.rule_based}
+    await asyncio.to_thread(database.save_pr_review, pr_key, head_sha, to_json(report), kept, time.time())
+
+async def _fetch_and_analyze(owner: str, repo: str, pull_number: int, head_sha: str | None) -> Review:
+    pr_key = format_pr_key(owner, repo, pull_number)
+    last_review = await asyncio.to_thread(database.get_pr_review, pr_key)
+    if head_sha is not None and last_review is not None and last_review[0] == head_sha:
+        return from_json(last_review[1])  # This commit was already reviewed
+
+    key = (owner, repo, pull_number)
+    events = _chunk_events.setdefault(key, ChunkEvents())
+    generation = events.restart()
+    try:
+        diff = await get_pr_diff(owner, repo, pull_number)
+        previous = await load_pr_hunks(pr_key)
+        # Near-duplicate reviews are shared between the PRs of a repository only
+        with owned_by(f"github:{owner}/{repo}".lower()):
+            report, hunks = await analyze_diff(diff, previous, lambda event: events.add(generation, event))
+        await save_pr_review(pr_key, head_sha, report, hunks)
+        return report
+    finally:
+        events.finish(generation)
+        _release_chunk_events(key, events)
+
+async def analyze_pull_request(owner: str, repo: str, pull_number: int, head_sha: str | None = None) -> Review:
+    """Review a PR diff, sharing the analysis with concurrent requests for the same PR.
+
+    Raises ReviewSuperseded if a newer head SHA replaced this review.
+    """
+    return await inflight_reviews.run(
+        (owner, repo, pull_number),
+        head_sha,
+        lambda: _fetch_and_analyze(owner, repo, pull_number, head_sha),
+    )
+
+async def stream_pull_request(owner: str, repo: str, pull_number: int):
+    """Yield a "chunk" event as each PR chunk is reviewed, then a "done" event
+    with the merged report. The review runs through analyze_pull_request, so
+    concurrent streams and reviews of the same PR share one analysis; a stream
+    joining a running review first gets the chunks already reviewed."""
+    key = (owner, repo, pull_number)
+    events = _chunk_events.setdefault(key, ChunkEvents())
+    events.followers += 1
+    # The generation of the review this stream joins, or of the one it starts
+    generation = events.generation if events.running else events.generation + 1
+    review = asyncio.ensure_future(analyze_pull_request(owner, repo, pull_number))
+    try:
+        sent = 0
+        while True:
+            changed = events.changed
+            if events.generation == generation:
+                while sent < len(events.events):
+                    yield events.events[sent]
+                    sent += 1
+            if review.done():
+                break
+            waiter = asyncio.ensure_future(changed.wait())
+            await asyncio.wait({review, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        yield {"event": "done", "review": review.result()}
+    finally:
+        # Only this stream's wait is cancelled; the shared review goes on and is stored
+        review.cancel()
+        events.followers -= 1
+        _release_chunk_events(key, events)
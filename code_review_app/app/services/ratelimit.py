@@ -0,0 +1,256 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable
+import httpx
+from app.services import database
+from app.services.database import SHARED_STATE
+from app.services.health import UpstreamError
+
+# Work classes, served in this order when an upstream is short of quota
+INTERACTIVE = 0
+WEBHOOK = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", WEBHOOK: "webhook", BATCH: "batch"}
+
+# Requests that would wait longer than this for quota fail at once, so a
+# hedged race can move on to another provider
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))  # seconds
+
+logger = logging.getLogger(__name__)
+
+request_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+@contextmanager
+def priority(level: int):
+    """Run upstream calls made in this context (and tasks it starts) at `level`"""
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+# Remaining-quota and reset headers, most specific first
+REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining",
+                     "x-ratelimit-remaining")
+RESET_HEADERS = ("x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset", "x-ratelimit-reset")
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_delay(value: str, now: float) -> float | None:
+    """Seconds until a reset or Retry-After value: a number of seconds, an epoch
+    timestamp, an OpenAI-style duration ("6m0s"), or an HTTP or ISO date"""
+    value = value.strip()
+    try:
+        number = float(value)
+        return max(number - now, 0.0) if number > 1_000_000_000 else max(number, 0.0)
+    except ValueError:
+        pass
+    if value and _DURATION.sub("", value) == "":
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION.findall(value))
+    for parse in (parsedate_to_datetime, lambda text: datetime.fromisoformat(text.replace("Z", "+00:00"))):
+        try:
+            return max(parse(value).timestamp() - now, 0.0)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+class UpstreamLimiter:
+    """Token bucket for one upstream with a priority queue of waiting requests.
+
+    The bucket refills at `rate_per_minute`; response headers can drain it
+    (remaining quota) or block it until a reset time or Retry-After passes.
+    A shared bucket lives in SQLite so every worker process draws on one
+    quota; the queue of waiters (and their priorities) stays per process.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, shared: bool = False):
+        self.name = name
+        self.rate = rate_per_minute / 60
+        self.capacity = max(burst, 1)
+        self.shared = shared
+        # Last known (tokens, updated, blocked_until); wall-clock times so processes agree
+        self._state: tuple[float, float, float] | None = None
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self.throttled = 0
+
+    def _refilled(self, state: tuple | None, now: float) -> tuple[float, float]:
+        if state is None:
+            return float(self.capacity), 0.0
+        tokens, updated, blocked_until = state
+        return min(self.capacity, tokens + max(now - updated, 0.0) * self.rate), blocked_until
+
+    async def _update(self, change: Callable[[float, float, float], tuple[float, float, Any]]) -> Any:
+        """Apply change(tokens, blocked_until, now) -> (tokens, blocked_until, result) to the refilled bucket"""
+        result = None
+
+        def update(state: tuple | None) -> tuple[float, float, float]:
+            nonlocal result
+            now = time.time()
+            tokens, blocked_until = self._refilled(state, now)
+            tokens, blocked_until, result = change(tokens, blocked_until, now)
+            return tokens, now, blocked_until
+
+        if self.shared:
+            try:
+                self._state = await asyncio.to_thread(database.update_rate_bucket, self.name, update)
+                return result
+            except sqlite3.Error as e:
+                # Keep calls flowing on this process's own view of the bucket
+                logger.warning("Shared rate limit unavailable", extra={"upstream": self.name, "error": str(e)})
+        self._state = update(self._state)
+        return result
+
+    def _take(self, tokens: float, blocked_until: float, now: float) -> tuple[float, float, float]:
+        """Take a token; the result is 0, or the seconds until one is available"""
+        if now < blocked_until or tokens < 1:
+            return tokens, blocked_until, max(blocked_until - now, (1 - tokens) / self.rate, 0.0)
+        return tokens - 1, blocked_until, 0.0
+
+    def _refund(self, tokens: float, blocked_until: float, now: float) -> tuple[float, float, None]:
+        return min(self.capacity, tokens + 1), blocked_until, None
+
+    def _wait_time(self) -> float:
+        """Wait estimated from the last known bucket, without a round trip to a shared one"""
+        now = time.time()
+        tokens, blocked_until = self._refilled(self._state, now)
+        return max(blocked_until - now, (1 - tokens) / self.rate, 0.0)
+
+    async def acquire(self, level: int):
+        wait = None
+        if not self._waiters:
+            wait = await self._update(self._take)
+            if wait == 0:
+                return
+        if wait is None:
+            wait = self._wait_time()
+        if wait > RATE_LIMIT_MAX_WAIT:
+            self.throttled += 1
+            raise UpstreamError(f"{self.name} rate limit: no quota for {wait:.0f}s", 429)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._order), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                asyncio.ensure_future(self._update(self._refund))  # Granted but no longer needed
+            raise
+
+    async def _dispatch(self):
+        """Hand tokens to waiters in priority order as the bucket refills"""
+        while self._waiters:
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)  # Cancelled while waiting
+            if not self._waiters:
+                break
+            wait = await self._update(self._take)
+            if wait == 0:
+                future = heapq.heappop(self._waiters)[2] if self._waiters else None
+                if future is None or future.done():
+                    await self._update(self._refund)  # Its caller went away during a shared update
+                else:
+                    future.set_result(None)
+                continue
+            await asyncio.sleep(wait)
+
+    async def observe(self, response: httpx.Response):
+        """Fold an upstream's rate-limit headers into the bucket"""
+        headers = response.headers
+        now = time.time()
+        block = None
+        retry_after = headers.get("retry-after")
+        if response.status_code in (429, 503) and retry_after:
+            block = parse_delay(retry_after, now)
+        remaining_count = None
+        remaining = next((headers[name] for name in REMAINING_HEADERS if name in headers), None)
+        if remaining is not None:
+            try:
+                remaining_count = int(float(remaining))
+            except ValueError:
+                pass
+        if remaining_count is not None and remaining_count <= 0:
+            reset = next((headers[name] for name in RESET_HEADERS if name in headers), None)
+            delay = parse_delay(reset, now) if reset else None
+            block = max(block or 0.0, delay if delay is not None else 60.0)
+        if block is None and remaining_count is None:
+            return
+
+        def apply(tokens: float, blocked_until: float, now: float) -> tuple[float, float, None]:
+            if remaining_count is not None:
+                tokens = min(tokens, float(remaining_count))
+            if block is not None:
+                blocked_until = max(blocked_until, now + block)
+            return tokens, blocked_until, None
+
+        await self._update(apply)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        tokens, blocked_until = self._refilled(self._state, now)
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for level, _, future in self._waiters:
+            if not future.done():
+                waiting[PRIORITY_NAMES.get(level, str(level))] += 1
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "tokens": round(tokens, 2),
+            "blocked_for": round(max(blocked_until - now, 0.0), 2),
+            "waiting": waiting,
+            "throttled": self.throttled,
+            "shared": self.shared,
+        }
+
+class RateLimiter:
+    """Limiters for every upstream that has a rate configured"""
+
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self._limiters: dict[str, UpstreamLimiter] = {}
+
+    def configure(self, name: str, rate_per_minute: float, burst: int):
+        if rate_per_minute > 0:
+            self._limiters[name] = UpstreamLimiter(name, rate_per_minute, burst, self.shared)
+        else:
+            self._limiters.pop(name, None)
+
+    async def acquire(self, name: str):
+        limiter = self._limiters.get(name)
+        if limiter is not None:
+            await limiter.acquire(request_priority.get())
+
+    async def observe(self, name: str, response: httpx.Response):
+        limiter = self._limiters.get(name)
+        if limiter is not None:
+            await limiter.observe(response)
+
+    def event_hooks(self, name: str) -> dict:
+        """httpx event hooks that take quota before each request to `name` and read the response's limits.
+        Requests sent with extensions={"rate_limit": False} (connection warm-up) are left alone."""
+        async def on_request(request: httpx.Request):
+            if request.extensions.get("rate_limit", True):
+                await self.acquire(name)
+
+        async def on_response(response: httpx.Response):
+            if response.request.extensions.get("rate_limit", True):
+                await self.observe(name, response)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def snapshot(self) -> dict[str, dict]:
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+rate_limiter = RateLimiter(SHARED_STATE)
\ No newline at end of file
@@ -0,0 +1,280 @@
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Iterator
+from app.services.lexers import Spans, Token, comment_string_spans, lex
+from app.services.scanner import LiteralScanner
+
+# Directory of declarative rule files (*.json), one or more languages each
+RULES_DIR = os.getenv("RULES_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules"))
+
+# Names accepted for languages besides the ones in EXTENSION_LANGUAGES
+LANGUAGE_ALIASES = {
+    "py": "python", "js": "javascript", "ts": "typescript", "cpp": "c++",
+    "csharp": "c#", "bash": "shell", "sh": "shell", "golang": "go",
+}
+
+def canonical_language(language: str | None) -> str | None:
+    if not language or language.lower() in ("none", "unknown", "text"):
+        return None
+    name = language.strip().lower()
+    return LANGUAGE_ALIASES.get(name, name)
+
+class Rule:
+    __slots__ = ("id", "category", "message", "match", "unless", "order")
+
+    def __init__(self, spec: dict, order: int):
+        self.id = spec["id"]
+        self.category = spec["category"]
+        self.message = spec["message"]
+        self.match = spec["match"]
+        self.unless = spec.get("unless")
+        self.order = order
+
+class RuleSet:
+    """Rules for one language, indexed by what they match on and by the
+    literal (lowercased) that has to appear in the code for them to match"""
+
+    def __init__(self, rules: list[Rule], language: str | None = None):
+        self.rules = rules
+        self.language = language
+        self.calls: dict[str, list[tuple[str, Rule]]] = defaultdict(list)
+        self.identifiers: dict[str, list[Rule]] = defaultdict(list)
+        self.identifier_parts: list[tuple[str, Rule]] = []
+        self.operators: dict[str, list[Rule]] = defaultdict(list)
+        self.sequences: dict[str, list[Rule]] = defaultdict(list)
+        self.comments: list[tuple[str, Rule]] = []
+        self.texts: dict[str, list[Rule]] = defaultdict(list)
+        self.triggers: dict[str, list[Rule]] = defaultdict(list)
+        self._partial_triggers: set[str] = set()
+        for rule in rules:
+            self._index(rule)
+        self._text_scanner = LiteralScanner(list(self.texts))
+        self._trigger_scanner = LiteralScanner(list(self.triggers))
+
+    def _index(self, rule: Rule):
+        match = rule.match
+        if "call" in match:
+            # Calls are looked up by the last name segment, then checked against the dotted suffix
+            trigger = match["call"].rsplit(".", 1)[-1]
+            self.calls[trigger].append((match["call"], rule))
+        elif "identifier" in match:
+            trigger = match["identifier"]
+            if match.get("contains"):
+                self.identifier_parts.append((trigger.lower(), rule))
+            else:
+                self.identifiers[trigger].append(rule)
+        elif "operator" in match:
+            trigger = match["operator"]
+            self.operators[trigger].append(rule)
+        elif "sequence" in match:
+            trigger = match["sequence"][0]
+            self.sequences[trigger.lower() if match.get("ignore_case") else trigger].append(rule)
+        elif "comment" in match:
+            trigger = match["comment"]
+            self.comments.append((trigger, rule))
+        elif "text" in match:
+            self.texts[match["text"]].append(rule)
+            return
+        else:
+            raise ValueError(f"Rule {rule.id} has no supported matcher")
+        self.triggers[trigger.lower()].append(rule)
+        if not (("call" in match or "sequence" in match or "identifier" in match and not match.get("contains"))
+                and all(map(_is_name_char, trigger))):
+            # This trigger can match inside a longer word or token
+            self._partial_triggers.add(trigger.lower())
+
+    def run(self, code: str, count: tuple[str, ...] = ()) -> tuple[dict[str, tuple[Rule, tuple[int, int]]], Counter[str]]:
+        """Return {rule id: (rule, (line, col))} for the first hit of each rule,
+        in rule order, and how often each name in `count` appears outside
+        comments and strings.
+
+        Only the lines where the literal scan finds a rule's trigger are
+        tokenized, widened so no comment or string is cut in two, and a rule's
+        trigger is no longer searched for once the rule has matched.
+        """
+        hits: dict[str, tuple[Rule, tuple[int, int]]] = {}
+        spans = comment_string_spans(code, self.language)
+        lowered = code.lower()
+        if len(lowered) != len(code):
+            # Lowercasing moved offsets (e.g. "İ"), so the scan cannot place hits: tokenize everything
+            self._match(lex(code, self.language), hits)
+        else:
+            def wanted(trigger: str) -> bool:
+                return any(rule.id not in hits for rule in self.triggers[trigger])
+
+            line, counted_to, lexed_to = 1, 0, 0
+            for offset, trigger in self._trigger_scanner.finditer(lowered, wanted):
+                if offset < lexed_to or (trigger not in self._partial_triggers
+                                         and not _whole_word(code, offset, offset + len(trigger))):
+                    continue
+                start, lexed_to = _region(code, spans, offset)
+                line += code.count("\n", counted_to, start)
+                counted_to = start
+                self._match(lex(code[start:lexed_to], self.language, line), hits)
+
+        if self.texts:
+            for text, position in self._text_scanner.scan(code).items():
+                for rule in self.texts[text]:
+                    hits.setdefault(rule.id, (rule, position))
+
+        present: dict[str, bool] = {}
+        for rule, _ in hits.values():
+            if rule.unless and rule.unless["identifier"] not in present:
+                name = rule.unless["identifier"]
+                present[name] = next(_names_in(code, spans, [name]), None) is not None
+        return {
+            rule.id: hits[rule.id]
+            for rule in self.rules
+            if rule.id in hits and not (rule.unless and present[rule.unless["identifier"]])
+        }, Counter(name for _, name in _names_in(code, spans, count))
+
+    def _match(self, tokens: list[Token], hits: dict[str, tuple[Rule, tuple[int, int]]]):
+        """Record the first hit of each rule among tokens"""
+        def hit(rule: Rule, token: Token):
+            if rule.id not in hits:
+                hits[rule.id] = (rule, (token.line, token.col))
+
+        dotted, chain_end = "", -2
+        for i, token in enumerate(tokens):
+            kind, value = token.kind, token.value
+            if kind == "name":
+                if chain_end == i - 2 and tokens[i - 1].value == ".":
+                    dotted = f"{dotted}.{value}"
+                else:
+                    dotted = value
+                chain_end = i
+                for rule in self.identifiers.get(value, ()):
+                    hit(rule, token)
+                if self.identifier_parts:
+                    lowered = value.lower()
+                    for part, rule in self.identifier_parts:
+                        if part in lowered and (not rule.match.get("assigned_literal") or _assigned_literal(tokens, i)):
+                            hit(rule, token)
+            elif kind == "op":
+                if value == "(" and chain_end == i - 1:
+                    for name, rule in self.calls.get(dotted.rsplit(".", 1)[-1], ()):
+                        if dotted == name or dotted.endswith("." + name):
+                            hit(rule, tokens[i - 1])
+                for rule in self.operators.get(value, ()):
+                    hit(rule, token)
+            elif kind == "comment":
+                for marker, rule in self.comments:
+                    if marker in value:
+                        hit(rule, token)
+                continue
+            else:
+                continue
+
+            for key in {value, value.lower()} if self.sequences else ():
+                for rule in self.sequences.get(key, ()):
+                    if rule.id not in hits and _sequence_at(tokens, i, rule.match):
+                        hit(rule, token)
+
+def _region(code: str, spans: Spans, offset: int) -> tuple[int, int]:
+    """Start and end of the line at offset, widened to whole lines until no comment or string crosses either end"""
+    start = code.rfind("\n", 0, offset) + 1
+    while start and (span_start := spans.at(start - 1)) is not None:
+        start = code.rfind("\n", 0, span_start) + 1
+    end = code.find("\n", offset)
+    while end >= 0 and (span_end := spans.end_at(end)) != end:
+        end = code.find("\n", span_end)
+    return start, len(code) if end < 0 else end
+
+def _names_in(code: str, spans: Spans, names: list[str] | tuple[str, ...]) -> Iterator[tuple[int, str]]:
+    """(offset, name) of each name appearing as a whole word outside comments and strings"""
+    for offset, name in LiteralScanner(list(names)).finditer(code):
+        if _whole_word(code, offset, offset + len(name)) and spans.at(offset) is None:
+            yield offset, name
+
+def _whole_word(code: str, start: int, end: int) -> bool:
+    return (start == 0 or not _is_name_char(code[start - 1])) and (end == len(code) or not _is_name_char(code[end]))
+
+def _is_name_char(char: str) -> bool:
+    return char.isalnum() or char in "_$"
+
+def _assigned_literal(tokens: list[Token], i: int) -> bool:
+    # NAME = "literal", NAME: "literal", NAME := "literal"
+    return (
+        i + 2 < len(tokens)
+        and tokens[i + 1].value in ("=", ":", ":=")
+        and tokens[i + 2].kind == "string"
+    )
+
+def _sequence_at(tokens: list[Token], i: int, match: dict) -> bool:
+    sequence = match["sequence"]
+    if i + len(sequence) > len(tokens):
+        return False
+    ignore_case = match.get("ignore_case", False)
+    for offset, expected in enumerate(sequence):
+        if expected == "?":
+            continue
+        actual = tokens[i + offset].value
+        if (actual.lower() != expected.lower()) if ignore_case else (actual != expected):
+            return False
+    return True
+
+class RuleRegistry:
+    """Rule files indexed by language; rule sets are built lazily per language"""
+
+    def __init__(self, rules_dir: str):
+        self.rules_dir = rules_dir
+        self._by_language: dict[str, list[Rule]] | None = None
+        self._sets: dict[str | None, RuleSet] = {}
+
+    def load(self):
+        by_language: dict[str, list[Rule]] = defaultdict(list)
+        order = 0
+        for filename in sorted(os.listdir(self.rules_dir)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(self.rules_dir, filename), encoding="utf-8") as f:
+                spec = json.load(f)
+            for rule_spec in spec["rules"]:
+                rule = Rule(rule_spec, order)
+                order += 1
+                for language in spec["languages"]:
+                    by_language[language if language == "*" else canonical_language(language)].append(rule)
+        self._by_language = dict(by_language)
+        self._sets = {}
+
+    def languages(self) -> list[str]:
+        self._ensure_loaded()
+        return sorted(language for language in self._by_language if language != "*")
+
+    def rules_for(self, language: str | None) -> RuleSet:
+        """Rules for a language plus the language-independent ones.
+
+        With no language at all every rule runs, as the original substring
+        checks did for snippets pasted without a language.
+        """
+        self._ensure_loaded()
+        language = canonical_language(language)
+        ruleset = self._sets.get(language)
+        if ruleset is None:
+            if language is None:
+                rules = {rule.id: rule for group in self._by_language.values() for rule in group}
+                selected = list(rules.values())
+            else:
+                selected = self._by_language.get(language, []) + self._by_language.get("*", [])
+            common = {id(rule) for rule in self._by_language.get("*", [])}
+            # Language-specific rules report first, then the language-independent ones
+            ruleset = RuleSet(sorted(selected, key=lambda rule: (id(rule) in common, rule.order)), language)
+            self._sets[language] = ruleset
+        return ruleset
+
+    def _ensure_loaded(self):
+        if self._by_language is None:
+            self.load()
+
+def run_rules(code: str, language: str | None,
+              count: tuple[str, ...] = ()) -> tuple[dict[str, tuple[Rule, tuple[int, int]]], Counter[str]]:
+    """Run a language's rules over code, counting the names in `count` (see RuleSet.run)"""
+    return rule_registry.rules_for(language).run(code, count)
+
+def warm_rules():
+    """Load the rule files and build every language's rule set ahead of the first analysis"""
+    for language in [None, *rule_registry.languages()]:
+        run_rules("x = 1\n", language)
+
+rule_registry = RuleRegistry(RULES_DIR)
\ No newline at end of file
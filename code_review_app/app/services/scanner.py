@@ -0,0 +1,54 @@
+import heapq
+from typing import Callable, Iterator
+
+class LiteralScanner:
+    """Multi-literal matcher built once and reused for every input.
+
+    CPython's substring search (str.find) runs in C and stops at the first
+    hit, which benchmarks several times faster on 1MB inputs than a combined
+    `re` alternation that steps through every character in the regex engine.
+    Each distinct literal is searched once, and all hits are then resolved to
+    line/column positions in a single forward sweep over the text.
+    """
+
+    def __init__(self, literals: list[str]):
+        # Preserve order but search each distinct literal only once
+        self.literals = tuple(dict.fromkeys(literal for literal in literals if literal))
+
+    def scan(self, text: str) -> dict[str, tuple[int, int]]:
+        """Return {literal: (line, column)} of the first occurrence of each literal found"""
+        offsets = {}
+        for literal in self.literals:
+            offset = text.find(literal)
+            if offset >= 0:
+                offsets[literal] = offset
+        return self._locate(text, offsets)
+
+    def finditer(self, text: str, wanted: Callable[[str], bool] = lambda literal: True) -> Iterator[tuple[int, str]]:
+        """Yield (offset, literal) of every occurrence, in text order. A literal
+        is dropped the first time `wanted` returns False for it, so literals the
+        caller is done with are not searched for again."""
+        heap = [(offset, literal) for literal in self.literals if (offset := text.find(literal)) >= 0]
+        heapq.heapify(heap)
+        while heap:
+            offset, literal = heap[0]
+            if not wanted(literal):
+                heapq.heappop(heap)
+                continue
+            yield offset, literal
+            following = text.find(literal, offset + 1)
+            if following >= 0:
+                heapq.heapreplace(heap, (following, literal))
+            else:
+                heapq.heappop(heap)
+
+    @staticmethod
+    def _locate(text: str, offsets: dict[str, int]) -> dict[str, tuple[int, int]]:
+        positions = {}
+        line = 1
+        counted_to = 0
+        for literal, offset in sorted(offsets.items(), key=lambda item: item[1]):
+            line += text.count("\n", counted_to, offset)
+            counted_to = offset
+            positions[literal] = (line, offset - text.rfind("\n", 0, offset))
+        return positions
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import difflib
+import hashlib
+import keyword
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import NamedTuple
+from app.services import database
+from app.services.findings import Review, from_json, to_json
+from app.services.lexers import Token, lex
+from app.services.offload import cpu_pool
+from app.services.rules import canonical_language, run_rules
+
+# Near-duplicate reuse: remote reviews are indexed by a SimHash of the code's
+# token shingles, with comments dropped and names, strings and numbers reduced
+# to placeholders. A snippet whose shape, literals (and rule findings) match an
+# indexed one reuses its review; one within SIMILARITY_DELTA_BITS whose changed
+# lines (literals included) are at most SIMILARITY_DELTA_RATIO of its code lines
+# has only those lines (plus SIMILARITY_CONTEXT_LINES around them) reviewed,
+# next to the old review. Reviews are only shared within one owner (see owned_by).
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() in ("1", "true", "yes")
+SIMILARITY_SHINGLE = int(os.getenv("SIMILARITY_SHINGLE", "5"))  # tokens per shingle
+SIMILARITY_DELTA_BITS = int(os.getenv("SIMILARITY_DELTA_BITS", "12"))  # of 64
+SIMILARITY_DELTA_RATIO = float(os.getenv("SIMILARITY_DELTA_RATIO", "0.3"))
+SIMILARITY_CONTEXT_LINES = int(os.getenv("SIMILARITY_CONTEXT_LINES", "3"))
+SIMILARITY_MAX_AGE = float(os.getenv("SIMILARITY_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "10000"))
+
+# Fingerprints are split into 8 LSH bands of 8 bits; two fingerprints within
+# 7 bits of each other always share a band, so they are always compared
+SIMHASH_BITS = 64
+BAND_BITS = 8
+
+# Names kept as they are; every other name becomes a placeholder
+KEYWORDS = frozenset(keyword.kwlist) | frozenset(
+    "abstract async await break case catch class const continue default delete do else enum export extends "
+    "final finally fn for func function go if impl implements import in instanceof interface let match mod "
+    "new null package private protected pub public return static struct super switch this throw throws try "
+    "type typeof use var void while yield true false nil self".split()
+)
+
+REUSED_NOTE = ("_Reused the review of a near-identical earlier submission "
+               "(only names, comments or layout differ)._")
+DELTA_NOTE = "_Only the lines changed since a similar earlier submission were reviewed; its review covers the rest._"
+EARLIER_REVIEW_TITLE = "## Earlier review of the unchanged code"
+
+logger = logging.getLogger(__name__)
+
+# Whose code is being reviewed (a repository, or an API client). Reviews quote
+# the code they review, so they are only reused for the same owner, and not at
+# all when there is none.
+review_owner: contextvars.ContextVar[str | None] = contextvars.ContextVar("review_owner", default=None)
+
+@contextmanager
+def owned_by(owner: str | None):
+    """Index and reuse reviews made in this context (and tasks it starts) for `owner` only"""
+    token = review_owner.set(owner)
+    try:
+        yield
+    finally:
+        review_owner.reset(token)
+
+class Fingerprint(NamedTuple):
+    simhash: int
+    shape_hash: str  # same code shape, literals and rule findings
+
+class NearMatch(NamedTuple):
+    review_id: int
+    distance: int  # SimHash bits that differ
+    same_shape: bool  # and the same literals, so the review can be reused as it is
+    code: str
+    review: Review
+
+def code_tokens(code: str, language: str | None) -> list[Token]:
+    return [token for token in lex(code, canonical_language(language)) if token.kind != "comment"]
+
+def line_shapes(tokens: list[Token], literals: bool = False) -> list[tuple[int, str]]:
+    """(line number, shape) of every line with code. Names are numbered by first
+    use within the line, so renaming a variable leaves every shape unchanged;
+    called functions and attributes keep their names. Strings and numbers
+    become placeholders unless `literals`."""
+    lines: dict[int, list[str]] = {}
+    for index, token in enumerate(tokens):
+        if token.kind == "name":
+            following = tokens[index + 1].value if index + 1 < len(tokens) else ""
+            preceding = tokens[index - 1].value if index else ""
+            value = token.value if (token.value in KEYWORDS or following == "(" or preceding == ".") else None
+        elif token.kind == "string" and not literals:
+            value = "S"
+        elif token.kind == "number" and not literals:
+            value = "0"
+        else:
+            value = token.value
+        lines.setdefault(token.line, []).append(value if value is not None else "\0" + token.value)
+    shapes = []
+    for number in sorted(lines):
+        names: dict[str, str] = {}
+        parts = [names.setdefault(part, f"_{len(names)}") if part.startswith("\0") else part
+                 for part in lines[number]]
+        shapes.append((number, " ".join(parts)))
+    return shapes
+
+def simhash(tokens: list[str], size: int) -> int:
+    """64-bit SimHash over shingles of `size` tokens"""
+    shingles = [" ".join(tokens[start:start + size]) for start in range(max(len(tokens) - size + 1, 1))]
+    digests = [format(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"),
+                      "064b") for shingle in shingles]
+    # Counting set bits per column with str.count keeps the loop out of Python for large inputs
+    fingerprint = 0
+    for bit, column in enumerate(zip(*digests)):
+        if column.count("1") * 2 > len(digests):
+            fingerprint |= 1 << (SIMHASH_BITS - 1 - bit)
+    return fingerprint
+
+def fingerprint(code: str, language: str | None) -> Fingerprint:
+    tokens = code_tokens(code, language)
+    shapes = [shape for _, shape in line_shapes(tokens)]
+    hits, _ = run_rules(code, language)
+    # A changed SQL string or credential is a real change: the shape hash keeps literals
+    digest = hashlib.sha256("\n".join(shape for _, shape in line_shapes(tokens, literals=True)).encode("utf-8"))
+    digest.update(("\0" + ",".join(sorted(rule.id for rule, _ in hits.values()))).encode("utf-8"))
+    return Fingerprint(simhash(" ".join(shapes).split(), SIMILARITY_SHINGLE), digest.hexdigest())
+
+def bands(value: int) -> list[int]:
+    """LSH band keys: band index in the high bits, the band's value in the low ones"""
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | (value >> (band * BAND_BITS) & mask) for band in range(SIMHASH_BITS // BAND_BITS)]
+
+def delta_snippet(previous: str, code: str, language: str | None) -> str | None:
+    """The lines of `code` that changed since `previous` (renames aside), with
+    context. None when too much changed, or when `code` only lost lines or
+    only changed in ways the line shapes hide (a rule finding may have come or
+    gone), since the old review alone may then be wrong."""
+    old = line_shapes(code_tokens(previous, language), literals=True)
+    new = line_shapes(code_tokens(code, language), literals=True)
+    if not new:
+        return None
+    matcher = difflib.SequenceMatcher(None, [shape for _, shape in old], [shape for _, shape in new], autojunk=False)
+    changed = [new[index][0] for tag, _, _, start, end in matcher.get_opcodes() if tag != "equal"
+               for index in range(start, end)]
+    if not changed or len(changed) > len(new) * SIMILARITY_DELTA_RATIO:
+        return None
+    source = code.split("\n")
+    ranges: list[list[int]] = []
+    for number in changed:
+        low, high = max(number - SIMILARITY_CONTEXT_LINES, 1), min(number + SIMILARITY_CONTEXT_LINES, len(source))
+        if ranges and low <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], high)
+        else:
+            ranges.append([low, high])
+    return "\n...\n".join("\n".join(source[low - 1:high]) for low, high in ranges)
+
+def scope(owner: str, provider_chain: str, prompt_version: str, language: str | None) -> str:
+    """Reviews are only reused for the same owner, providers, prompt and language"""
+    return f"{owner}|{provider_chain}|{prompt_version}|{canonical_language(language) or ''}"
+
+def merge_delta(delta: Review, previous: Review) -> Review:
+    return delta.copy(parts=[*delta.parts, previous.titled(EARLIER_REVIEW_TITLE)]).with_note(DELTA_NOTE)
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+class NearDuplicateIndex:
+    """SimHash LSH index of remote reviews in SQLite, shared by every worker process"""
+
+    def __init__(self, enabled: bool, max_bits: int, max_age: float, max_entries: int):
+        self.enabled = enabled
+        self.max_bits = max_bits
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.counts: Counter[str] = Counter()
+
+    async def fingerprint(self, code: str, language: str | None) -> Fingerprint:
+        return await cpu_pool.run(fingerprint, code, language, size=len(code))
+
+    async def find(self, fp: Fingerprint, scope: str) -> NearMatch | None:
+        """The closest indexed review within max_bits, preferring one with the same shape"""
+        try:
+            candidates = await asyncio.to_thread(
+                database.find_similar_candidates, scope, bands(fp.simhash), time.time() - self.max_age)
+        except Exception as e:
+            logger.warning("Near-duplicate lookup failed", extra={"error": str(e)})
+            return None
+        best = None
+        for review_id, value, shape_hash in candidates:
+            distance = ((value & ((1 << SIMHASH_BITS) - 1)) ^ fp.simhash).bit_count()
+            rank = (shape_hash != fp.shape_hash, distance, -review_id)
+            if distance <= self.max_bits and (best is None or rank < best[0]):
+                best = (rank, review_id, distance, shape_hash == fp.shape_hash)
+        if best is None:
+            self.counts["miss"] += 1
+            return None
+        _, review_id, distance, same_shape = best
+        stored = await asyncio.to_thread(database.get_similar_review, review_id)
+        if stored is None:
+            return None
+        code, feedback = stored
+        return NearMatch(review_id, distance, same_shape, code, from_json(feedback))
+
+    async def add(self, fp: Fingerprint, scope: str, code: str, review: Review):
+        try:
+            await asyncio.to_thread(database.add_similar_review, scope, _signed(fp.simhash), fp.shape_hash, code,
+                                    to_json(review), bands(fp.simhash), time.time(), self.max_entries)
+        except Exception as e:
+            logger.warning("Could not index review for near-duplicate reuse", extra={"error": str(e)})
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self.counts}
+
+near_duplicates = NearDuplicateIndex(SIMILARITY_ENABLED, SIMILARITY_DELTA_BITS, SIMILARITY_MAX_AGE,
+                                     SIMILARITY_MAX_ENTRIES)
\ No newline at end of file
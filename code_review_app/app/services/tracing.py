@@ -0,0 +1,62 @@
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" or "text"
+
+# Incoming header that may carry a caller's trace ID; echoed back on the response
+TRACE_HEADER = "X-Trace-ID"
+
+trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def set_trace_id(value: str | None = None) -> contextvars.Token:
+    """Start a trace for the current request or job (and the tasks it starts)"""
+    return trace_id.set(value or new_trace_id())
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the current trace ID and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        current = trace_id.get()
+        if current:
+            entry["trace_id"] = current
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TraceFormatter(logging.Formatter):
+    """Plain text with the trace ID, for local development"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.trace = trace_id.get() or "-"
+        return super().format(record)
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TraceFormatter("%(asctime)s %(levelname)s [%(trace)s] %(name)s: %(message)s"))
+    logger = logging.getLogger("app")
+    logger.handlers = [handler]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
\ No newline at end of file
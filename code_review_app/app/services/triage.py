@@ -0,0 +1,114 @@
+import os
+import re
+from collections import Counter
+from app.services.diff import FileDiff, is_generated
+from app.services.languages import language_for_path
+from app.services.lexers import comment_string_spans
+from app.services.rules import canonical_language, run_rules
+
+# Local triage: inputs that a remote model would add nothing to are answered
+# by the rule engine alone
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Snippets with fewer code lines than this (not counting blanks and comments) stay local
+TRIAGE_MIN_LINES = int(os.getenv("TRIAGE_MIN_LINES", "5"))
+
+DOC_EXTENSIONS = {".md", ".markdown", ".rst", ".txt", ".adoc"}
+ASSET_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".pdf", ".woff", ".woff2", ".ttf"}
+DOC_NAMES = {"license", "licence", "changelog", "authors", "contributors", "notice", "codeowners"}
+# Files where indentation is syntax, so re-indenting is a real change
+INDENTED_EXTENSIONS = {".py", ".pyi", ".pyw", ".yaml", ".yml", ".mk"}
+INDENTED_NAMES = {"makefile", "gnumakefile"}
+
+_COMMENT_ONLY = re.compile(r"^\s*(#|//|/\*|\*|<!--|--|;)")
+_GAP = re.compile(r"\s+")
+
+# Why inputs were kept local or sent on, for the metrics endpoint
+triage_counts: Counter[str] = Counter()
+
+def code_line_count(code: str) -> int:
+    return sum(1 for line in code.split("\n") if line.strip() and not _COMMENT_ONLY.match(line))
+
+def needs_remote(code: str, language: str | None) -> bool:
+    """Whether a snippet is worth a remote model.
+
+    Comment-only input and snippets under TRIAGE_MIN_LINES code lines are
+    answered by the rules, unless the rules flag a security issue there,
+    which deserves a closer look.
+    """
+    if not TRIAGE_ENABLED:
+        return True
+    lines = code_line_count(code)
+    if lines == 0:
+        triage_counts["comments_only"] += 1
+        return False
+    if lines >= TRIAGE_MIN_LINES:
+        triage_counts["remote"] += 1
+        return True
+    hits, _ = run_rules(code, language)
+    if any(rule.category == "security" for rule, _ in hits.values()):
+        triage_counts["remote"] += 1
+        return True
+    triage_counts["tiny_snippet"] += 1
+    return False
+
+def _squeeze(lines: list[str], language: str | None, indented: bool) -> tuple[str, list[str]]:
+    """The lines without insignificant whitespace, and their string literals,
+    which are compared as they are. Blank lines, trailing whitespace and
+    whitespace between tokens go (a single space stays between two words);
+    indentation goes too unless `indented`."""
+    text = "\n".join(lines)
+    spans = comment_string_spans(text, language)
+    strings, pieces, position = [], [], 0
+    for start, end in zip(spans.starts, spans.ends):
+        if text[start] in "\"'`":  # A string; comments are squeezed like code
+            strings.append(text[start:end])
+            pieces.extend([text[position:start], "\0"])
+            position = end
+    pieces.append(text[position:])
+    squeezed = []
+    for line in "".join(pieces).split("\n"):
+        body = line.strip()
+        if body:
+            indent = line[:len(line) - len(line.lstrip())] if indented else ""
+            squeezed.append(indent + _GAP.sub(lambda gap: _gap(body, gap), body))
+    return "\n".join(squeezed), strings
+
+def _gap(line: str, gap: re.Match) -> str:
+    return " " if _is_word(line[gap.start() - 1]) and _is_word(line[gap.end()]) else ""
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+def classify_file(file: FileDiff) -> str:
+    """Kind of change a file diff makes: "code", or why it needs no model review"""
+    name = file.path.rsplit("/", 1)[-1].lower()
+    extension = "." + name.rsplit(".", 1)[-1] if "." in name else ""
+    if any(line.startswith("Binary files ") for line in file.header):
+        return "binary"
+    if not file.hunks:
+        return "rename_only" if any(line.startswith("rename from ") for line in file.header) else "metadata_only"
+    if is_generated(file):
+        return "generated"
+    if extension in DOC_EXTENSIONS or name.split(".", 1)[0] in DOC_NAMES:
+        return "docs"
+    if extension in ASSET_EXTENSIONS:
+        return "asset"
+    removed = [line[1:] for hunk in file.hunks for line in hunk.lines if line.startswith("-")]
+    added = [line[1:] for hunk in file.hunks for line in hunk.lines if line.startswith("+")]
+    language = canonical_language(language_for_path(file.path))
+    indented = extension in INDENTED_EXTENSIONS or name in INDENTED_NAMES
+    if _squeeze(removed, language, indented) == _squeeze(added, language, indented):
+        return "whitespace_only"
+    return "code"
+
+def code_files(files: list[FileDiff], counts: Counter[str] = triage_counts) -> list[FileDiff]:
+    """The files of a diff that change code; the rest are counted (in `counts`) and dropped"""
+    if not TRIAGE_ENABLED:
+        return files
+    kept = []
+    for file in files:
+        kind = classify_file(file)
+        counts[f"diff_{kind}"] += 1
+        if kind == "code":
+            kept.append(file)
+    return kept
\ No newline at end of file
@@ -0,0 +1,39 @@
+import codecs
+import os
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload goes over its byte or character limit"""
+
+    def __init__(self, limit: str):
+        self.limit = limit  # "bytes" or "chars"
+        super().__init__(f"Upload exceeds the {limit} limit")
+
+async def read_upload_text(upload: UploadFile, max_bytes: int, max_chars: int | None = None) -> str:
+    """Read and decode an upload as UTF-8 in chunks.
+
+    The byte limit is enforced while reading, whether or not the client sent
+    a size, so an oversized upload is rejected after at most max_bytes plus one
+    chunk. Only the decoded text is kept; raw chunks are dropped as soon as
+    they are decoded. Raises UploadTooLarge or UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts: list[str] = []
+    read_bytes = 0
+    chars = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        read_bytes += len(chunk)
+        if read_bytes > max_bytes:
+            raise UploadTooLarge("bytes")
+        text = decoder.decode(chunk)
+        chars += len(text)
+        if max_chars is not None and chars > max_chars:
+            raise UploadTooLarge("chars")
+        parts.append(text)
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
\ No newline at end of file
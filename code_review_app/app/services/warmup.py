@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+# Start-up work that can finish after the server accepts connections: /live
+# answers at once, /ready only when every step is done or failed. Steps still
+# running after WARMUP_TIMEOUT seconds are abandoned and the app reports ready.
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+
+logger = logging.getLogger(__name__)
+
+class WarmUp:
+    """Named start-up steps run one after another in a background task"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._steps: list[tuple[str, Callable[[], Awaitable]]] = []
+        self._task: asyncio.Task | None = None
+        self.results: dict[str, dict] = {}
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def add(self, name: str, step: Callable[[], Awaitable]):
+        self._steps.append((name, step))
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    async def start(self):
+        self.results = {name: {"status": "pending"} for name, _ in self._steps}
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        deadline = self.started_at + self.timeout
+        for name, step in self._steps:
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(step(), max(deadline - start, 0.0))
+                status = "done"
+            except asyncio.TimeoutError:
+                status = "timeout"
+                logger.warning("Warm-up step timed out", extra={"step": name})
+            except Exception as e:
+                status = "failed"
+                logger.warning("Warm-up step failed", extra={"step": name, "error": str(e)})
+            self.results[name] = {"status": status, "seconds": round(time.monotonic() - start, 3)}
+        self.finished_at = time.monotonic()
+        logger.info("Warm-up finished", extra={"seconds": round(self.finished_at - self.started_at, 3)})
+
+    def snapshot(self) -> dict:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return {
+            "ready": self.ready,
+            "seconds": round(end - self.started_at, 3) if self.started_at is not None else None,
+            "steps": self.results,
+        }
+
+warm_up = WarmUp(WARMUP_TIMEOUT)
\ No newline at end of file
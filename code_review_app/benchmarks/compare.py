@@ -0,0 +1,68 @@
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare benchmarks/results/load-A.json benchmarks/results/load-B.json --threshold 10
+
+Prints every numeric metric the two runs share and exits with status 1 when
+any latency, throughput or error metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# Metrics where a larger value is an improvement; everything else (latency, errors) is better smaller
+HIGHER_IS_BETTER = ("throughput_rps", "mb_per_s")
+# Counts and settings that describe the run rather than measure it
+IGNORED = ("requests", "concurrency", "repeat", "bytes", "count", "statuses", "jobs", "upstream_calls", "stdev_ms")
+
+def flatten(value, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            if key not in IGNORED:
+                flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+def change(metric: str, old: float, new: float) -> float | None:
+    """Relative change, positive when worse"""
+    if old == 0:
+        return None if new == 0 else float("inf")
+    relative = (new - old) / abs(old)
+    return -relative if metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else relative
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent worse that counts as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline  {baseline.get('git_revision')} {baseline['created_at']}")
+    print(f"candidate {candidate.get('git_revision')} {candidate['created_at']}")
+
+    regressions = []
+    for scenario in sorted(set(baseline["scenarios"]) & set(candidate["scenarios"])):
+        old = flatten(baseline["scenarios"][scenario])
+        new = flatten(candidate["scenarios"][scenario])
+        print(f"\n{scenario:42} {'baseline':>12}    {'candidate':>12}  improved")
+        for metric in sorted(set(old) & set(new)):
+            worse = change(metric, old[metric], new[metric])
+            flag = ""
+            if worse is not None and worse * 100 > args.threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{scenario} {metric}")
+            shown = "n/a" if worse is None else f"{-worse:+.1%}" if worse != float("inf") else "new"
+            print(f"  {metric:40} {old[metric]:>12.3f} -> {new[metric]:>12.3f}  {shown:>8}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
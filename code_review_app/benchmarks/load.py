@@ -0,0 +1,260 @@
+"""End-to-end load scenarios against the API, with every upstream mocked.
+
+Starts benchmarks.mock_upstreams and the API (app.main under uvicorn) as
+subprocesses, points all upstream base URLs at the mocks, then drives each
+scenario with a fixed number of concurrent clients:
+
+    python -m benchmarks.load --scenarios analyze,review-pr --requests 200 --concurrency 20 --profile flaky
+
+Scenarios: analyze, analyze-file, review-pr, webhook (a burst of signed
+pull_request webhooks, timed until the job queue drains). Use --api-url to
+target an API you started yourself; it must already point at the mocks, and
+reruns against it need a new --seed so its caches do not answer them.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from benchmarks.results import summarize, write_results
+from benchmarks.samples import parse_size, source
+
+APP_DIR = Path(__file__).resolve().parent.parent
+WEBHOOK_SECRET = "benchmark-secret"
+
+# Fault profiles applied to every mocked upstream
+PROFILES = {
+    "healthy": {"latency": 0.05},
+    "slow": {"latency": 0.5, "jitter": 0.25, "chunk_delay": 0.02},
+    "flaky": {"latency": 0.1, "jitter": 0.05, "error_rate": 0.2},
+    "throttled": {"latency": 0.1, "throttle_rate": 0.2, "retry_after": 2},
+    "outage": {"latency": 0.05, "error_rate": 1.0},
+}
+
+SCENARIOS = ("analyze", "analyze-file", "review-pr", "webhook")
+
+_SAMPLE = re.compile(r'^(code_review_(?:stage|provider_attempt|event_loop_lag)_seconds)_(sum|count)(?:\{(.*)\})? (\S+)$')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_process(args: list[str], env: dict | None = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=APP_DIR, env={**os.environ, **(env or {})})
+
+async def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def api_environment(mock_url: str, workdir: str, keep_rate_limits: bool) -> dict:
+    env = {
+        "HF_BASE_URL": mock_url,
+        "OPENAI_BASE_URL": mock_url,
+        "ANTHROPIC_BASE_URL": mock_url,
+        "GITHUB_API_URL": mock_url,
+        "OPENAI_API_KEY": "benchmark",
+        "ANTHROPIC_API_KEY": "benchmark",
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "DB_PATH": str(Path(workdir) / "benchmark.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+    if not keep_rate_limits:
+        # Measure the service, not the client-side quota meant for real providers
+        env.update({f"{prefix}_RATE_LIMIT": "0" for prefix in ("HF", "OPENAI", "ANTHROPIC", "GITHUB")})
+    return env
+
+async def scrape_timings(client: httpx.AsyncClient) -> dict[str, list[float]]:
+    """[sum, count] per stage, provider attempt and event loop lag series from /metrics"""
+    timings: dict[str, list[float]] = {}
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return timings
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, part, labels, value = match.groups()
+            series = timings.setdefault(f"{name}{{{labels or ''}}}", [0.0, 0.0])
+            series[0 if part == "sum" else 1] = float(value)
+    return timings
+
+def timing_delta(before: dict, after: dict) -> dict:
+    delta = {}
+    for key, (total, count) in after.items():
+        previous = before.get(key, [0.0, 0.0])
+        if count > previous[1]:
+            calls = count - previous[1]
+            delta[key] = {"count": int(calls), "mean_ms": round((total - previous[0]) / calls * 1000, 3)}
+    return delta
+
+async def drive(total: int, concurrency: int, send) -> tuple[list[float], dict[str, int], float]:
+    """Run `send(index)` `total` times from `concurrency` clients"""
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    indexes = iter(range(total))
+
+    async def client_loop():
+        for index in indexes:
+            start = time.perf_counter()
+            try:
+                status = str((await send(index)).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+def webhook_request(index: int, run_id: str) -> tuple[bytes, dict]:
+    body = json.dumps({
+        "action": "opened",
+        "repository": {"owner": {"login": "benchmark"}, "name": f"repo-{run_id}"},
+        # Distinct PR numbers per run, so a reused API or mock never answers from cache
+        "pull_request": {"number": int(run_id, 16) % 100_000 * 100_000 + index + 1,
+                         "head": {"sha": f"{run_id}{index:08x}"}},
+    }).encode()
+    signature = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Hub-Signature-256": signature, "X-GitHub-Event": "pull_request",
+                  "Content-Type": "application/json"}
+
+async def wait_for_drain(client: httpx.AsyncClient, timeout: float) -> tuple[float | None, dict]:
+    start = time.perf_counter()
+    jobs: dict = {}
+    while time.perf_counter() - start < timeout:
+        jobs = (await client.get("/api/webhook/jobs")).json()["jobs"]
+        if not jobs.get("queued") and not jobs.get("running"):
+            return time.perf_counter() - start, jobs
+        await asyncio.sleep(0.25)
+    return None, jobs
+
+async def run_scenario(name: str, api: httpx.AsyncClient, mock: httpx.AsyncClient, args, run_id: str) -> dict:
+    code_bytes = parse_size(args.code_size)
+
+    async def send(index: int) -> httpx.Response:
+        # Same inputs on every run with the same --seed, so results can be compared
+        seed = int.from_bytes(hashlib.sha256(f"{args.seed}:{name}:{index}".encode()).digest()[:4], "big")
+        if name == "analyze":
+            return await api.post("/api/analyze", json={"code": source(code_bytes, seed=seed), "language": "Python"})
+        if name == "analyze-file":
+            files = {"file": (f"module_{index}.py", source(code_bytes, seed=seed).encode(), "text/x-python")}
+            return await api.post("/api/analyze-file", files=files)
+        if name == "review-pr":
+            # The PR number picks the mock diff, so the same seed reviews the same diffs
+            return await api.post("/api/review-pr", json={"pr_url": f"https://github.com/benchmark/repo/pull/{seed}"})
+        body, headers = webhook_request(index, run_id)
+        return await api.post("/api/webhook", content=body, headers=headers)
+
+    await mock.post("/_mock/reset")
+    before = await scrape_timings(api)
+    latencies, statuses, elapsed = await drive(args.requests, args.concurrency, send)
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2) if elapsed else None,
+        "error_rate": round(sum(count for status, count in statuses.items() if not status.startswith("2"))
+                            / args.requests, 4),
+        "statuses": statuses,
+        "latency": summarize(latencies),
+    }
+    if name == "webhook":
+        drain, jobs = await wait_for_drain(api, args.drain_timeout)
+        result["drain_s"] = round(drain, 3) if drain is not None else None
+        result["jobs"] = jobs
+    result["upstream_calls"] = (await mock.get("/_mock/stats")).json()
+    result["timings"] = timing_delta(before, await scrape_timings(api))
+    return result
+
+async def run(args) -> dict:
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="code-review-bench-")
+    try:
+        mock_url = args.mock_url
+        if mock_url is None:
+            port = free_port()
+            mock_url = f"http://127.0.0.1:{port}"
+            processes.append(start_process(["-m", "benchmarks.mock_upstreams", "--port", str(port),
+                                            "--diff-files", str(args.diff_files), "--seed", "1"]))
+        await wait_until_up(f"{mock_url}/_mock/stats")
+        api_url = args.api_url
+        if api_url is None:
+            port = free_port()
+            api_url = f"http://127.0.0.1:{port}"
+            processes.append(start_process(
+                ["-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                api_environment(mock_url, workdir, args.keep_rate_limits),
+            ))
+        await wait_until_up(f"{api_url}/ready")  # 503 until warm-up is done
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as api, \
+                httpx.AsyncClient(base_url=mock_url) as mock:
+            faults = dict(PROFILES[args.profile])
+            faults.update({key: value for key, value in (("latency", args.latency), ("error_rate", args.error_rate),
+                                                         ("throttle_rate", args.throttle_rate)) if value is not None})
+            await mock.post("/_mock/faults", json={"*": faults})
+            run_id = os.urandom(4).hex()
+            results = {}
+            for name in args.scenarios.split(","):
+                if name not in SCENARIOS:
+                    raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+                results[name] = await run_scenario(name, api, mock, args, run_id)
+                latency = results[name]["latency"]
+                print(f"{name:14} {results[name]['throughput_rps']:>8} req/s  p50 {latency.get('p50_ms', 0):>9} ms  "
+                      f"p99 {latency.get('p99_ms', 0):>9} ms  errors {results[name]['error_rate']:.1%}")
+            return {"faults": faults, "results": results}
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="healthy")
+    parser.add_argument("--latency", type=float, help="override the profile's upstream latency (seconds)")
+    parser.add_argument("--error-rate", type=float, help="override the profile's share of 503s")
+    parser.add_argument("--throttle-rate", type=float, help="override the profile's share of 429s")
+    parser.add_argument("--code-size", default="2KB", help="code per analyze request")
+    parser.add_argument("--diff-files", type=int, default=3, help="files in each mock pull request")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request (seconds)")
+    parser.add_argument("--drain-timeout", type=float, default=300, help="seconds to wait for webhook jobs")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the API's client-side rate limits")
+    parser.add_argument("--mock-url", help="use running mock upstreams instead of starting them")
+    parser.add_argument("--api-url", help="use a running API instead of starting one")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated code and PR numbers")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    outcome = asyncio.run(run(args))
+    config = {**vars(args), "faults": outcome["faults"]}
+    path = write_results("load", config, outcome["results"], args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
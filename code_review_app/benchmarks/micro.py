@@ -0,0 +1,55 @@
+"""Microbenchmarks of the rule-based analysis on 1KB to 1MB inputs.
+
+    python -m benchmarks.micro --sizes 1KB,10KB,100KB,1MB --repeat 7
+"""
+import argparse
+import gc
+import statistics
+import time
+from benchmarks.results import write_results
+from benchmarks.samples import format_size, parse_size, source
+from app.services.huggingface import fallback_analysis
+
+DEFAULT_SIZES = "1KB,4KB,16KB,64KB,256KB,1MB"
+
+def bench(function, code: str, language: str, repeat: int) -> list[float]:
+    function(code, language)  # Warm the rule tables and regex caches
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function(code, language)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated input sizes")
+    parser.add_argument("--languages", default="python,javascript")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/micro-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    scenarios = {}
+    for language in args.languages.split(","):
+        for size in map(parse_size, args.sizes.split(",")):
+            code = source(size, language)
+            timings = bench(fallback_analysis, code, language, args.repeat)
+            median = statistics.median(timings)
+            name = f"fallback_analysis/{language}/{format_size(size)}"
+            scenarios[name] = {
+                "bytes": len(code.encode("utf-8")),
+                "repeat": args.repeat,
+                "min_ms": round(min(timings) * 1000, 3),
+                "median_ms": round(median * 1000, 3),
+                "stdev_ms": round(statistics.stdev(timings) * 1000, 3) if len(timings) > 1 else 0.0,
+                "mb_per_s": round(len(code) / median / 1_000_000, 2) if median else None,
+            }
+            print(f"{name:40} median {scenarios[name]['median_ms']:>10.3f} ms  "
+                  f"{scenarios[name]['mb_per_s'] or 0:>8.2f} MB/s")
+
+    path = write_results("micro", vars(args), scenarios, args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
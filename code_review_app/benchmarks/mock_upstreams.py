@@ -0,0 +1,166 @@
+"""Local stand-ins for the Hugging Face, OpenAI, Anthropic and GitHub APIs.
+
+Each route answers in the shape the real API uses. Latency, 503s and 429s are
+injected per upstream, from the command line or at runtime:
+
+    python -m benchmarks.mock_upstreams --port 9000 --latency 0.2 --error-rate 0.1
+    curl -X POST localhost:9000/_mock/faults -d '{"openai": {"throttle_rate": 0.5}}'
+
+Point the API at it with HF_BASE_URL, OPENAI_BASE_URL, ANTHROPIC_BASE_URL and
+GITHUB_API_URL (benchmarks.load does this itself).
+"""
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from benchmarks.samples import unified_diff
+
+UPSTREAM_NAMES = ("huggingface", "openai", "anthropic", "github")
+
+REVIEW_TEXT = (
+    "## Issues\n- Query built by string concatenation; use parameters.\n"
+    "## Warnings\n- Bare except hides errors.\n"
+    "## Suggestions\n- Replace the print call with logging.\n"
+)
+
+@dataclass
+class Faults:
+    latency: float = 0.05  # seconds before the first byte
+    jitter: float = 0.0  # +/- seconds, uniformly distributed
+    error_rate: float = 0.0  # share of calls answered with 503
+    throttle_rate: float = 0.0  # share of calls answered with 429
+    retry_after: float = 1.0  # Retry-After sent with each 429
+    chunk_delay: float = 0.0  # seconds between streamed chunks
+
+    def update(self, values: dict):
+        for field in fields(self):
+            if field.name in values:
+                setattr(self, field.name, float(values[field.name]))
+
+def create_app(faults: dict[str, Faults] | None = None, diff_files: int = 3, diff_lines: int = 60,
+               seed: int | None = None) -> FastAPI:
+    app = FastAPI(title="Mock upstreams")
+    faults = faults or {name: Faults() for name in UPSTREAM_NAMES}
+    calls = {name: Counter() for name in UPSTREAM_NAMES}
+    rng = random.Random(seed)
+    review_ids = iter(range(1, 1 << 62))
+
+    async def inject(name: str) -> Response | None:
+        """Wait out the configured latency, then maybe answer with a fault"""
+        fault = faults[name]
+        delay = max(fault.latency + rng.uniform(-fault.jitter, fault.jitter), 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = rng.random()
+        if roll < fault.throttle_rate:
+            calls[name]["429"] += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429,
+                                headers={"Retry-After": str(fault.retry_after)})
+        if roll < fault.throttle_rate + fault.error_rate:
+            calls[name]["503"] += 1
+            return JSONResponse({"error": "service unavailable"}, status_code=503)
+        calls[name]["200"] += 1
+        return None
+
+    def stream(name: str, events: list[str]) -> StreamingResponse:
+        async def body():
+            for event in events:
+                yield event
+                if faults[name].chunk_delay:
+                    await asyncio.sleep(faults[name].chunk_delay)
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    @app.post("/models/{model:path}")
+    async def huggingface(model: str):
+        return await inject("huggingface") or [{"generated_text": REVIEW_TEXT}]
+
+    @app.post("/v1/chat/completions")
+    async def openai(request: Request):
+        payload = await request.json()
+        fault = await inject("openai")
+        if fault:
+            return fault
+        if payload.get("stream"):
+            events = [f"data: {json.dumps({'choices': [{'delta': {'content': line + chr(10)}}]})}\n\n"
+                      for line in REVIEW_TEXT.splitlines()]
+            return stream("openai", events + ["data: [DONE]\n\n"])
+        return {"choices": [{"message": {"role": "assistant", "content": REVIEW_TEXT}}]}
+
+    @app.post("/v1/messages")
+    async def anthropic(request: Request):
+        payload = await request.json()
+        fault = await inject("anthropic")
+        if fault:
+            return fault
+        if payload.get("stream"):
+            events = [f"data: {json.dumps({'type': 'content_block_delta', 'delta': {'text': line + chr(10)}})}\n\n"
+                      for line in REVIEW_TEXT.splitlines()]
+            return stream("anthropic", events + [f"data: {json.dumps({'type': 'message_stop'})}\n\n"])
+        return {"content": [{"type": "text", "text": REVIEW_TEXT}]}
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}")
+    async def pull_request_diff(owner: str, repo: str, number: int):
+        # Each PR number gets its own files so reviews never share a cache key
+        return await inject("github") or PlainTextResponse(unified_diff(diff_files, diff_lines, seed=number))
+
+    @app.post("/repos/{owner}/{repo}/pulls/{number}/reviews")
+    async def post_review(owner: str, repo: str, number: int):
+        return await inject("github") or JSONResponse({"id": next(review_ids)})
+
+    @app.put("/repos/{owner}/{repo}/pulls/{number}/reviews/{review_id}")
+    async def update_review(owner: str, repo: str, number: int, review_id: int):
+        return await inject("github") or JSONResponse({"id": review_id})
+
+    @app.get("/_mock/stats")
+    async def stats():
+        return {name: dict(counter) for name, counter in calls.items()}
+
+    @app.post("/_mock/reset")
+    async def reset():
+        for counter in calls.values():
+            counter.clear()
+        return {"status": "reset"}
+
+    @app.get("/_mock/faults")
+    async def get_faults():
+        return {name: asdict(fault) for name, fault in faults.items()}
+
+    @app.post("/_mock/faults")
+    async def set_faults(request: Request):
+        """Change faults per upstream: {"openai": {"latency": 0.5}, "*": {"error_rate": 0.1}}"""
+        for name, values in (await request.json()).items():
+            for target in UPSTREAM_NAMES if name == "*" else [name]:
+                faults[target].update(values)
+        return await get_faults()
+
+    return app
+
+def main(argv: list[str] | None = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--faults", default="{}", help='JSON faults per upstream, e.g. {"github": {"latency": 0.3}}')
+    parser.add_argument("--diff-files", type=int, default=3, help="files in each mock pull request")
+    parser.add_argument("--diff-lines", type=int, default=60, help="added lines per file")
+    parser.add_argument("--seed", type=int, help="seed for jitter and fault rolls")
+    for field in fields(Faults):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=float, help=f"{field.name} for every upstream")
+    args = parser.parse_args(argv)
+
+    faults = {name: Faults() for name in UPSTREAM_NAMES}
+    shared = {field.name: getattr(args, field.name) for field in fields(Faults)
+              if getattr(args, field.name) is not None}
+    for name, fault in faults.items():
+        fault.update(shared)
+        fault.update(json.loads(args.faults).get(name, {}))
+    app = create_app(faults, args.diff_files, args.diff_lines, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import random
+
+# A module that trips a realistic mix of rules (security, quality, style)
+PYTHON_BLOCK = '''
+class OrderService{n}:
+    """Orders for tenant {n}"""
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.cache = cache or {{}}
+
+    def load(self, order_id):
+        # TODO: move the query into the repository layer
+        query = "SELECT * FROM orders WHERE id = " + str(order_id)
+        try:
+            rows = self.db.execute(query)
+        except:
+            print("lookup failed for", order_id)
+            return None
+        return rows
+
+    def total(self, items):
+        total = 0
+        for i in range(len(items)):
+            total += items[i]["price"] * items[i]["quantity"]
+        return eval(str(total))
+'''
+
+JAVASCRIPT_BLOCK = '''
+function renderOrders{n}(orders, target) {{
+    var html = "";
+    for (var i = 0; i < orders.length; i++) {{
+        if (orders[i].total == null) {{
+            console.log("missing total", orders[i].id);
+        }}
+        html += "<li>" + orders[i].name + "</li>";
+    }}
+    target.innerHTML = html;
+    return eval("orders.length");
+}}
+'''
+
+BLOCKS = {"python": PYTHON_BLOCK, "javascript": JAVASCRIPT_BLOCK}
+EXTENSIONS = {"python": ".py", "javascript": ".js"}
+
+def parse_size(text: str) -> int:
+    """Bytes in "512", "4KB" or "1MB" (binary units)"""
+    text = text.strip().upper()
+    for suffix, factor in (("MB", 1024 * 1024), ("KB", 1024), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+def format_size(size: int) -> str:
+    for suffix, factor in (("MB", 1024 * 1024), ("KB", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return f"{size}B"
+
+def source(size: int, language: str = "python", seed: int = 0) -> str:
+    """About `size` bytes of code; `seed` varies identifiers so inputs never share a cache key"""
+    block = BLOCKS[language]
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = block.format(n=f"{seed}_{rng.randrange(1_000_000)}")
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+def unified_diff(files: int, lines_per_file: int, seed: int = 0) -> str:
+    """A pull request diff adding `files` new Python files"""
+    out = []
+    for index in range(files):
+        path = f"src/service_{seed}_{index}.py"
+        body = source(lines_per_file * 40, "python", seed * 1000 + index).split("\n")[:lines_per_file]
+        out.append(f"diff --git a/{path} b/{path}")
+        out.append("new file mode 100644")
+        out.append("--- /dev/null")
+        out.append(f"+++ b/{path}")
+        out.append(f"@@ -0,0 +1,{len(body)} @@")
+        out.extend("+" + line for line in body)
+    return "\n".join(out) + "\n"
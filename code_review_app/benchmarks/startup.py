@@ -0,0 +1,93 @@
+"""Cold start: how long importing the app, running its startup hook and
+finishing warm-up take, in fresh interpreters, plus where import time goes.
+
+    python -m benchmarks.startup --repeat 5 --top 15
+
+The import profile comes from `python -X importtime`; modules are listed by
+cumulative time (a module plus everything it imported first).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from benchmarks.results import summarize, write_results
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter; prints the phase timings as JSON
+_COLD_START = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+from app.services.warmup import warm_up
+imported = time.perf_counter()
+
+async def main():
+    await app.router.startup()
+    started = time.perf_counter()
+    while not warm_up.ready:
+        await asyncio.sleep(0.005)
+    ready = time.perf_counter()
+    await app.router.shutdown()
+    print(json.dumps({"import": imported - start, "startup": started - imported, "ready": ready - start,
+                      "steps": warm_up.snapshot()["steps"]}))
+
+asyncio.run(main())
+"""
+
+def environment(workdir: str) -> dict:
+    return {**os.environ, "DB_PATH": str(Path(workdir) / "startup.db"), "LOG_LEVEL": "WARNING"}
+
+def cold_start(workdir: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", _COLD_START], cwd=APP_DIR, env=environment(workdir),
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"App failed to start:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def import_profile(module: str, workdir: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every module imported by `import module`"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=APP_DIR,
+                            env=environment(workdir), capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--module", default="app.main", help="module to profile imports of")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/startup-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="code-review-startup-")
+    runs = [cold_start(workdir) for _ in range(args.repeat)]
+    scenarios = {phase: summarize([run[phase] for run in runs]) for phase in ("import", "startup", "ready")}
+    scenarios["warm_up_steps"] = {
+        name: summarize([run["steps"][name].get("seconds", 0.0) for run in runs]) for name in runs[-1]["steps"]
+    }
+    for phase in ("import", "startup", "ready"):
+        print(f"{phase:10} p50 {scenarios[phase]['p50_ms']:>9.1f} ms  max {scenarios[phase]['max_ms']:>9.1f} ms")
+    for name, timing in scenarios["warm_up_steps"].items():
+        print(f"  warm-up {name:28} p50 {timing['p50_ms']:>9.1f} ms")
+
+    profile = import_profile(args.module, workdir)
+    slowest = sorted(profile, key=lambda row: row[2], reverse=True)[:args.top]
+    print(f"\nSlowest imports under {args.module} (cumulative / self ms)")
+    for name, own, cumulative in slowest:
+        print(f"  {name:50} {cumulative / 1000:>9.1f} {own / 1000:>9.1f}")
+    scenarios["imports_ms"] = {name: round(cumulative / 1000, 3) for name, _, cumulative in slowest}
+
+    path = write_results("startup", vars(args), scenarios, args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
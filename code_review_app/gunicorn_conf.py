@@ -0,0 +1,57 @@
+"""gunicorn settings for the production server (see serve.py).
+
+    gunicorn -c gunicorn_conf.py app.main:app
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# One event loop per worker process. Each worker also runs its own webhook
+# workers and analysis pool, so several workers get one analysis process each
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Seconds an idle client connection stays open; keep it above the idle timeout
+# of a load balancer in front (often 60s) so it never reuses a closed socket
+KEEPALIVE = int(os.getenv("KEEPALIVE", "75"))
+# Connections the kernel queues while every worker is busy
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# Seconds workers get to finish in-flight requests when stopping
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Restart a worker after this many requests (give or take 10%) to bound memory growth; 0 never does
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+# Proxies trusted to set X-Forwarded-For / X-Forwarded-Proto
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+def share_state(workers: int):
+    """With several workers, keep rate limits, breakers, in-flight reviews and
+    cached reviews in SQLite. Must run before the app is imported, since its
+    settings are read at import time."""
+    if workers > 1:
+        os.environ.setdefault("SHARED_STATE", "true")
+        os.environ.setdefault("OFFLOAD_WORKERS", "1")
+
+bind = f"{HOST}:{PORT}"
+workers = WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+# Not preloaded: the master would import the app (and read SHARED_STATE) before
+# on_starting sees the worker count, which `-w` on the command line may change
+preload_app = False
+keepalive = KEEPALIVE
+backlog = BACKLOG
+graceful_timeout = GRACEFUL_TIMEOUT
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))  # seconds before a stuck worker is restarted
+max_requests = MAX_REQUESTS
+max_requests_jitter = MAX_REQUESTS // 10
+forwarded_allow_ips = FORWARDED_ALLOW_IPS
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+def on_starting(server):
+    """Share state if the effective worker count (including -w) is above one,
+    and create or migrate the schema once, before any worker starts"""
+    share_state(server.cfg.workers)
+    from app.services.database import close_db, init_db
+
+    init_db()
+    close_db()  # Forked workers must not inherit open SQLite connections
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""Production server: several worker processes and no reloader (start.py is for development).
+
+    python serve.py
+
+Runs WEB_CONCURRENCY workers on HOST:PORT with the settings in gunicorn_conf.py.
+Where gunicorn is installed (not on Windows) it manages uvicorn workers;
+otherwise uvicorn's own process manager starts the workers.
+"""
+import importlib.util
+import os
+import sys
+import gunicorn_conf as conf
+
+def main():
+    if os.name != "nt" and importlib.util.find_spec("gunicorn") is not None:
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "app.main:app"])
+
+    conf.share_state(conf.WEB_CONCURRENCY)
+    import uvicorn
+    from app.services.database import close_db, init_db
+
+    init_db()
+    close_db()
+    uvicorn.run(
+        "app.main:app",
+        host=conf.HOST,
+        port=conf.PORT,
+        workers=conf.WEB_CONCURRENCY,
+        backlog=conf.BACKLOG,
+        timeout_keep_alive=conf.KEEPALIVE,
+        timeout_graceful_shutdown=conf.GRACEFUL_TIMEOUT,
+        limit_max_requests=conf.MAX_REQUESTS or None,
+        forwarded_allow_ips=conf.FORWARDED_ALLOW_IPS,
+        access_log=False,  # app.main logs every request with its trace ID
+        log_level=conf.loglevel,
+    )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,36 @@
+from app.services.lexers import lex_generic, lex_python
+from app.services.rules import run_rules
+
+SAMPLE = '''import os  # eval(x) in a comment
+
+def render(name, items):
+    """Docstring mentioning eval(x)
+    and 'quotes' over "two" lines"""
+    label = f"{name!r}: {len(items)} eval(x) {{braces}}"
+    raw = rb'\\d+' + Rb"\\w" + u'x'
+    query = \'\'\'SELECT *
+        FROM t  -- eval(x)
+    \'\'\'
+    if (total := len(items)) > 0:
+        return eval(label)  # trailing
+    return f\'\'\'{query}
+{raw}\'\'\'
+'''
+
+def test_generic_python_lexer_matches_tokenize():
+    assert lex_python(SAMPLE) == lex_generic(SAMPLE, "python")
+
+def test_lexers_agree_on_a_region_cut_from_a_file():
+    region = "\n".join(SAMPLE.splitlines()[5:10])
+    assert lex_python(region, 6) == lex_generic(region, "python", 6)
+    assert lex_python(region, 6)[0].line == 6
+
+def test_unparsable_region_falls_back_to_generic_lexer():
+    region = "        return eval(label)\n    x = ("
+    assert lex_python(region, 12) == lex_generic(region, "python", 12)
+
+def test_triggers_in_comments_and_strings_do_not_match():
+    hits, _ = run_rules(SAMPLE, "python")
+    assert hits["py.eval"][1] == (12, 16)
+    hits, _ = run_rules(SAMPLE.replace("return eval(label)", "return label"), "python")
+    assert "py.eval" not in hits
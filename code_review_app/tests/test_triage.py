@@ -0,0 +1,32 @@
+from app.services.diff import parse_unified_diff
+from app.services.triage import classify_file
+
+def classify(path: str, removed: list[str], added: list[str]) -> str:
+    lines = [f"-{line}" for line in removed] + [f"+{line}" for line in added]
+    diff = (f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+            f"@@ -1,{len(removed)} +1,{len(added)} @@\n" + "\n".join(lines) + "\n")
+    return classify_file(parse_unified_diff(diff)[0])
+
+def test_reindented_python_block_is_code():
+    assert classify("app.py", ["if ready:", "    start()", "    notify()"],
+                    ["if ready:", "    start()", "notify()"]) == "code"
+
+def test_string_literal_whitespace_is_code():
+    assert classify("app.py", ['query = "a b"'], ['query = "ab"']) == "code"
+    assert classify("app.js", ["const query = 'a b';"], ["const query = 'ab';"]) == "code"
+
+def test_multiline_string_whitespace_is_code():
+    assert classify("app.py", ['sql = """SELECT a', '  FROM  t"""'], ['sql = """SELECT a', '  FROM t"""']) == "code"
+
+def test_whitespace_between_tokens_is_whitespace_only():
+    assert classify("app.py", ['x=f( 1,2 )  ', 'name = "a b"'], ['x = f(1, 2)', '', 'name  =  "a b"']) == "whitespace_only"
+
+def test_joining_two_words_is_code():
+    assert classify("app.js", ["return value"], ["returnvalue"]) == "code"
+
+def test_reindenting_brace_language_is_whitespace_only():
+    assert classify("app.js", ["  if (ready) {", "start();", "}"],
+                    ["if (ready) {", "    start();", "}"]) == "whitespace_only"
+
+def test_reindenting_yaml_is_code():
+    assert classify("ci.yml", ["steps:", "  - run: make"], ["steps:", "- run: make"]) == "code"